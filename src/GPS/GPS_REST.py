@@ -1,25 +1,162 @@
 from flask import Flask, request
 import json
+import os
+import signal
+import time
 
+import gevent
+from gevent import socket
+from gevent.pywsgi import WSGIServer
+from gevent.queue import Queue, Full, Empty
+
+from locations import LocationStore
+
+'''
+Receives the locations sent by the mobile app and pushes them to the back end.
+
+Runs on a single gevent loop: the requests, the publisher and the maintenance of the store are all
+greenlets, so the state is never locked. The store is snapshotted periodically to disk and restored
+on startup.
+'''
+
+
+Port=int(os.environ.get("GPS_PORT", "5555"))
+BackEndHost=os.environ.get("BACK_END_HOST", "back_end")        #where the locations are pushed to
+BackEndPort=int(os.environ.get("BACK_END_GPS_PORT", "5679"))
+StateFile=os.environ.get("GPS_STATE_FILE", "state/locations.json")
+MaxQueued=10000         #locations kept while the back end is unavailable, the oldest are dropped
+SnapshotInterval=30     #seconds between snapshots of the store, when it changed
+SweepInterval=1         #seconds between the eviction of each shard of the store
 
 app = Flask(__name__)
 
-userLocations={}
+store=LocationStore()
+updates=Queue(maxsize=MaxQueued)
+
+
+def publish(user, location):
+    """
+    Queues a location to be pushed to the back end, dropping the oldest if the queue is full
+    """
+    update=json.dumps(dict(location, user=user))+"\n"
+    while True:
+        try:
+            updates.put_nowait(update)
+            return
+        except Full:
+            try:
+                updates.get_nowait()
+            except Empty:
+                pass
+
+
+def publisher():
+    """
+    Streams the queued locations to the back end as lines of json, reconnecting when needed.
+    The locations queued meanwhile are sent together
+    """
+    delay=1
+    pending=None
+    while True:
+        try:
+            conn=socket.create_connection((BackEndHost, BackEndPort), timeout=10)
+            try:
+                delay=1
+                while True:
+                    if pending is None:
+                        lines=[updates.get()]
+                        while not updates.empty() and len(lines) < 500:
+                            lines.append(updates.get_nowait())
+                        pending="".join(lines).encode("UTF-8")
+                    conn.sendall(pending)
+                    pending=None
+            finally:
+                conn.close()
+        except OSError as e:
+            print("Couldn't push locations to "+BackEndHost+":"+str(BackEndPort)+": "+str(e))
+            gevent.sleep(delay)
+            delay=min(delay*2, 30)
+
+
+def maintenance():
+    """
+    Evicts the stale users, a shard per SweepInterval, and snapshots the store every SnapshotInterval
+    """
+    shard=0
+    lastSnapshot=time.time()
+    while True:
+        gevent.sleep(SweepInterval)
+        store.evict(shard)
+        shard+=1
+        if store.dirty and time.time()-lastSnapshot >= SnapshotInterval:
+            lastSnapshot=time.time()
+            try:
+                store.save(StateFile)
+            except Exception as e:
+                print("Couldn't save the locations: "+str(e))
+
+
+class GPSServer(WSGIServer):
+    def handle(self, sock, address):
+        #the headers and the body of a response are written separately, without TCP_NODELAY
+        # the body waits for the delayed ACK of the client (~40ms per request)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        WSGIServer.handle(self, sock, address)
+
+
+def _location(data):
+    try:
+        latitude=float(data["latitude"])
+        longitude=float(data["longitude"])
+    except (TypeError, ValueError, KeyError):
+        return None
+    if -90 < latitude < 90 and -180 < longitude < 180:
+        return latitude, longitude
+    return None
+
 
 @app.route('/gps/<string:user>', methods = ['POST', 'GET'])
 def userGPSCoordinates(user):
     if request.method=='POST':
-        coords=json.loads(request.data.decode("UTF-8"))
-        lat=coords["latitude"]
-        longi=coords["longitude"]
-        userLocations[user]={"latitude":lat, "longitude":longi}
-        print(userLocations)
+        location=_location(request.get_json(force=True, silent=True) or {})
+        if location is None:
+            return json.dumps({"status":2, "message":"Invalid coordinates"}), 400
+        now=int(time.time())
+        store.update(user, location[0], location[1], now)
+        publish(user, {"latitude":location[0], "longitude":location[1], "time":now})
         return json.dumps({"status":0, "message":"All Good"})
     else:
-        #return json.dumps({"data":{"latitude":40.0, "longitude":-8.0}})
-        if user not in userLocations:
+        location=store.get(user)
+        if location is None:
             return json.dumps({"status":1, "message":"User Unknown", "data":{"latitude":None, "longitude":None}})
-        return json.dumps({"status":0, "message":"All Good", "data":userLocations[user]})
+        return json.dumps({"status":0, "message":"All Good", "data":location})
+
+
+@app.route('/gps/', methods = ['GET'])
+def usersGPSCoordinates():
+    """
+    Locations of several users at once, /gps/?users=user1,user2
+    """
+    users=[user for user in request.args.get("users", "").split(",") if user]
+    return json.dumps({"status":0, "message":"All Good", "data":store.getMany(users)})
+
+
+@app.route('/gps-stats', methods = ['GET'])
+def stats():
+    return json.dumps({"status":0, "message":"All Good", "data":{"users":len(store), "updates":store.updates,
+                                                                  "evicted":store.evicted, "queued":updates.qsize()}})
+
+
+if __name__ == '__main__':
+    print("LOADED "+str(store.load(StateFile))+" LOCATIONS")
+    http_server = GPSServer(('0.0.0.0', Port), app, log=None)
 
+    def shutdown():
+        http_server.stop(timeout=5)
+        store.save(StateFile)
 
-app.run(host='0.0.0.0',port='5555')
+    gevent.signal_handler(signal.SIGTERM, shutdown)
+    gevent.signal_handler(signal.SIGINT, shutdown)
+    gevent.spawn(publisher)
+    gevent.spawn(maintenance)
+    http_server.serve_forever()
@@ -0,0 +1,111 @@
+import json
+import os
+import time
+
+'''
+In-memory store of the last location of every user.
+
+The users are split in shards so that the eviction of stale users and the snapshots are done a shard
+at a time, never pausing the server for long. The server runs on a single gevent loop, so the shards
+are plain dicts without any lock.
+'''
+
+
+Shards=64               #number of shards of the store
+LocationTTL=86400       #seconds without updates after which a user is evicted
+SnapshotVersion=1
+
+
+class LocationStore:
+    def __init__(self, shards=Shards, ttl=LocationTTL):
+        self.ttl=ttl
+        self._shards=[{} for x in range(shards)]     #[{user: (latitude, longitude, time)}, ...]
+        self.dirty=False
+        self.updates=0
+        self.evicted=0
+
+    def __len__(self):
+        return sum(len(shard) for shard in self._shards)
+
+    def _shard(self, user):
+        return self._shards[hash(user) % len(self._shards)]
+
+    def update(self, user, latitude, longitude, time):
+        self._shard(user)[user]=(latitude, longitude, time)
+        self.dirty=True
+        self.updates+=1
+
+    def get(self, user, now=None):
+        """
+        :return: {"latitude":float, "longitude":float} or None if the user is unknown or stale
+        :rtype: dict
+        """
+        location=self._shard(user).get(user)
+        if location is None or location[2] < (now or time.time())-self.ttl:
+            return None
+        return {"latitude":location[0], "longitude":location[1]}
+
+    def getMany(self, users):
+        """
+        :return: {user: {"latitude":float, "longitude":float} or None}
+        :rtype: dict
+        """
+        now=time.time()
+        return {user: self.get(user, now) for user in users}
+
+    def evict(self, shard, now=None):
+        """
+        Removes the stale users of a shard
+
+        :param shard: index of the shard, any int (wraps around the number of shards)
+        :type shard: int
+        :return: number of users evicted
+        :rtype: int
+        """
+        locations=self._shards[shard % len(self._shards)]
+        limit=(now or time.time())-self.ttl
+        stale=[user for user, location in locations.items() if location[2] < limit]
+        for user in stale:
+            del locations[user]
+        if stale:
+            self.dirty=True
+            self.evicted+=len(stale)
+        return len(stale)
+
+    def save(self, path):
+        """
+        Writes a snapshot of the store atomically, a crash while writing never leaves a partial file
+        """
+        directory=os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.dirty=False
+        users={}
+        for shard in self._shards:
+            users.update(shard)
+        tmp=path+".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version":SnapshotVersion, "savedAt":int(time.time()), "users":users}, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def load(self, path):
+        """
+        Restores a snapshot written by save, ignoring the users already stale
+
+        :return: number of users loaded
+        :rtype: int
+        """
+        try:
+            with open(path) as f:
+                data=json.load(f)
+        except FileNotFoundError:
+            return 0
+        if data.get("version")!=SnapshotVersion:
+            return 0
+        limit=time.time()-self.ttl
+        loaded=0
+        for user, location in data["users"].items():
+            if location[2] >= limit:
+                self._shard(user)[user]=tuple(location)
+                loaded+=1
+        return loaded
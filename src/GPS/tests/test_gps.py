@@ -0,0 +1,133 @@
+#!/usr/bin/python3
+
+import unittest
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from locations import LocationStore
+
+GPSDirectory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _freePort():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class TestLocationStore(unittest.TestCase):
+
+    def test_eviction(self):
+        store = LocationStore(shards=4, ttl=60)
+        now = time.time()
+        store.update("old", 40.0, -8.0, now - 120)
+        store.update("new", 41.0, -8.0, now)
+        self.assertIsNone(store.get("old"))
+        self.assertEqual(store.getMany(["new", "none"]), {"new": {"latitude": 41.0, "longitude": -8.0}, "none": None})
+        self.assertEqual(sum(store.evict(shard) for shard in range(4)), 1)
+        self.assertEqual(len(store), 1)
+
+    def test_snapshot(self):
+        store = LocationStore()
+        for i in range(1000):
+            store.update("user%d" % i, 40.0, -8.0, time.time())
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "state", "locations.json")
+            store.save(path)
+            self.assertFalse(store.dirty)
+            restored = LocationStore()
+            self.assertEqual(restored.load(path), 1000)
+            self.assertEqual(restored.get("user7"), {"latitude": 40.0, "longitude": -8.0})
+
+
+class ServiceTestCase(unittest.TestCase):
+    """
+    Runs the GPS service on a free port during each test
+    """
+
+    def setUp(self):
+        self.port = _freePort()
+        self.state = tempfile.TemporaryDirectory()
+        env = dict(os.environ, GPS_PORT=str(self.port), BACK_END_HOST="127.0.0.1", BACK_END_GPS_PORT=str(_freePort()),
+                   GPS_STATE_FILE=os.path.join(self.state.name, "locations.json"))
+        self.server = subprocess.Popen([sys.executable, "GPS_REST.py"], cwd=GPSDirectory, env=env,
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", self.port)).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        self.fail("GPS service didn't start")
+
+    def tearDown(self):
+        self.server.terminate()
+        self.server.wait(10)
+        self.state.cleanup()
+
+    def _request(self, method, path, body=None):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port)
+        conn.request(method, path, json.dumps(body) if body is not None else None, {"Content-Type": "application/json"})
+        response = conn.getresponse()
+        data = json.loads(response.read())
+        conn.close()
+        return response.status, data
+
+
+class TestRoutes(ServiceTestCase):
+
+    def test_stats(self):
+        # a user named like the statistics path is still a user
+        self.assertEqual(self._request("POST", "/gps/stats", {"latitude": 40.63, "longitude": -8.65})[0], 200)
+        self.assertEqual(self._request("GET", "/gps/stats")[1]["data"], {"latitude": 40.63, "longitude": -8.65})
+        status, data = self._request("GET", "/gps-stats")
+        self.assertEqual(status, 200)
+        self.assertEqual((data["data"]["users"], data["data"]["updates"]), (1, 1))
+
+
+@unittest.skipUnless(os.environ.get("BENCHMARKS"), "set BENCHMARKS=1 to run the benchmarks")
+class TestLoad(ServiceTestCase):
+
+    Clients = 8
+    Duration = 3
+
+    def _client(self, index, counts):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port)
+        end = time.time() + self.Duration
+        sent = 0
+        while time.time() < end:
+            body = json.dumps({"latitude": 40.63, "longitude": -8.65})
+            conn.request("POST", "/gps/user%d_%d" % (index, sent % 100), body, {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            response.read()
+            self.assertEqual(response.status, 200)
+            sent += 1
+        conn.close()
+        counts[index] = sent
+
+    def test_sustained_posts(self):
+        counts = [0] * self.Clients
+        threads = [threading.Thread(target=self._client, args=(i, counts)) for i in range(self.Clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        rate = sum(counts) / self.Duration
+        self.assertGreater(rate, 500)
+
+        conn = http.client.HTTPConnection("127.0.0.1", self.port)
+        conn.request("GET", "/gps/?users=user0_1,user1_2,unknown")
+        data = json.loads(conn.getresponse().read())["data"]
+        self.assertEqual(data["user0_1"], {"latitude": 40.63, "longitude": -8.65})
+        self.assertIsNone(data["unknown"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,6 +7,9 @@ import ssl
 import re
 import datetime
 import asyncio
+import signal
+import zlib
+import gevent
 from gevent.pywsgi import WSGIServer
 
 '''
@@ -17,6 +20,7 @@ The API supports https and on authorized operations should receive the personal
 app = Flask(__name__)
 CORS(app)
 processor=Processor()
+processor.start() # users and their pollers are loaded in the background while the API is already listening
 
 
 @app.route('/signup', methods = ['POST'])
@@ -101,7 +105,7 @@ def registerMood():
         if len(argsErrors) > 0:
             return json.dumps({"status":2, "msg":"Argument errors : " + ", ".join(argsErrors)}).encode("UTF-8"), 400
 
-        return processor.registerMood(userToken, data)
+        return processor.registerMood(userToken, data, request.headers.get("Idempotency-Key"))
     else:
         argsErrors =  ArgumentValidator.deleteMood(data)
         if len(argsErrors) > 0:
@@ -152,12 +156,17 @@ def getData():
     end=request.args.get('end', type=int)
     interval=request.args.get('interval')
     patient=request.args.get('patient')
+    eventType=request.args.get('type')
+    fields=request.args.get('fields')
 
     argsErrors =  ArgumentValidator.getData({
         'start': start,
         'end': end,
         'interval': interval,
-        'patient': patient
+        'patient': patient,
+        'type': eventType,
+        'fields': fields,
+        'measurement': request.endpoint
     })
     if len(argsErrors) > 0:
         return json.dumps({"status":2, "msg":"Argument errors : " + ", ".join(argsErrors)}).encode("UTF-8"), 400
@@ -182,7 +191,10 @@ def getData():
     if time_interval > datetime.timedelta(days=40):
         return json.dumps({"status": 1, "msg": "Interval requested extends 40 days."}).encode("UTF-8"), 406
 
-    return processor.getData(userToken, request.endpoint, start, end, interval, patient)
+    if fields:
+        fields = fields.split(",")
+
+    return processor.getData(userToken, request.endpoint, start, end, interval, patient, eventType, fields)
 
 @app.route('/download', methods = ['GET'])
 def download():
@@ -229,6 +241,63 @@ def profile():
     else:
         return processor.deleteProfile(userToken)
 
+MaxSyncBytes = 16*1024*1024   # max size of an uncompressed synchronization
+
+@app.route('/sync', methods = ['POST'])
+def sync():
+    """
+    Used by the mobile app to send, at once, the GPS points and moods registered while offline.
+    The body may be compressed with gzip (header Content-Encoding: gzip)
+    """
+    userToken = request.headers.get("AuthToken")
+    if not userToken:
+        return json.dumps({"status":2, "msg":"This path requires an authentication token on headers named \"AuthToken\""}).encode("UTF-8"), 400
+
+    try:
+        body = request.get_data()
+        if request.headers.get("Content-Encoding", "").lower() == "gzip":
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            body = decompressor.decompress(body, MaxSyncBytes)
+            if decompressor.unconsumed_tail:
+                return json.dumps({"status":2, "msg":"Synchronization too big"}).encode("UTF-8"), 413
+        data = json.loads(body.decode("UTF-8")) if body else {}
+    except (zlib.error, ValueError) as e:
+        return json.dumps({"status":2, "msg":"Invalid body. " + str(e)}).encode("UTF-8"), 400
+    if not isinstance(data, dict):
+        data = {}
+
+    argsErrors =  ArgumentValidator.sync(data)
+    if len(argsErrors) > 0:
+        return json.dumps({"status":2, "msg":"Argument errors : " + ", ".join(argsErrors)}).encode("UTF-8"), 400
+
+    return processor.sync(userToken, data)
+
+@app.route('/fitbit/notifications', methods = ['GET', 'POST'])
+def fitbitNotifications():
+    """
+    Subscriber endpoint of the Fitbit notifications. GET verifies the subscriber, POST receives
+     the notifications of the clients' bands syncing. Answers 204 if accepted and 404 otherwise, as Fitbit expects
+    """
+    if request.method == 'GET':
+        return "", 204 if processor.webhook.verify(request.args.get("verify")) else 404
+
+    return "", 204 if processor.webhook.receive(request.get_data(), request.headers.get("X-Fitbit-Signature")) else 404
+
+@app.route('/ready', methods = ['GET'])
+def ready():
+    """
+    Reports if the server already loaded all users and started polling their devices,
+     with the progress of that startup
+    """
+    return processor.getReadiness()
+
+@app.route('/stats', methods = ['GET'])
+def stats():
+    """
+    Runtime statistics of the server, such as the requests per second done to each provider
+    """
+    return processor.getStats()
+
 @app.route('/supportedDevices', methods = ['GET'])
 def supportedDevices():
     return processor.getSupportedDevices()
@@ -313,4 +382,15 @@ def removeAcceptedPermission(medic):
 #http_server = WSGIServer(('0.0.0.0', 5000), app, ssl_context=context)
 
 http_server = WSGIServer(('0.0.0.0', 5000), app)
+
+def shutdown():
+    """
+    On SIGTERM/SIGINT stops accepting requests and lets the processor finish
+     the polls in progress and save its checkpoint
+    """
+    http_server.stop(timeout=5)
+    processor.end()
+
+gevent.signal_handler(signal.SIGTERM, shutdown)
+gevent.signal_handler(signal.SIGINT, shutdown)
 http_server.serve_forever()
@@ -12,12 +12,13 @@ class WebSocket:
     def __init__(self, host, port, maxWebsockets, socketsTTL, processor):
         self.sockets=TTLCache(maxsize=maxWebsockets, ttl=socketsTTL)
         self.t=None
+        self.loop=None
         self.host=host
         self.port=port
         self.processor=processor
 
     def start(self):
-        self.t=Thread(target=self.serve_forever)
+        self.t=Thread(target=self.serve_forever, daemon=True)
         self.t.start()
         logging.info("WEBSOCKET STARTED IN "+self.host+":"+str(self.port))
 
@@ -27,25 +28,65 @@ class WebSocket:
     def serve_forever(self):
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
+        self.loop=loop
         start_server = websockets.serve(self.handler, self.host, self.port)
         asyncio.get_event_loop().run_until_complete(start_server)
         asyncio.get_event_loop().run_forever()
 
     async def handler(self, websocket, path):
-        while True:
-            data = await websocket.recv()
-            logging.info("WEBSOCKET RECEIVED "+data)
-            jsonData=json.loads(data)
-            token=jsonData["token"]
-            if token in self.sockets:
-                self.sockets[token].close()
-            self.sockets[token]=websocket
-            self.processor.checkPermissions(token)
+        tokens=set()
+        try:
+            while True:
+                data = await websocket.recv()
+                logging.info("WEBSOCKET RECEIVED "+data)
+                jsonData=json.loads(data)
+                token=jsonData["token"]
+                if token in self.sockets and self.sockets[token] is not websocket:
+                    await self.sockets[token].close()
+                self.sockets[token]=websocket
+                tokens.add(token)
+                self.processor.checkPermissions(token)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            #a closed connection no longer receives alerts
+            for token in tokens:
+                self._forget(token, websocket)
+
+    def _forget(self, token, websocket):
+        if self.sockets.get(token) is websocket:
+            del self.sockets[token]
 
     async def send(self, data, token):
+        """
+        :return: True if the data was sent
+        :rtype: bool
+        """
         socket = self.sockets.get(token)
-        if socket:
+        if not socket:
+            return False
+        try:
             await socket.send(data)
+            return True
+        except websockets.exceptions.ConnectionClosed:
+            self._forget(token, socket)
+            return False
+
+    def notify(self, data, token, onSent=None):
+        """
+        Schedules a send on the websocket's event loop, callable from any thread and without waiting for it
+
+        :param onSent: called on the event loop once the data was sent, not if the send fails
+        :type onSent: function
+        :return: False if the token has no websocket open
+        :rtype: bool
+        """
+        if self.loop and token in self.sockets:
+            future=asyncio.run_coroutine_threadsafe(self.send(data, token), self.loop)
+            if onSent:
+                future.add_done_callback(lambda future: onSent() if not future.cancelled() and future.exception() is None and future.result() else None)
+            return True
+        return False
 
     def getUsers(self):
         return self.sockets.keys()
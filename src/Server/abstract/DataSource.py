@@ -19,6 +19,10 @@ class DataSource(ABC):
     def id(self):
         return self._id
 
+    @property
+    def location(self):
+        return self._location
+
     @abstractproperty
     def header(self):
         return ""
@@ -1,4 +1,8 @@
 from abc import ABC, abstractmethod, abstractproperty
+from urllib.parse import urlparse
+
+from rules import eventRules
+from stats import requestRates
 
 class Metric(ABC):
 
@@ -29,6 +33,30 @@ class Metric(ABC):
     def metricLocation(self):
         return ""
 
+    @property
+    def collection(self):
+        """
+        Collection of the provider's notifications that announce new data of the metric,
+         None if the provider doesn't notify changes
+        """
+        return None
+
+    @property
+    def provider(self):
+        """
+        Host of the API that provides the metric, used to account the requests done to it
+        """
+        return urlparse(self.URLTemplate).hostname
+
+    def fetch(self, latitude=None, longitude=None):
+        """
+        Gets the data of the metric, accounting the request on its provider's rate
+         (unless the data source accounts the requests it really does)
+        """
+        if not getattr(self.dataSource, "accountsRequests", False):
+            requestRates.hit(self.provider)
+        return self.getData(latitude, longitude)
+
     @abstractmethod
     def getData(self, latitude=None, longitude=None):
         pass
@@ -38,4 +66,40 @@ class Metric(ABC):
         pass
 
     def checkEvent(self, normalJsonData):
+        """
+        Events detected on a reading by the rules of the metric's class, see rules.Thresholds
+
+        :return: {"events":[...], "metrics":[...]} or None
+        :rtype: dict
+        """
+        return eventRules.evaluate([(self, normalJsonData)])[0]
+
+    def stored(self):
+        """
+        Called once the data normalized on the last poll was written to the database
+        """
+        pass
+
+    def series(self, jsonData):
+        """
+        Points of a time series that come with the data, besides the value returned by normalizeData
+
+        :return: new points [(time, fields), ...]
+        :rtype: list
+        """
+        return []
+
+    def getState(self):
+        """
+        State kept by the metric between polls (ex: to detect events), saved on the checkpoint.
+        Must be json serializable
+
+        :return: the state or None if the metric is stateless
+        """
         return None
+
+    def setState(self, state):
+        """
+        Restores the state returned previously by getState
+        """
+        pass
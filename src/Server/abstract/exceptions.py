@@ -0,0 +1,31 @@
+'''
+Exceptions raised by the data sources when fetching their metrics
+'''
+
+
+class ExpiredToken(Exception):
+    """
+    The API refused the access token, it must be refreshed before trying again
+    """
+    pass
+
+
+class NoNewData(Exception):
+    """
+    The data of the metric was already stored, there's nothing to normalize or write
+    """
+    pass
+
+
+class RateLimited(Exception):
+    """
+    The request wasn't done (or was refused) because the quota of the account is exhausted
+    """
+
+    def __init__(self, message, retryAfter):
+        """
+        :param retryAfter: seconds until a request is allowed again
+        :type retryAfter: float
+        """
+        super().__init__(message)
+        self.retryAfter = retryAfter
@@ -0,0 +1,126 @@
+import logging
+import threading
+import time
+
+from cachetools import TTLCache
+
+from geo import geohash, geohashCenter
+
+'''
+Shared cache of the outdoor air quality, keyed by geohash cell.
+
+Clients in the same cell get the readings of the same stations, so the external API is requested once
+per occupied cell instead of once per client. A background thread refreshes the cells still occupied
+before their readings expire, so the polls of the clients are served from the cache.
+'''
+
+
+AirQualityPrecision=5   #geohash characters of a cell, ~4.9x4.9km, smaller than the usual distance between stations
+AirQualityTTL=1800      #seconds the readings of a cell are kept, the stations publish hourly
+AirQualityCells=10000   #max number of cells cached at once
+OccupiedTTL=3600        #seconds a cell is considered occupied after the last request for it
+PrefetchInterval=60     #seconds between the refreshes of the occupied cells
+PrefetchBefore=300      #seconds before the readings of a cell expire at which they are refreshed
+
+
+class AirQualityCache:
+    """
+    Normalized readings of the outside environment metrics {(metric, cell): (fetched at, data)}
+    """
+
+    def __init__(self, precision=AirQualityPrecision, ttl=AirQualityTTL):
+        self.precision=precision
+        self.ttl=ttl
+        self._lock=threading.Lock()
+        self._cache=TTLCache(maxsize=AirQualityCells, ttl=ttl)
+        self._occupied=TTLCache(maxsize=AirQualityCells, ttl=OccupiedTTL)     #{(metric, cell): metric}
+        self._fetching={}       #{(metric, cell): threading.Event} requests in progress
+        self.hits=0
+        self.misses=0
+        self.prefetches=0
+
+    def get(self, metric, latitude, longitude):
+        """
+        :param metric: outside environment metric that fetches the readings of a location
+        :type metric: Metric
+        :return: the normalized readings of the cell of the location
+        :rtype: dict
+        """
+        cell=geohash(float(latitude), float(longitude), self.precision)
+        key=(metric.__class__.__name__, cell)
+        missed=False
+        while True:
+            with self._lock:
+                self._occupied[key]=metric
+                cached=self._cache.get(key)
+                if cached is not None:
+                    if not missed:
+                        self.hits+=1
+                    return cached[1]
+                if not missed:
+                    self.misses+=1
+                    missed=True
+                waiting=self._fetching.get(key)
+                if waiting is None:
+                    self._fetching[key]=threading.Event()
+                    break
+            #another client of the same cell is already fetching it, if that fails one of the
+            # clients waiting fetches it again
+            waiting.wait(30)
+        return self._fetch(metric, key)
+
+    def _fetch(self, metric, key):
+        try:
+            latitude, longitude=geohashCenter(key[1])
+            data=metric.normalizeData(metric.fetch(latitude, longitude))
+            with self._lock:
+                self._cache[key]=(time.time(), data)
+            return data
+        finally:
+            with self._lock:
+                event=self._fetching.pop(key, None)
+            if event:
+                event.set()
+
+    def prefetch(self):
+        """
+        Refreshes the readings of the occupied cells that are about to expire
+        """
+        now=time.time()
+        due=[]
+        with self._lock:
+            for key, metric in list(self._occupied.items()):
+                cached=self._cache.get(key)
+                if key not in self._fetching and (cached is None or cached[0]+self.ttl-PrefetchBefore <= now):
+                    self._fetching[key]=threading.Event()
+                    due.append((key, metric))
+        for key, metric in due:
+            try:
+                self._fetch(metric, key)
+                self.prefetches+=1
+            except Exception as e:
+                logging.error("Couldn't prefetch the air quality of "+key[1]+": "+str(e))
+
+    def stats(self):
+        requests=self.hits+self.misses
+        return {"hits":self.hits, "misses":self.misses, "prefetches":self.prefetches,
+                "hitRatio":round(self.hits/requests, 3) if requests else None,
+                "cells":len(self._cache), "occupiedCells":len(self._occupied)}
+
+
+class PrefetchThread(threading.Thread):
+    def __init__(self, cache, interval=PrefetchInterval):
+        threading.Thread.__init__(self, daemon=True)
+        self.cache=cache
+        self.interval=interval
+        self.stopped=threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.cache.prefetch()
+            except Exception as e:
+                logging.error("Error while prefetching the air quality: "+str(e))
+
+    def end(self):
+        self.stopped.set()
@@ -0,0 +1,143 @@
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from cachetools import TTLCache
+
+'''
+Component responsable for pushing the events detected on a client's data, in real time,
+to all the medics that currently have an accepted permission to monitor that client.
+
+The permissions are kept on an in-memory index, loaded once from the database and updated
+by the Processor whenever a permission changes, so no database call is done per event.
+Repeated alerts of the same event to the same medic's session (token) inside AlertWindow are coalesced,
+an alert only counts as sent once the websocket confirms the send.
+'''
+
+
+AlertWindow=600         #seconds during which a repeated event of a patient is not sent again to the same medic
+MaxCoalescedAlerts=10000  #max number of (token, patient, event) entries remembered to coalesce alerts
+CopyAttempts=10         #times the medics' tokens are copied while the API threads change them
+
+
+class PermissionIndex:
+    """
+    In-memory index of the accepted permissions {client: {medic: expiration_date}}
+    """
+
+    def __init__(self):
+        self._lock=threading.Lock()
+        self._clients={}
+
+    def load(self, permissions):
+        """
+        Replaces the whole index
+
+        :param permissions: tuples (client, medic, expiration_date)
+        :type permissions: list
+        """
+        clients={}
+        for client, medic, expiration in permissions:
+            clients.setdefault(client, {})[medic]=expiration
+        with self._lock:
+            self._clients=clients
+
+    def update(self, client, accepted):
+        """
+        Replaces all accepted permissions of a single client
+
+        :param client: username of the client
+        :type client: str
+        :param accepted: accepted permissions as returned by Database.allPermissionsData
+            [{username:str, duration:"HH:MM", ...}, ...]
+        :type accepted: list
+        """
+        now=datetime.now()
+        medics={}
+        for permission in accepted:
+            hours, minutes=permission["duration"].split(":")
+            medics[permission["username"]]=now+timedelta(hours=int(hours), minutes=int(minutes))
+        with self._lock:
+            if medics:
+                self._clients[client]=medics
+            else:
+                self._clients.pop(client, None)
+
+    def revoke(self, client, medic):
+        with self._lock:
+            medics=self._clients.get(client)
+            if medics:
+                medics.pop(medic, None)
+
+    def medics(self, client):
+        """
+        :param client: username of the client
+        :type client: str
+        :return: usernames of the medics with an active permission over the client
+        :rtype: list
+        """
+        now=datetime.now()
+        with self._lock:
+            medics=self._clients.get(client, {})
+            return [medic for medic, expiration in medics.items() if expiration >= now]
+
+
+class AlertDispatcher:
+    """
+    Sends the events of a client through the websocket to the monitoring medics that are online
+    """
+
+    def __init__(self, socket, medicTokens, permissions):
+        self.socket=socket
+        self.medicTokens=medicTokens
+        self.permissions=permissions
+        self._lock=threading.Lock()
+        self.sent=TTLCache(maxsize=MaxCoalescedAlerts, ttl=AlertWindow)
+
+    def _tokens(self):
+        """
+        :return: the medics logged in [(token, medic), ...]
+        :rtype: list
+        """
+        #the tokens are added and removed by the API threads, a copy that overlaps a change is retried
+        for attempt in range(CopyAttempts):
+            try:
+                return list(self.medicTokens.items())
+            except (RuntimeError, KeyError):
+                continue
+        logging.error("Couldn't copy the medics' tokens to send an alert")
+        return []
+
+    def _sent(self, token, client, events):
+        with self._lock:
+            for e in events:
+                self.sent[(token, client, e)]=True
+
+    def dispatch(self, client, event, time):
+        """
+        :param client: username of the client to whom the event belongs
+        :type client: str
+        :param event: {"events":[...], "metrics":[...], "data":{...}}
+        :type event: dict
+        :param time: timestamp of the event (seconds)
+        :type time: int
+        """
+        medics=set(self.permissions.medics(client))
+        if not medics:
+            return
+
+        for token, medic in self._tokens():
+            if medic not in medics:
+                continue
+
+            with self._lock:
+                events=[e for e in event["events"] if (token, client, e) not in self.sent]
+            if not events:
+                continue
+
+            alert=json.dumps({"type":"event", "patient":client, "time":time, "events":events, "metrics":event["metrics"], "data":event["data"]})
+            try:
+                self.socket.notify(alert, token, lambda token=token, events=events: self._sent(token, client, events))
+            except Exception as e:
+                logging.error("<"+client+">Couldn't send alert to medic "+medic+": "+str(e))
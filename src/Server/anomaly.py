@@ -0,0 +1,185 @@
+import math
+import threading
+from array import array
+
+'''
+Detection of readings that deviate from each client's own baseline, updated as the points arrive.
+
+Each (client, field) keeps a single array of doubles: the count, an exponentially weighted mean and
+variance and two P² quantile sketches (Jain & Chlamtac) of the low and high tails. An update is O(1),
+never reads the database, and the whole state is a few hundred bytes per client, saved on the checkpoint.
+A reading is unusual when it's outside the tails seen so far and far from the weighted mean.
+Only new readings count: a metric polled again before its value changes (ex: the resting heart rate
+of the day) isn't added again, and the deviation has a floor so a steady baseline doesn't flag noise.
+'''
+
+
+AnomalyFields={"heartRate":"Heart Rate", "co2":"CO2", "voc":"Volatile Compounds", "pm10":"Particle Matter(<10 um)"}   #fields followed {field: name on the events}
+AnomalyAlpha=0.02       #weight of a new reading on the mean and variance (~the last 100 readings)
+AnomalyWarmup=50        #readings of a field before its deviations are flagged
+AnomalyDeviations=4     #standard deviations from the mean a reading must be, besides being outside the tails
+AnomalyMinDeviation=0.05        #floor of the standard deviation relative to the mean
+AnomalyMinAbsoluteDeviation=1   #floor of the standard deviation, for means close to 0
+LowQuantile=0.01
+HighQuantile=0.99
+
+#layout of the array of a field
+Count, Mean, Variance = 0, 1, 2
+Low, High = 3, 13       #sketch: 5 marker heights followed by their 5 positions
+SketchSize=10
+Last=High+SketchSize    #last reading added
+FieldSize=Last+1
+
+
+def _sketchUpdate(stats, base, p, value, count):
+    """
+    Adds a value to the P² sketch of the quantile p at stats[base:base+10]
+
+    :param count: number of values, including this one
+    :type count: int
+    """
+    q=base
+    n=base+5
+    if count <= 5:
+        #the first values are kept sorted on the markers
+        heights=sorted(list(stats[q:q+count-1])+[value])
+        for i, height in enumerate(heights):
+            stats[q+i]=height
+            stats[n+i]=i+1
+        return
+
+    if value < stats[q]:
+        stats[q]=value
+        k=0
+    elif value >= stats[q+4]:
+        stats[q+4]=value
+        k=3
+    else:
+        k=0
+        while value >= stats[q+k+1]:
+            k+=1
+    for i in range(k+1, 5):
+        stats[n+i]+=1
+
+    increments=(0, p/2, p, (1+p)/2, 1)
+    for i in (1, 2, 3):
+        d=1+(count-1)*increments[i]-stats[n+i]
+        if (d >= 1 and stats[n+i+1]-stats[n+i] > 1) or (d <= -1 and stats[n+i-1]-stats[n+i] < -1):
+            s=1 if d > 0 else -1
+            parabolic=stats[q+i]+s/(stats[n+i+1]-stats[n+i-1])*(
+                (stats[n+i]-stats[n+i-1]+s)*(stats[q+i+1]-stats[q+i])/(stats[n+i+1]-stats[n+i])+
+                (stats[n+i+1]-stats[n+i]-s)*(stats[q+i]-stats[q+i-1])/(stats[n+i]-stats[n+i-1]))
+            if stats[q+i-1] < parabolic < stats[q+i+1]:
+                stats[q+i]=parabolic
+            else:
+                stats[q+i]+=s*(stats[q+i+s]-stats[q+i])/(stats[n+i+s]-stats[n+i])
+            stats[n+i]+=s
+
+
+def _sketchQuantile(stats, base, p, count):
+    if count < 5:
+        heights=sorted(stats[base:base+count])
+        return heights[min(int(p*count), count-1)]
+    return stats[base+2]
+
+
+class AnomalyDetector:
+    def __init__(self, fields=AnomalyFields):
+        self.fields=fields
+        self._lock=threading.Lock()
+        self._users={}      #{user: {field: array("d")}}
+        self.flagged=0
+
+    def __len__(self):
+        return len(self._users)
+
+    def update(self, user, data):
+        """
+        Adds the readings of a point to the user's statistics, flagging the ones that deviate
+
+        :param data: normalized readings {measurement: {field: value}}
+        :type data: dict
+        :return: {"events":[...], "metrics":[...], "data":{field:value}} or None if no reading deviates
+        :rtype: dict
+        """
+        output=None
+        with self._lock:
+            userStats=self._users.setdefault(user, {})
+            for fields in data.values():
+                for field, value in fields.items():
+                    if field not in self.fields or isinstance(value, bool) or not isinstance(value, (int, float)) or math.isnan(value):
+                        continue
+                    stats=userStats.get(field)
+                    if stats is None:
+                        stats=userStats[field]=array("d", bytes(8*FieldSize))
+                    elif stats[Last]==value:
+                        #polled again, the reading didn't change
+                        continue
+                    event=self._check(stats, field, value)
+                    self._add(stats, value)
+                    if event:
+                        self.flagged+=1
+                        if output is None:
+                            output={"events":[], "metrics":[], "data":{}}
+                        output["events"].append(event)
+                        output["metrics"].append(field)
+                        output["data"][field]=value
+        return output
+
+    def _check(self, stats, field, value):
+        count=int(stats[Count])
+        if count < AnomalyWarmup:
+            return None
+        deviation=max(math.sqrt(stats[Variance]), AnomalyMinDeviation*abs(stats[Mean]), AnomalyMinAbsoluteDeviation)
+        score=(value-stats[Mean])/deviation
+        if score >= AnomalyDeviations and value > _sketchQuantile(stats, High, HighQuantile, count):
+            return "Unusually High "+self.fields[field]
+        if score <= -AnomalyDeviations and value < _sketchQuantile(stats, Low, LowQuantile, count):
+            return "Unusually Low "+self.fields[field]
+        return None
+
+    @staticmethod
+    def _add(stats, value):
+        count=int(stats[Count])+1
+        stats[Count]=count
+        stats[Last]=value
+        if count==1:
+            stats[Mean]=value
+        else:
+            #plain running mean and variance until there are enough readings for the weighted ones
+            weight=max(AnomalyAlpha, 1/count)
+            difference=value-stats[Mean]
+            stats[Mean]+=weight*difference
+            stats[Variance]=(1-weight)*(stats[Variance]+weight*difference*difference)
+        _sketchUpdate(stats, Low, LowQuantile, value, count)
+        _sketchUpdate(stats, High, HighQuantile, value, count)
+
+    def baseline(self, user, field):
+        """
+        :return: {"count":int, "mean":float, "deviation":float, "low":float, "high":float} or None if the field has no readings
+        :rtype: dict
+        """
+        stats=self._users.get(user, {}).get(field)
+        if stats is None or stats[Count]==0:
+            return None
+        count=int(stats[Count])
+        return {"count":count, "mean":stats[Mean], "deviation":math.sqrt(stats[Variance]),
+                "low":_sketchQuantile(stats, Low, LowQuantile, count), "high":_sketchQuantile(stats, High, HighQuantile, count)}
+
+    def getState(self, user):
+        """
+        :return: the user's statistics, json serializable, or None if there are none
+        :rtype: dict
+        """
+        userStats=self._users.get(user)
+        if not userStats:
+            return None
+        return {field: list(stats) for field, stats in userStats.items()}
+
+    def setState(self, user, state):
+        """
+        Restores the statistics returned by getState, ignoring the fields with another layout
+        """
+        with self._lock:
+            self._users[user]={field: array("d", stats) for field, stats in (state or {}).items()
+                               if field in self.fields and len(stats)==FieldSize}
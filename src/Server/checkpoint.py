@@ -0,0 +1,54 @@
+import json
+import logging
+import os
+import time
+
+'''
+Compact on-disk checkpoint of the scheduler and the detectors' state, written on shutdown
+and read on startup so that polling resumes where it stopped instead of starting over.
+
+{"version":1, "savedAt":int, "users":{user: {"due":{metric:int}, "state":{metric:...}, "anomalies":{field:[...]}, "events":{event:[...]}}}}
+'''
+
+
+CheckpointVersion=1
+
+
+def loadCheckpoint(path):
+    """
+    :param path: file of the checkpoint
+    :type path: str
+    :return: the users' checkpoints {user: {"due":{...}, "state":{...}}}, empty if there's no valid checkpoint
+    :rtype: dict
+    """
+    try:
+        with open(path) as f:
+            data=json.load(f)
+        if data.get("version")!=CheckpointVersion:
+            logging.error("Ignoring checkpoint with unknown version "+str(data.get("version")))
+            return {}
+        logging.info("LOADED CHECKPOINT SAVED AT "+str(data["savedAt"])+" WITH "+str(len(data["users"]))+" USERS")
+        return data["users"]
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logging.error("Couldn't load checkpoint "+path+": "+str(e))
+        return {}
+
+
+def saveCheckpoint(path, users):
+    """
+    Writes the checkpoint atomically, a crash while writing never leaves a partial file
+
+    :param path: file of the checkpoint
+    :type path: str
+    :param users: {user: {"due":{...}, "state":{...}}}
+    :type users: dict
+    """
+    directory=os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp=path+".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"version":CheckpointVersion, "savedAt":int(time.time()), "users":users}, f, separators=(",", ":"))
+    os.replace(tmp, path)
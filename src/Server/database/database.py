@@ -4,6 +4,9 @@ from database.time_series.proxy import *
 from database.relational.proxy import *
 
 from database.exceptions import ProxyException, InternalException, LogicException
+from database import hypnogram, events
+from database.hot_tier import HotTier
+from database.day_cache import DayCache, DAY
 
 import datetime
 import time
@@ -26,12 +29,19 @@ class Database:
     """
     Proxy of proxies. Creates a global api to interact with all database types.
     """
+
+    # recent values of the clients and the values of past days, read before the time series database
+    hot_tier = None
+    day_cache = None
+
     def __init__(self):
         """
         Constructs a Database object, initializing the required specific proxies.
         """
         self.time_series_proxy = InfluxProxy()
         self.relational_proxy = MySqlProxy()
+        self.hot_tier = HotTier(self.time_series_proxy)
+        self.day_cache = DayCache(self.time_series_proxy)
 
     def register(self, data):
         """
@@ -276,6 +286,20 @@ class Database:
         except Exception as e:
             raise ProxyException(str(e))
 
+    def getAllUsersDevices(self):
+        """
+        Get all devices of every client on a single query. Used by the server at startup
+
+        :return: {username: [{device:int, type:int, token:str}, ...], ...}
+        :rtype: dict
+        """
+        try:
+            return self.relational_proxy.get_all_devices_of_all_users()
+        except (InternalException, LogicException):
+            raise
+        except Exception as e:
+            raise ProxyException(str(e))
+
     def getSupportedDevices(self):
         """
         Obtains all supported devices, that are integrated with the system,
@@ -292,7 +316,7 @@ class Database:
         except Exception as e:
             raise ProxyException(str(e))
 
-    def getData(self, measurement, user, start, end, interval):
+    def getData(self, measurement, user, start, end, interval, event_type=None, fields=None):
         """
         Method used to read from the time_series database.
 
@@ -306,6 +330,10 @@ class Database:
         :type end: int
         :param interval: size of interval like influx (ns, u, ms, s, m, h, d, w)
         :type interval: str
+        :param event_type: only the events of this type, used on the Event measurement
+        :type event_type: str
+        :param fields: only these fields (and the time), all if None. Not used on the Sleep and Event measurements
+        :type fields: list
         :return: {
                     time:[],
                     value:[],
@@ -313,11 +341,25 @@ class Database:
                     long:[],
                     hearth_rate:[],calories:[],...
                  }
+            the Event measurement returns {time:[], events:[{events:[], metrics:[], data:{}}, ...],
+             latitude:[], longitude:[], counts:{event type: count}}
         :rtype: dict
         """
         try:
             data = {}
 
+            if measurement == "Event":
+                tags = {"event": event_type} if event_type else None
+                if start is None and end is None and not interval:
+                    # the events that happened together are points of the same time, all of the last time are read
+                    latest = self.time_series_proxy.read(user, measurement, tags=tags, epoch="s")
+                    reads = self.time_series_proxy.read(user, measurement, latest[0]["time"], latest[0]["time"], tags=tags) if latest else []
+                else:
+                    reads = self.time_series_proxy.read(user, measurement, start, end, interval, tags=tags)
+                data = events.from_points(reads)
+                data["counts"] = self.time_series_proxy.count(user, measurement, "metrics", "event", start, end, interval)
+                return data
+
             if measurement == "Sleep":
                 if start is not None and end is not None: # within
                     start_date = datetime.date.fromtimestamp(start)
@@ -327,12 +369,13 @@ class Database:
                     start_date = datetime.date.fromtimestamp(start)
                     results = self.relational_proxy.get_sleep_sessions(user, begin=start_date)
                 elif end is not None: # just start None -> all from until end
-                    end_date = datetime.date.fromtimestamp(start)
+                    end_date = datetime.date.fromtimestamp(end)
                     results = self.relational_proxy.get_sleep_sessions(user, end=end_date)
                 else: #both None -> last
                     results = self.relational_proxy.get_sleep_sessions(user)
 
                 return_value = []
+                sessions = []
                 for day, sleep_begin, sleep_end, duration in results:
                     data = {
                         "info": {
@@ -340,27 +383,48 @@ class Database:
                             "begin": time.mktime(sleep_begin.timetuple()),
                             "end": time.mktime(sleep_end.timetuple()),
                             "duration": duration
-                        }
+                        },
+                        "data": {}
                     }
-                    session_data = {}
-                    for read in self.time_series_proxy.read(user, measurement, sleep_begin.timestamp(),
-                                                                               sleep_end.timestamp()):
-                        for key, value in read.items():
-                            if key == "username":
-                                continue
-                            if key not in session_data.keys():
-                                session_data[key] = []
-
-                            session_data[key].append(value)
-                    data["data"] = session_data
-
+                    sessions.append((int(sleep_begin.timestamp()), int(sleep_end.timestamp()), data["data"]))
                     return_value.append(data)
 
+                if not sessions:
+                    return return_value
+
+                # the stages of all sessions are read at once and split by session in memory
+                stages = []
+                for read in self.time_series_proxy.read(user, measurement, min(s[0] for s in sessions),
+                                                        max(s[1] for s in sessions), epoch="s"):
+                    if read.get("hypnogram") is not None:
+                        stages.extend(hypnogram.decode(read["hypnogram"], read["time"]))
+                    elif read.get("level") is not None:
+                        # stage written as a point of its own, before the sessions were compacted
+                        stages.append((read["time"], read["level"], read["seconds"]))
+                stages.sort(key=lambda stage: stage[0])
+
+                for stage_time, level, seconds in stages:
+                    for sleep_begin, sleep_end, session_data in sessions:
+                        if sleep_begin <= stage_time <= sleep_end:
+                            session_data.setdefault("time", []).append(
+                                time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(stage_time)))
+                            session_data.setdefault("level", []).append(level)
+                            session_data.setdefault("seconds", []).append(seconds)
+                            break
+
                 return return_value
 
+            reads = None
+            if self.hot_tier is not None:
+                reads = self.hot_tier.read(user, measurement, start, end, interval, fields)
+            if reads is None and self.day_cache is not None:
+                reads = self.day_cache.read(user, measurement, start, end, interval, fields)
+            if reads is None:
+                reads = self.time_series_proxy.read(user, measurement, start, end, interval, fields=fields)
+
             none_count = {}
             values_count = 0
-            for read in self.time_series_proxy.read(user, measurement, start, end, interval):
+            for read in reads:
                 values_count += 1
 
                 for key, value in read.items():
@@ -384,7 +448,7 @@ class Database:
         except Exception as e:
             raise ProxyException(str(e))
 
-    def getDataByMedic(self, medic, measurement, client, start, end, interval):
+    def getDataByMedic(self, medic, measurement, client, start, end, interval, event_type=None, fields=None):
         """
         Allows a medic to query a client's data
         First the server first verifies if the medic has permission to
@@ -402,6 +466,10 @@ class Database:
         :type end: int
         :param interval: size of interval like influx (ns, u, ms, s, m, h, d, w)
         :type interval: str
+        :param event_type: only the events of this type, used on the Event measurement
+        :type event_type: str
+        :param fields: only these fields (and the time), all if None. Not used on the Sleep and Event measurements
+        :type fields: list
         :return: {
                     time:[],
                     value:[],
@@ -417,7 +485,7 @@ class Database:
             if not self.relational_proxy.has_permission(medic, client):
                 raise LogicException("You don't have permission to access this data")
 
-            return self.getData(measurement, client, start, end, interval)
+            return self.getData(measurement, client, start, end, interval, event_type, fields)
         except (InternalException, LogicException):
             raise
         except Exception as e:
@@ -440,30 +508,33 @@ class Database:
         """
         try:
             if measurement == "Sleep":
+                # a single point per session, with the run-length intervals of its stages
+                to_write = [
+                    {
+                        "measurement": measurement,
+                        "time": data["begin"],
+                        "tags": {
+                            "username": user,
+                        },
+                        "fields": {
+                            "hypnogram": hypnogram.encode(data["sleep"], data["begin"]),
+                            "end": data["end"]
+                        }
+                    }
+                ]
 
+                # the session is only committed after its stages are written, so an overlapping
+                #  session is refused before anything is written and a failed write leaves no session
                 self.relational_proxy.insert_sleep_session(user,
                     data["day"],
                     data["duration"],
                     datetime.datetime.fromtimestamp(data["begin"]),
-                    datetime.datetime.fromtimestamp(data["end"]))
-
-                to_write = []
-                for point in data["sleep"]:
-                    time = point["time"]
-                    del point["time"]
-
-                    to_write.append(
-                        {
-                            "measurement": measurement,
-                            "time": time,
-                            "tags": {
-                                "username": user,
-                            },
-                            "fields": point
-                        }
-                    )
-
-                self.time_series_proxy.write(to_write)
+                    datetime.datetime.fromtimestamp(data["end"]),
+                    lambda: self.time_series_proxy.write(to_write))
+            elif measurement == "Event":
+                time = data["time"]
+                del data["time"]
+                self.time_series_proxy.write(events.to_points(data, user, time))
             else:
                 time = data["time"]
                 del data["time"]
@@ -479,6 +550,47 @@ class Database:
                         "fields": data
                     }]
                 )
+                if self.hot_tier is not None:
+                    self.hot_tier.add(measurement, data, user, time)
+                if self.day_cache is not None:
+                    self.day_cache.written(measurement, user, time)
+        except (InternalException, LogicException):
+            raise
+        except Exception as e:
+            raise ProxyException(str(e))
+
+    def insertMany(self, points):
+        """
+        Inserts several points to the influx database on a single request
+
+        :param points: [(measurement, fields:dict, user, time:int), ...]
+        :type points: list
+        """
+        try:
+            to_write = []
+            for measurement, fields, user, time in points:
+                if measurement == "Event":
+                    to_write += events.to_points(fields, user, time)
+                elif fields:
+                    to_write.append(
+                        {
+                            "measurement": measurement,
+                            "time": time,
+                            "tags": {
+                                "username": user,
+                            },
+                            "fields": fields
+                        }
+                    )
+            self.time_series_proxy.write(to_write)
+            if self.hot_tier is not None:
+                for measurement, fields, user, time in points:
+                    if measurement != "Event" and fields:
+                        self.hot_tier.add(measurement, fields, user, time)
+            if self.day_cache is not None:
+                # a day invalidated once per batch
+                for measurement, user, day in {(measurement, user, time // DAY) for measurement, fields, user, time in points}:
+                    self.day_cache.written(measurement, user, day * DAY)
         except (InternalException, LogicException):
             raise
         except Exception as e:
@@ -498,6 +610,10 @@ class Database:
         :type user: str
         """
         self.time_series_proxy.delete(user, measurement, time)
+        if self.hot_tier is not None:
+            self.hot_tier.invalidate(user, measurement)
+        if self.day_cache is not None:
+            self.day_cache.invalidate(user, measurement, time)
 
     def requestPermission(self, medic, data):
         """
@@ -618,6 +734,21 @@ class Database:
         except Exception as e:
             raise ProxyException(str(e))
 
+    def getAllAcceptedPermissions(self):
+        """
+        Used internally by the server to build the index of
+         which medics are monitoring each client
+
+        :return: tuples (client, medic, expiration_date)
+        :rtype: list
+        """
+        try:
+            return self.relational_proxy.get_all_accepted_permissions()
+        except (InternalException, LogicException):
+            raise
+        except Exception as e:
+            raise ProxyException(str(e))
+
     def allPermissionsData(self, user):
         """
         Used by both medic and client
@@ -0,0 +1,344 @@
+#!/usr/bin/python3
+
+"""
+Cache of the values of past days, read from the time series database a day at a time.
+
+The values of a day that ended don't change (except when deleted or written late, which
+invalidates the day), so a read over a range is split into day aligned chunks: the past days
+are answered from the cache, the ones missing are read from the database (each run of
+consecutive days on a single query, the runs in parallel) and only today is always read.
+The days are kept in memory and optionally on files of a local directory (a subdirectory per
+client), both capped with the least recently used evicted first.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from cachetools import LRUCache
+
+from database.time_series.proxy import interval_seconds
+
+__all__ = [
+    "DayCache",
+    "CACHED_MEASUREMENTS"
+]
+
+# measurements cached, the others (sleep sessions and events) are read differently
+CACHED_MEASUREMENTS = ("HealthStatus", "Environment", "PersonalStatus", "Path")
+DAY = 86400
+MAX_ROWS = 2000000          # values kept in memory, of all days
+FETCH_THREADS = 4           # runs of days missing read at once
+CACHE_DIRECTORY = os.environ.get("DAY_CACHE_DIRECTORY")    # where the days are also kept, only in memory if None
+MAX_DISK_BYTES = 1024 * 1024 * 1024                         # size of the files of all days
+
+
+class _Days(LRUCache):
+    """
+    Values of the days cached, forgetting the variants of the days evicted
+    """
+
+    def __init__(self, maxsize, variants):
+        LRUCache.__init__(self, maxsize=maxsize, getsizeof=lambda rows: max(len(rows), 1))
+        self.variants = variants
+
+    def popitem(self):
+        key, rows = LRUCache.popitem(self)
+        variants = self.variants.get(key[:3])
+        if variants is not None:
+            variants.discard(key[3])
+            if not variants:
+                del self.variants[key[:3]]
+        return key, rows
+
+
+class _DiskDays:
+    """
+    Days kept as json files, on a subdirectory per client, evicting the least recently used
+     when their size exceeds max_bytes
+    """
+
+    def __init__(self, directory, max_bytes=MAX_DISK_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._files = OrderedDict()     # {path: size}, the least recently used first
+        self.bytes = 0
+        self._load()
+
+    def _load(self):
+        """
+        Indexes the files left by a previous run, the least recently written first
+        """
+        files = []
+        try:
+            users = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for user in users:
+            try:
+                names = os.listdir(os.path.join(self.directory, user))
+            except NotADirectoryError:
+                continue
+            for name in names:
+                path = os.path.join(self.directory, user, name)
+                if name.endswith(".tmp"):
+                    os.remove(path)
+                    continue
+                status = os.stat(path)
+                files.append((status.st_mtime, path, status.st_size))
+        for modified, path, size in sorted(files):
+            self._files[path] = size
+            self.bytes += size
+        with self._lock:
+            self._evict()
+
+    def _user_directory(self, user):
+        return os.path.join(self.directory, hashlib.sha1(user.encode("UTF-8")).hexdigest())
+
+    def _path(self, key):
+        user, measurement, day, variant = key
+        return os.path.join(self._user_directory(user), "%s-%d-%s.json" % (measurement, day, hashlib.sha1(variant.encode("UTF-8")).hexdigest()[:16]))
+
+    def get(self, key):
+        path = self._path(key)
+        with self._lock:
+            if path not in self._files:
+                return None
+            self._files.move_to_end(path)
+        try:
+            with open(path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            self._discard(path)
+            return None
+
+    def put(self, key, rows):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "w") as file:
+                json.dump(rows, file)
+            os.replace(path + ".tmp", path)
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        with self._lock:
+            self.bytes += size - self._files.pop(path, 0)
+            self._files[path] = size
+            self._evict()
+
+    def invalidate(self, user, measurement, day=None):
+        """
+        Removes the files of a client's measurement, of a single day or all of them
+        """
+        prefix = measurement + "-" + ("" if day is None else str(day) + "-")
+        directory = self._user_directory(user)
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            if name.startswith(prefix):
+                self._discard(os.path.join(directory, name))
+
+    def _discard(self, path):
+        with self._lock:
+            self.bytes -= self._files.pop(path, 0)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and self._files:
+            path, size = self._files.popitem(last=False)
+            self.bytes -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class DayCache:
+    """
+    Values of each (client, measurement, day) that ended, read before the time series database
+    """
+
+    def __init__(self, time_series_proxy, max_rows=MAX_ROWS, directory=CACHE_DIRECTORY, max_disk_bytes=MAX_DISK_BYTES):
+        """
+        :param time_series_proxy: where the days missing are read from
+        :type time_series_proxy: InfluxProxy
+        :param directory: where the days are also kept, None to keep them only in memory
+        :type directory: str
+        :param max_disk_bytes: size of the files of all days
+        :type max_disk_bytes: int
+        """
+        self.time_series_proxy = time_series_proxy
+        self.disk = _DiskDays(directory, max_disk_bytes) if directory else None
+        self._lock = threading.Lock()
+        self._variants = {}     # {(user, measurement, day): {fields, ...}} cached in memory
+        self._days = _Days(max_rows, self._variants)
+        self._versions = {}     # {(user, measurement): version}, changed when a day is invalidated
+        self._executor = ThreadPoolExecutor(max_workers=FETCH_THREADS)
+        self.hits = 0
+        self.misses = 0
+        self.queries = 0
+
+    def read(self, user, measurement, begin_time=None, end_time=None, interval=None, fields=None):
+        """
+        Reads the values a day at a time, with the arguments and the result of InfluxProxy.read
+
+        :return: list of maps, or None if the values must be read from the database
+            (the range doesn't include past days or has no begin)
+        :rtype: list
+        """
+        if measurement not in CACHED_MEASUREMENTS:
+            return None
+
+        now = time.time()
+        if interval:
+            seconds = interval_seconds(interval)
+            if begin_time is not None:
+                begin, end = begin_time, begin_time + seconds
+            elif end_time is not None:
+                begin, end = end_time - seconds, end_time
+            else:
+                begin, end = now - seconds, now
+        elif begin_time is not None:
+            begin, end = begin_time, end_time if end_time is not None else now
+        else:
+            return None
+
+        today = int(now // DAY)
+        first = int(begin // DAY)
+        last = min(int(end // DAY), today - 1)
+        if first > last:
+            return None
+
+        variant = ",".join(fields) if fields else "*"
+        with self._lock:
+            version = self._versions.get((user, measurement), 0)
+        days = {}
+        missing = []
+        for day in range(first, last + 1):
+            rows = self._get((user, measurement, day, variant))
+            if rows is None:
+                missing.append(day)
+            else:
+                days[day] = rows
+        self.hits += len(days)
+        self.misses += len(missing)
+
+        runs = []
+        for day in missing:
+            if runs and runs[-1][1] == day - 1:
+                runs[-1][1] = day
+            else:
+                runs.append([day, day])
+        fetches = [self._executor.submit(self._fetch, user, measurement, run_first, run_last, fields)
+                   for run_first, run_last in runs]
+        if end >= today * DAY:
+            # today is always read, its values still arrive
+            reads = self.time_series_proxy.read(user, measurement, int(max(begin, today * DAY)), int(end), epoch="s", fields=fields)
+            self.queries += 1
+        else:
+            reads = []
+        for fetch in fetches:
+            for day, rows in fetch.result().items():
+                days[day] = rows
+                self._put((user, measurement, day, variant), rows, version)
+
+        rows = [row for day in range(first, last + 1) for row in days.get(day, ()) if begin <= row["time"] <= end]
+        return self._format(rows + reads)
+
+    def _fetch(self, user, measurement, first, last, fields):
+        """
+        Reads consecutive days on a single query
+
+        :return: {day: values}
+        :rtype: dict
+        """
+        reads = self.time_series_proxy.read(user, measurement, first * DAY, (last + 1) * DAY - 1, epoch="s", fields=fields)
+        self.queries += 1
+        days = {day: [] for day in range(first, last + 1)}
+        for read in reads:
+            days[int(read["time"] // DAY)].append(read)
+        return days
+
+    @staticmethod
+    def _format(rows):
+        """
+        Returns the values like the database, every row with all the columns and the time as RFC3339
+        """
+        columns = {}
+        for row in rows:
+            for key in row:
+                columns[key] = None
+        formatted = []
+        for row in rows:
+            values = dict(columns)
+            values.update(row)
+            values["time"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(row["time"]))
+            formatted.append(values)
+        return formatted
+
+    def invalidate(self, user, measurement, point_time=None):
+        """
+        Forgets the values of a day, after they changed on the database
+
+        :param point_time: time of the value that changed (seconds), all days if None
+        :type point_time: int
+        """
+        if measurement not in CACHED_MEASUREMENTS:
+            return
+        day = None if point_time is None else int(point_time // DAY)
+        with self._lock:
+            self._versions[(user, measurement)] = self._versions.get((user, measurement), 0) + 1
+            for key in [key for key in self._variants if key[:2] == (user, measurement) and day in (None, key[2])]:
+                for variant in self._variants.pop(key):
+                    self._days.pop(key + (variant,), None)
+        if self.disk:
+            self.disk.invalidate(user, measurement, day)
+
+    def written(self, measurement, user, point_time):
+        """
+        Invalidates the day of a value written, if it ended
+        """
+        if point_time < (time.time() // DAY) * DAY:
+            self.invalidate(user, measurement, point_time)
+
+    def _get(self, key):
+        with self._lock:
+            rows = self._days.get(key)
+        if rows is not None or not self.disk:
+            return rows
+        rows = self.disk.get(key)
+        if rows is None:
+            return None
+        with self._lock:
+            self._store(key, rows)
+        return rows
+
+    def _put(self, key, rows, version):
+        with self._lock:
+            # a day read while it was invalidated may be outdated
+            if self._versions.get(key[:2], 0) != version:
+                return
+            self._store(key, rows)
+        if self.disk:
+            self.disk.put(key, rows)
+
+    def _store(self, key, rows):
+        if len(rows) > self._days.maxsize:
+            return
+        self._variants.setdefault(key[:3], set()).add(key[3])
+        self._days[key] = rows
+
+    def stats(self):
+        return {"days": len(self._days), "rows": self._days.currsize, "diskBytes": self.disk.bytes if self.disk else 0,
+                "hits": self.hits, "misses": self.misses, "queries": self.queries}
@@ -0,0 +1,97 @@
+#!/usr/bin/python3
+
+"""
+Representation of the events on the time series database.
+
+An event payload {"events":[...], "metrics":[...], "data":{...}} is stored as a point per event,
+tagged with its type (so it can be filtered and counted by the database), with the numeric
+context of the payload as float fields and the metrics involved as a comma separated string.
+Reads group the points of the same time back into a payload.
+"""
+
+import json
+
+__all__ = [
+    "to_points",
+    "from_points"
+]
+
+# keys of the points that aren't part of the context of the event
+RESERVED = {"time", "username", "event", "metrics", "events", "latitude", "longitude"}
+
+
+def _number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value == value
+
+
+def to_points(fields, user, time):
+    """
+    :param fields: {"events": payload or its json, "latitude": float, "longitude": float}
+    :type fields: dict
+    :param user: username of the client
+    :type user: str
+    :param time: timestamp (seconds)
+    :type time: int
+    :return: points to write to the Event measurement
+    :rtype: list
+    """
+    payload = fields["events"]
+    if isinstance(payload, str):
+        payload = json.loads(payload)
+
+    values = {key: float(value) for key, value in (payload.get("data") or {}).items()
+              if key not in RESERVED and _number(value)}
+    for key in ("latitude", "longitude"):
+        value = fields.get(key)
+        if value is not None:
+            try:
+                values[key] = float(value)
+            except (TypeError, ValueError):
+                pass
+    values["metrics"] = ",".join(payload.get("metrics") or [])
+
+    return [
+        {
+            "measurement": "Event",
+            "time": time,
+            "tags": {
+                "username": user,
+                "event": event
+            },
+            "fields": values
+        }
+        for event in dict.fromkeys(payload.get("events") or [])
+    ]
+
+
+def from_points(reads):
+    """
+    :param reads: points of the Event measurement ordered by time, as returned by InfluxProxy.read
+    :type reads: list
+    :return: {time:[], events:[{events:[], metrics:[], data:{}}, ...], latitude:[], longitude:[]}
+    :rtype: dict
+    """
+    data = {"time": [], "events": [], "latitude": [], "longitude": []}
+    for read in reads:
+        if read.get("event") is None and isinstance(read.get("events"), str):
+            # written as a json string, before the migration
+            payload = json.loads(read["events"])
+        else:
+            payload = {
+                "events": [read["event"]],
+                "metrics": read["metrics"].split(",") if read.get("metrics") else [],
+                "data": {key: value for key, value in read.items() if key not in RESERVED and value is not None}
+            }
+
+        if data["time"] and data["time"][-1] == read["time"]:
+            last = data["events"][-1]
+            last["events"] += [event for event in payload["events"] if event not in last["events"]]
+            last["metrics"] += [metric for metric in payload["metrics"] if metric not in last["metrics"]]
+            last["data"].update(payload["data"])
+            continue
+
+        data["time"].append(read["time"])
+        data["events"].append(payload)
+        data["latitude"].append(read.get("latitude"))
+        data["longitude"].append(read.get("longitude"))
+    return data
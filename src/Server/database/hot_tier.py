@@ -0,0 +1,275 @@
+#!/usr/bin/python3
+
+"""
+In memory tier of the recent values of each client, read before the time series database.
+
+Each (client, measurement) keeps the values of the last HOT_WINDOW seconds as columns of doubles
+ordered by time, filled by the writes and, on its first read, by a single query to the database.
+Reads that only need values inside the window (the last value, short intervals) are answered from
+memory. The tier has a global memory cap, the clients read the longest time ago are evicted first.
+"""
+
+import bisect
+import math
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from database.time_series.proxy import interval_seconds
+
+__all__ = [
+    "HotTier",
+    "HOT_MEASUREMENTS"
+]
+
+# measurements kept in memory, all their fields are numbers
+HOT_MEASUREMENTS = ("HealthStatus", "Environment", "Path")
+HOT_WINDOW = 6 * 3600               # seconds of values kept per client and measurement
+MAX_BYTES = 64 * 1024 * 1024        # memory of all the values kept
+TRIM_INTERVAL = 60                  # seconds between the removal of the values that left the window
+
+
+def _cacheable(value):
+    return value is None or (isinstance(value, (int, float)) and not isinstance(value, bool))
+
+
+class _Series:
+    """
+    Values of a client on a measurement, a column per field with NaN where the field is missing
+    """
+
+    def __init__(self):
+        self.times = array("q")
+        self.columns = {}
+        self.integers = set()   # fields written as integers, returned as such
+        self.since = None       # the values after this time are all here, None while loading
+        self.trimmed = 0
+
+    @property
+    def nbytes(self):
+        return 8 * len(self.times) * (1 + len(self.columns))
+
+    def add(self, point_time, fields):
+        position = bisect.bisect_left(self.times, point_time)
+        if position == len(self.times) or self.times[position] != point_time:
+            self.times.insert(position, point_time)
+            for column in self.columns.values():
+                column.insert(position, math.nan)
+
+        for field, value in fields.items():
+            if value is None:
+                continue
+            column = self.columns.get(field)
+            if column is None:
+                column = self.columns[field] = array("d", [math.nan]) * len(self.times)
+            if isinstance(value, int):
+                self.integers.add(field)
+            # points with the same time are merged, like the database does
+            column[position] = value
+
+    def trim(self, horizon):
+        count = bisect.bisect_left(self.times, horizon)
+        if count:
+            del self.times[:count]
+            for column in self.columns.values():
+                del column[:count]
+
+    def rows(self, begin, end, fields, latest):
+        """
+        :return: the values between begin and end (inclusive) like the database returns them
+        :rtype: list
+        """
+        columns = [(field, self.columns[field], field in self.integers)
+                   for field in (fields if fields is not None else self.columns) if field in self.columns]
+        first = 0 if begin is None else bisect.bisect_left(self.times, begin)
+        last = len(self.times) if end is None else bisect.bisect_right(self.times, end)
+        positions = range(last - 1, first - 1, -1) if latest else range(first, last)
+
+        rows = []
+        for position in positions:
+            row = {"time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.times[position]))}
+            present = False
+            for field, column, integer in columns:
+                value = column[position]
+                if value != value:
+                    row[field] = None
+                else:
+                    row[field] = int(value) if integer else value
+                    present = True
+            # the database doesn't return the points without any of the fields selected
+            if not present and fields is not None:
+                continue
+            rows.append(row)
+            if latest:
+                break
+        if fields is not None:
+            for row in rows:
+                for field in fields:
+                    row.setdefault(field, None)
+        return rows
+
+
+class HotTier:
+    """
+    Recent values of each client, filled by the writes and read before the time series database
+    """
+
+    def __init__(self, time_series_proxy, window=HOT_WINDOW, max_bytes=MAX_BYTES):
+        """
+        :param time_series_proxy: where the values are loaded from on their first read
+        :type time_series_proxy: InfluxProxy
+        """
+        self.time_series_proxy = time_series_proxy
+        self.window = window
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._users = OrderedDict()     # {user: {measurement: _Series}}, the least recently read first
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._users)
+
+    def add(self, measurement, fields, user, point_time):
+        """
+        Adds a value written to the database. Only the clients already read are kept
+
+        :param fields: values of the point
+        :type fields: dict
+        :param point_time: timestamp (seconds)
+        :type point_time: int
+        """
+        if measurement not in HOT_MEASUREMENTS:
+            return
+        with self._lock:
+            series = self._users.get(user, {}).get(measurement)
+            if series is None:
+                return
+            if not all(_cacheable(value) for value in fields.values()):
+                self._remove(user, measurement)
+                return
+            if series.since is not None and point_time < series.since:
+                return
+            size = series.nbytes
+            series.add(int(point_time), fields)
+            self._bytes += series.nbytes - size
+            self._evict()
+
+    def invalidate(self, user, measurement=None):
+        """
+        Forgets the values of a client, after they are deleted from the database
+
+        :param measurement: only of this measurement, all if None
+        :type measurement: str
+        """
+        with self._lock:
+            for name in ([measurement] if measurement else list(self._users.get(user, {}))):
+                self._remove(user, name)
+
+    def read(self, user, measurement, begin_time=None, end_time=None, interval=None, fields=None):
+        """
+        Reads the values from memory if all of them are inside the window, with the arguments
+         and the result of InfluxProxy.read
+
+        :return: list of maps, or None if the values must be read from the database
+        :rtype: list
+        """
+        if measurement not in HOT_MEASUREMENTS:
+            return None
+
+        now = time.time()
+        latest = False
+        if interval:
+            seconds = interval_seconds(interval)
+            if begin_time is not None:
+                begin, end = begin_time, begin_time + seconds
+            elif end_time is not None:
+                begin, end = end_time - seconds, end_time
+            else:
+                begin, end = now - seconds, None
+        elif begin_time is None and end_time is None:
+            begin, end, latest = None, None, True
+        else:
+            begin, end = begin_time, end_time
+
+        if not latest and (begin is None or begin < now - self.window):
+            self.misses += 1
+            return None
+
+        series = self._series(user, measurement, now)
+        if series is None:
+            self.misses += 1
+            return None
+        with self._lock:
+            rows = series.rows(begin, end, fields, latest)
+        # the last value may be older than the window
+        if latest and not rows:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return rows
+
+    def _series(self, user, measurement, now):
+        """
+        :return: the series of the client, loaded from the database on its first read,
+            or None if it can't be kept in memory
+        :rtype: _Series
+        """
+        with self._lock:
+            series = self._users.setdefault(user, {}).get(measurement)
+            self._users.move_to_end(user)
+            if series is not None and series.since is not None:
+                if now - series.trimmed >= TRIM_INTERVAL:
+                    size = series.nbytes
+                    series.since = now - self.window
+                    series.trimmed = now
+                    series.trim(series.since)
+                    self._bytes += series.nbytes - size
+                return series
+            if series is None:
+                # the writes while it's loaded are kept on it
+                series = self._users[user][measurement] = _Series()
+
+        since = now - self.window
+        reads = self.time_series_proxy.read(user, measurement, interval="%ds" % self.window, epoch="s")
+
+        with self._lock:
+            if self._users.get(user, {}).get(measurement) is not series:
+                return None
+            if not all(_cacheable(value) for read in reads for key, value in read.items() if key not in ("time", "username")):
+                self._remove(user, measurement)
+                return None
+            size = series.nbytes
+            for read in reads:
+                series.add(int(read["time"]), {key: value for key, value in read.items() if key not in ("time", "username")})
+            series.since = since
+            series.trimmed = now
+            self._bytes += series.nbytes - size
+            self._evict(user)
+            return series if self._users.get(user, {}).get(measurement) is series else None
+
+    def _remove(self, user, measurement):
+        series = self._users.get(user, {}).pop(measurement, None)
+        if series is not None:
+            self._bytes -= series.nbytes
+
+    def _evict(self, keep=None):
+        """
+        Evicts the clients read the longest time ago while the memory cap is exceeded
+        """
+        while self._bytes > self.max_bytes and self._users:
+            user = next(iter(self._users))
+            if user == keep:
+                if len(self._users) == 1:
+                    break
+                self._users.move_to_end(user)
+                continue
+            for series in self._users.pop(user).values():
+                self._bytes -= series.nbytes
+            self.evicted += 1
+
+    def stats(self):
+        return {"users": len(self._users), "bytes": self._bytes, "hits": self.hits, "misses": self.misses, "evicted": self.evicted}
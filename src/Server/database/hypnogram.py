@@ -0,0 +1,50 @@
+#!/usr/bin/python3
+
+"""
+Compact representation of the stages of a sleep session (hypnogram), stored as a single
+value per session instead of a point per stage.
+
+The stages are run-length intervals relative to the begin of the session, consecutive stages
+with the same level are merged: "level:offset:seconds,level:offset:seconds,..."
+"""
+
+__all__ = [
+    "encode",
+    "decode"
+]
+
+
+def encode(stages, begin):
+    """
+    :param stages: [{time:int, level:str, seconds:int}, ...] ordered by time
+    :type stages: list
+    :param begin: begin of the session (seconds)
+    :type begin: int
+    :return: the run-length intervals of the stages
+    :rtype: str
+    """
+    runs = []
+    for stage in stages:
+        offset = int(stage["time"]) - begin
+        seconds = int(stage["seconds"])
+        if runs and runs[-1][0] == stage["level"] and runs[-1][1] + runs[-1][2] == offset:
+            runs[-1][2] += seconds
+        else:
+            runs.append([stage["level"], offset, seconds])
+    return ",".join("%s:%d:%d" % (level, offset, seconds) for level, offset, seconds in runs)
+
+
+def decode(hypnogram, begin):
+    """
+    :param hypnogram: value returned by encode
+    :type hypnogram: str
+    :param begin: begin of the session (seconds)
+    :type begin: int
+    :return: [(time:int, level:str, seconds:int), ...]
+    :rtype: list
+    """
+    stages = []
+    for run in hypnogram.split(",") if hypnogram else ():
+        level, offset, seconds = run.rsplit(":", 2)
+        stages.append((begin + int(offset), level, int(seconds)))
+    return stages
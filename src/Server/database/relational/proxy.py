@@ -15,10 +15,7 @@ from mysql.connector import errors
 from database.relational import config
 from database.exceptions import RelationalDBException, LogicException
 
-# for password hashing
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
-from cryptography.exceptions import InvalidKey
+# for password hashing (cryptography is only imported when first needed to keep it out of the startup path)
 from base64 import b64encode, b64decode
 from os import urandom
 
@@ -32,6 +29,7 @@ class StoredProcedures:
     INSERT_DEVICE = "insert_device"
     GET_CREDENTIALS = "get_credentials"
     GET_ALL_CLIENT_DEVICES = "get_all_client_devices"
+    GET_ALL_CLIENTS_DEVICES = "get_all_clients_devices"
     GET_ALL_SUPPORTED_DEVICES = "get_all_supported_devices"
     GET_USER_PROFILE_DATA = "get_user_info"
     UPDATE_CLIENT_PROFILE_DATA = "update_client_info"
@@ -51,6 +49,7 @@ class StoredProcedures:
     GET_EXPIRED_PERMISSIONS_OF_USER = "get_expired_permissions"
     GET_PENDING_PERMISSIONS_OF_USER = "get_pending_permissions"
     GET_ACCEPTED_PERMISSIONS_OF_USER = "get_accepted_permissions"
+    GET_ALL_ACCEPTED_PERMISSIONS = "get_all_accepted_permissions"
 
 SQL_STATE = "03000"
 
@@ -100,6 +99,27 @@ class MySqlProxy:
         cursor.close()
         conn.close()
 
+    @staticmethod
+    def _scrypt(salt):
+        """
+        Creates the key derivation function used on passwords
+
+        :param salt: random data used on the derivation
+        :type salt: bytes
+        :rtype: :class:`Scrypt`
+        """
+        from cryptography.hazmat.backends import default_backend
+        from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+        return Scrypt(
+            salt    = salt,
+            length  = 32,
+            n       = 2**14,
+            r       = 8,
+            p       = 1,
+            backend = default_backend()
+        )
+
     def _derive_password(self, password):
         """
         Derives a password with a salt
@@ -113,14 +133,7 @@ class MySqlProxy:
 
         password = bytes(password, "utf-8")
 
-        kdf = Scrypt(
-            salt    = salt,
-            length  = 32,
-            n       = 2**14,
-            r       = 8,
-            p       = 1,
-            backend = default_backend()
-        )
+        kdf = self._scrypt(salt)
 
         derived_password = kdf.derive(password)
 
@@ -137,16 +150,11 @@ class MySqlProxy:
         derived_password = b64decode(derived_password)
         salt = b64decode(salt)
 
+        from cryptography.exceptions import InvalidKey
+
         password = bytes(password, "utf-8")
 
-        kdf = Scrypt(
-            salt    = salt,
-            length  = 32,
-            n       = 2**14,
-            r       = 8,
-            p       = 1,
-            backend = default_backend()
-        )
+        kdf = self._scrypt(salt)
 
         try:
             kdf.verify(password, derived_password)
@@ -335,28 +343,8 @@ class MySqlProxy:
             cursor.callproc(StoredProcedures.GET_ALL_CLIENT_DEVICES, [username])
 
             devices = dict()
-            for (device_id,
-                 type_id,
-                 type,
-                 brand,
-                 model,
-                 photo, auth_field_name,
-                        auth_field_value, latitude,
-                                          longitude) in next(cursor.stored_results()).fetchall():
-                if device_id not in devices.keys():
-                    device = {
-                        "id": device_id,
-                        "type": "%s %s" % (brand, model),
-                        "photo": photo,
-                        "authentication_fields": {}
-                    }
-                    if latitude: # if one exist both exist
-                        device["latitude"] = latitude
-                        device["longitude"] = longitude
-                    devices[device_id] = device
-
-                if auth_field_name:
-                    devices[device_id]["authentication_fields"][auth_field_name] = auth_field_value
+            for row in next(cursor.stored_results()).fetchall():
+                self._parse_device_row(devices, row)
 
             return list(devices.values())
         except Exception as e:
@@ -366,6 +354,83 @@ class MySqlProxy:
         finally:
             self._close_conenction(conn, cursor)
 
+    def get_all_devices_of_all_users(self):
+        """
+        Obtains the devices of every client with a single query, parsing all rows
+         in one pass. Clients without devices are also present
+
+        :return: {username: [{device:int, type:int, token:str, uuid:str}, ...], ...}
+        :rtype: dict
+        """
+        try:
+            conn, cursor = self._init_connection()
+
+            cursor.callproc(StoredProcedures.GET_ALL_CLIENTS_DEVICES)
+
+            return self._parse_all_devices_rows(next(cursor.stored_results()).fetchall())
+        except Exception as e:
+            if isinstance(e, errors.Error) and e.sqlstate == SQL_STATE:
+                raise LogicException(e.msg)
+            raise RelationalDBException(str(e))
+        finally:
+            self._close_conenction(conn, cursor)
+
+    @staticmethod
+    def _parse_device_row(devices, row):
+        """
+        Adds a row returned by the get_all_client_devices procedure to the devices
+         being built, creating the device on its first row
+
+        :param devices: devices already parsed {device_id: device}
+        :type devices: dict
+        :param row: (device_id, type_id, type, brand, model, photo,
+            auth_field_name, auth_field_value, latitude, longitude)
+        :type row: tuple
+        """
+        (device_id,
+         type_id,
+         type,
+         brand,
+         model,
+         photo, auth_field_name,
+                auth_field_value, latitude,
+                                  longitude) = row
+        device = devices.get(device_id)
+        if device is None:
+            device = {
+                "id": device_id,
+                "type": "%s %s" % (brand, model),
+                "photo": photo,
+                "authentication_fields": {}
+            }
+            if latitude: # if one exist both exist
+                device["latitude"] = latitude
+                device["longitude"] = longitude
+            devices[device_id] = device
+
+        if auth_field_name:
+            device["authentication_fields"][auth_field_name] = auth_field_value
+
+    @staticmethod
+    def _parse_all_devices_rows(rows):
+        """
+        Parses the rows returned by the get_all_clients_devices procedure
+
+        :param rows: same columns as get_all_client_devices prefixed by the username
+        :type rows: list
+        :return: {username: [device, ...]}
+        :rtype: dict
+        """
+        users = dict()
+        for row in rows:
+            devices = users.get(row[0])
+            if devices is None:
+                devices = users[row[0]] = dict()
+            if row[1] is not None:
+                MySqlProxy._parse_device_row(devices, row[1:])
+
+        return {username: list(devices.values()) for username, devices in users.items()}
+
     def get_all_supported_devices(self):
         """
         Retrieves all supported devices by the system giving also
@@ -552,10 +617,11 @@ class MySqlProxy:
         finally:
             self._close_conenction(conn, cursor)
 
-    def insert_sleep_session(self, username, day, duration, begin, end):
+    def insert_sleep_session(self, username, day, duration, begin, end, before_commit=None):
         """
         Register a new sleep session on the database. Can fail if the new session
-        overlaps with existing ones in which concerns begin and end time
+        overlaps with existing ones in which concerns begin and end time.
+        If before_commit fails the session is rolled back
 
         :param username: of the client
         :type username: str
@@ -567,12 +633,21 @@ class MySqlProxy:
         :type begin: datetime.datetime
         :param end:
         :type end: datetime.datetime
+        :param before_commit: called after the session is inserted, before it is committed
+        :type before_commit: function
         """
         try:
             conn, cursor = self._init_connection()
 
             cursor.callproc(StoredProcedures.INSERT_SLEEP_SESSION, (username, day, duration, begin, end))
 
+            if before_commit:
+                try:
+                    before_commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+
             conn.commit()
         except Exception as e:
             if isinstance(e, errors.Error) and e.sqlstate == SQL_STATE:
@@ -857,6 +932,27 @@ class MySqlProxy:
         finally:
             self._close_conenction(conn, cursor)
 
+    def get_all_accepted_permissions(self):
+        """
+        Used by the main server to know, for every client, which medics
+         currently have access to his data
+
+        :return: tuples (client username, medic username, expiration date)
+        :rtype: list
+        """
+        try:
+            conn, cursor = self._init_connection()
+
+            cursor.callproc(StoredProcedures.GET_ALL_ACCEPTED_PERMISSIONS)
+
+            return next(cursor.stored_results()).fetchall()
+        except Exception as e:
+            if isinstance(e, errors.Error) and e.sqlstate == SQL_STATE:
+                raise LogicException(e.msg)
+            raise RelationalDBException(str(e))
+        finally:
+            self._close_conenction(conn, cursor)
+
     def _parse_permissions_data(self, data, type):
         """
         Parses permission's data from a list of tuples
@@ -15,6 +15,22 @@ from database.time_series import config
 from database.exceptions import TimeSeriesDBException, LogicException
 
 
+INTERVAL_UNITS = {"ns": 1e-9, "u": 1e-6, "ms": 1e-3, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def interval_seconds(interval):
+    """
+    :param interval: size of interval like influx (ns, u, ms, s, m, h, d, w)
+    :type interval: str
+    :return: the size in seconds
+    :rtype: float
+    """
+    for unit in ("ns", "ms", "u", "s", "m", "h", "d", "w"):
+        if interval.endswith(unit):
+            return int(interval[:-len(unit)]) * INTERVAL_UNITS[unit]
+    raise ValueError("Invalid interval " + interval)
+
+
 class InfluxProxy:
     """
     Proxy used to interact with a Influx database allowing writes and reads
@@ -46,10 +62,54 @@ class InfluxProxy:
         """
         try:
             self._get_connection.write_points(data, 's')
+        except influxdb.exceptions.InfluxDBClientError as e:
+            # the points are refused (ex: a field of another type), writing them again is pointless
+            if e.code is not None and 400 <= e.code < 500 and e.code != 429:
+                raise LogicException("Points rejected by the time series database: " + str(e))
+            raise TimeSeriesDBException(str(e))
         except Exception as e:
             raise TimeSeriesDBException(str(e))
 
-    def read(self, username, measurement, begin_time=None, end_time=None, interval=None):
+    @staticmethod
+    def _time_filter(begin_time, end_time, interval, params):
+        """
+        Conditions of the where clause on the time of the values, adding their parameters to params
+        """
+        query = ""
+        if interval:
+
+            if begin_time is not None:
+                query += " AND time >= $begin_time AND time <= $begin_time + " + interval
+                params["begin_time"] = begin_time * 1000000000
+
+            elif end_time is not None:
+                query += " AND time <= $end_time AND time >= $end_time - " + interval
+                params["end_time"] = end_time * 1000000000
+            else:
+                query += " AND time >= now() - " + interval
+
+        else:
+            if begin_time is not None:
+                query += " AND time >= $begin_time"
+                params["begin_time"] = begin_time * 1000000000
+
+            if end_time is not None:
+                query += " AND time <= $end_time"
+                params["end_time"] = end_time * 1000000000
+        return query
+
+    @staticmethod
+    def _tag_filter(tags, params):
+        """
+        Conditions of the where clause on the value of tags, adding their parameters to params
+        """
+        query = ""
+        for tag, value in (tags or {}).items():
+            query += ' AND "%s" = $tag_%s' % (tag, tag)
+            params["tag_" + tag] = value
+        return query
+
+    def read(self, username, measurement, begin_time=None, end_time=None, interval=None, epoch=None, tags=None, fields=None):
         """
         Get from the database data of a specific user and a specific measurement
         allowing also filtering results within a time interval
@@ -65,6 +125,12 @@ class InfluxProxy:
         :param interval: size of interval like influx (ns, u, ms, s, m, h, d, w)
             (nanoseconds, microseconds, milliseconds, seconds, minutes, hours, days, weeks)
         :type interval: str
+        :param epoch: precision of the times returned as epochs (h, m, s, ms, u, ns), None to return RFC3339 strings
+        :type epoch: str
+        :param tags: only the values with these tags {tag: value}
+        :type tags: dict
+        :param fields: fields selected, all (and the tags) if None. Values without any of them aren't returned
+        :type fields: list
         :return: list of maps
         :rtype: list
         """
@@ -76,42 +142,70 @@ class InfluxProxy:
             "username": username
         }
 
-        query = "SELECT * " + \
+        # identifiers can't be parameters, the fields must be validated by the caller
+        selected = ", ".join('"%s"' % field for field in fields) if fields else "*"
+
+        query = "SELECT %s " % selected + \
                 "FROM %s " % measurement + \
                 "WHERE username = $username"
 
-        if interval:
-
-            if begin_time is not None:
-                query += " AND time >= $begin_time AND time <= $begin_time + " + interval
-                params["begin_time"] = begin_time * 1000000000
+        query += self._tag_filter(tags, params)
+        query += self._time_filter(begin_time, end_time, interval, params)
 
-            elif end_time is not None:
-                query += " AND time <= $end_time AND time >= $end_time - " + interval
-                params["end_time"] = end_time * 1000000000
-            else:
-                query += " AND time >= now() - " + interval
-
-        elif begin_time is None and end_time is None:
+        if not interval and begin_time is None and end_time is None:
             query += " ORDER BY time DESC LIMIT 1"
 
-        else:
-            if begin_time is not None:
-                query += " AND time >= $begin_time"
-                params["begin_time"] = begin_time * 1000000000
-
-            if end_time is not None:
-                query += " AND time <= $end_time"
-                params["end_time"] = end_time * 1000000000
-
         try:
-            result = self._get_connection.query(query, {"params": json.dumps(params)}) # , epoch="s")
+            result = self._get_connection.query(query, {"params": json.dumps(params)}, epoch=epoch)
         except LogicException:
             raise
         except Exception as e:
             raise TimeSeriesDBException(str(e))
         return list(result.get_points(measurement))
 
+    def count(self, username, measurement, field, tag, begin_time=None, end_time=None, interval=None):
+        """
+        Counts the values of a user computed by the database, for each value of a tag
+
+        :param username: username of the client
+        :type username: str
+        :param measurement: measurement of the values
+        :type measurement: str
+        :param field: field present on every value
+        :type field: str
+        :param tag: the values are counted for each value of this tag
+        :type tag: str
+        :param begin_time: values after this (seconds), all if None
+        :type begin_time: int
+        :param end_time: values before this (seconds), all if None
+        :type end_time: int
+        :param interval: size of interval like influx (ns, u, ms, s, m, h, d, w)
+        :type interval: str
+        :return: {tag value: count}
+        :rtype: dict
+        """
+        params = {
+            "username": username
+        }
+
+        query = 'SELECT COUNT("%s") ' % field + \
+                "FROM %s " % measurement + \
+                "WHERE username = $username"
+        query += self._time_filter(begin_time, end_time, interval, params)
+        query += ' GROUP BY "%s"' % tag
+
+        try:
+            result = self._get_connection.query(query, {"params": json.dumps(params)})
+        except Exception as e:
+            raise TimeSeriesDBException(str(e))
+
+        counts = {}
+        for (series, tags), points in result.items():
+            value = (tags or {}).get(tag)
+            if value:
+                counts[value] = sum(point["count"] for point in points)
+        return counts
+
     def delete(self, username, measurement, time):
         """
         Deletes a single value associated with an user of a specific measurement
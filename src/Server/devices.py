@@ -1,15 +1,28 @@
 import json
+import time
 import requests
+from abc import abstractproperty
 from abstract.DataSource import DataSource
 from abstract.Metric import Metric
-import dateutil.parser as dp
+from abstract.exceptions import ExpiredToken, RateLimited, NoNewData
+from ratelimit import fitbitLimits
+from stats import requestRates
+from timestamps import isoToEpoch, isoSeriesToEpoch
 
 from base64 import b64encode
 
 
+FitbitAPI="https://api.fitbit.com"  #base url of the Fitbit web API
+FitbitResponseTTL=60                #seconds a response is reused by the metrics that read the same resource
+RequestTimeout=30                   #seconds to wait for an external API
+
+
 class FitBit_Charge_3(DataSource):
+    accountsRequests=True
+
     def __init__(self, authentication_fields, user, id, location):
         super().__init__(authentication_fields, user, id, location)
+        self._responses={}      #{url: (time, json)}
 
     @property
     def metrics(self):
@@ -30,7 +43,7 @@ class FitBit_Charge_3(DataSource):
 
     @property
     def _refreshURL(self):
-        return "https://api.fitbit.com/oauth2/token"
+        return FitbitAPI+"/oauth2/token"
 
     def refreshToken(self):
         try:
@@ -46,14 +59,190 @@ class FitBit_Charge_3(DataSource):
         except Exception as e:
             raise Exception("Unable to refresh tokens due to error: "+str(e))
 
+    def get(self, url, name):
+        """
+        Requests a resource of the Fitbit API within the rate limit of the client's account.
+        Several metrics read the same resource, so a recent response is reused
+
+        :param url: resource to get
+        :type url: str
+        :param name: of the metric requesting, for the error messages
+        :type name: str
+        :return: the json response
+        :rtype: dict
+        """
+        cached=self._responses.get(url)
+        if cached and time.time()-cached[0] < FitbitResponseTTL:
+            return cached[1]
+
+        limit=fitbitLimits.get(self.user)
+        wait=limit.acquire()
+        if wait > 0:
+            raise RateLimited("Rate limit of the Fitbit account reached, fetching "+name+" deferred", wait)
+        try:
+            requestRates.hit("api.fitbit.com")
+            response=requests.get(url, headers=self.header, timeout=RequestTimeout)
+        except Exception as e:
+            raise Exception("Error while fetching information for "+name+": "+str(e))
+        limit.observe(response.status_code, response.headers)
+
+        if response.status_code==401:
+            raise ExpiredToken("Couldn't fetch information at "+name+": expired token")
+        if response.status_code==429:
+            raise RateLimited("Couldn't fetch information at "+name+": too many requests", limit.state()["waitFor"])
+        try:
+            jsonData=json.loads(response.text)
+        except Exception as e:
+            raise Exception("Error while fetching information for "+name+": "+str(e))
+        if "success" in jsonData:
+            raise Exception("Couldn't fetch information at "+name+": "+jsonData["errors"][0]["errorType"])
+        self._responses[url]=(time.time(), jsonData)
+        return jsonData
+
+    def subscribe(self, subscriptionId):
+        """
+        Subscribes the notifications of all collections of the client's account, so the data
+         is fetched only when the band syncs. Subscribing again is harmless
+
+        :param subscriptionId: identifies the subscription on the notifications
+        :type subscriptionId: str
+        """
+        limit=fitbitLimits.get(self.user)
+        wait=limit.acquire()
+        if wait > 0:
+            raise RateLimited("Rate limit of the Fitbit account reached, subscription deferred", wait)
+        requestRates.hit("api.fitbit.com")
+        response=requests.post(FitbitAPI+"/1/user/-/apiSubscriptions/"+subscriptionId+".json", headers=self.header, timeout=RequestTimeout)
+        limit.observe(response.status_code, response.headers)
+        if response.status_code==401:
+            raise ExpiredToken("Couldn't subscribe notifications: expired token")
+        if response.status_code not in (200, 201):
+            raise Exception("Couldn't subscribe notifications: "+str(response.status_code)+" "+response.text[:200])
+
+    def unsubscribe(self, subscriptionId):
+        """
+        Removes the subscription of the notifications, when the device is deleted.
+        Removing one that doesn't exist is harmless
+
+        :param subscriptionId: identifies the subscription on the notifications
+        :type subscriptionId: str
+        """
+        limit=fitbitLimits.get(self.user)
+        wait=limit.acquire()
+        if wait > 0:
+            raise RateLimited("Rate limit of the Fitbit account reached, couldn't unsubscribe", wait)
+        requestRates.hit("api.fitbit.com")
+        response=requests.delete(FitbitAPI+"/1/user/-/apiSubscriptions/"+subscriptionId+".json", headers=self.header, timeout=RequestTimeout)
+        limit.observe(response.status_code, response.headers)
+        if response.status_code==401:
+            raise ExpiredToken("Couldn't unsubscribe notifications: expired token")
+        if response.status_code not in (204, 404):
+            raise Exception("Couldn't unsubscribe notifications: "+str(response.status_code)+" "+response.text[:200])
+
+
+def _date(pointTime):
+    """
+    :return: day of a timestamp, as on the Fitbit urls
+    :rtype: str
+    """
+    return time.strftime("%Y-%m-%d", time.gmtime(pointTime))
+
+
+class IntradayMetric(Metric):
+    """
+    Fitbit metric fetched as an intraday time series, only since the last point already ingested
+     (the mark). The new points are returned by series, the summary of the day by normalizeData.
+    The mark only moves once the points are stored, until then they are fetched again
+    """
 
-class HearthRate(Metric):
     def __init__(self, dataSource):
         super().__init__(dataSource)
+        self.mark = None        #time (epoch seconds) of the last point ingested
+        self.pending = None     #mark of the points returned on the last poll, until they are stored
+
+    @abstractproperty
+    def resource(self):
+        return ""
+
+    @abstractproperty
+    def detail(self):
+        return ""
+
+    @abstractproperty
+    def interval(self):
+        return 60
+
+    @abstractproperty
+    def seriesField(self):
+        return ""
 
     @property
     def URLTemplate(self):
-        return "https://api.fitbit.com/1/user/-/activities/heart/date/today/1d.json"
+        return FitbitAPI+"/1/user/-/activities/"+self.resource+"/date/DATE/1d/"+self.detail+"/time/START/23:59.json"
+
+    def getData(self, latitude=None, longitude=None):
+        now=int(time.time())
+        today=now-now%86400
+        begin=today
+        if self.mark is not None:
+            #a poll after midnight ends the previous day first, older days are not recovered
+            begin=int(max(self.mark+self.interval, today-86400))
+        begin=min(begin, now)
+
+        days=[]
+        for day in range(begin-begin%86400, today+1, 86400):
+            date=_date(day)
+            url=self.url.replace("DATE", date).replace("START", time.strftime("%H:%M", time.gmtime(max(begin, day))))
+            days.append([date, self.dataSource.get(url, self.__class__.__name__)])
+        return {"days":days}
+
+    def series(self, jsonData):
+        """
+        Points of the series after the mark, the last one becomes the mark once they are stored.
+        The point still being measured (its interval didn't end) is left for the next poll
+        """
+        now=time.time()
+        points=[]
+        for day, dayData in jsonData["days"]:
+            dataset=dayData["activities-"+self.resource+"-intraday"]["dataset"]
+            for point, pointTime in zip(dataset, isoSeriesToEpoch([day+"T"+point["time"] for point in dataset])):
+                if (self.mark is None or pointTime > self.mark) and pointTime+self.interval <= now:
+                    points.append((pointTime, {self.seriesField:point["value"]}))
+        self.pending=points[-1][0] if points else None
+        return points
+
+    def stored(self):
+        if self.pending is not None:
+            self.mark=self.pending
+            self.pending=None
+
+    def getState(self):
+        return {"mark":self.mark}
+
+    def setState(self, state):
+        self.mark=state.get("mark")
+
+
+class HearthRate(IntradayMetric):
+    def __init__(self, dataSource):
+        super().__init__(dataSource)
+        self.resting = None     #[day, restingHeartRate] last known, the responses of a time range often don't have it
+
+    @property
+    def resource(self):
+        return "heart"
+
+    @property
+    def detail(self):
+        return "1min"
+
+    @property
+    def interval(self):
+        return 60
+
+    @property
+    def seriesField(self):
+        return "intradayHeartRate"
 
     @property
     def updateTime(self):
@@ -63,39 +252,55 @@ class HearthRate(Metric):
     def metricType(self):
         return "HealthStatus"
 
+    @property
+    def collection(self):
+        return "activities"
+
     @property
     def metricLocation(self):
         return ""
 
     def getData(self, latitude=None, longitude=None):
-        try:
-            data=requests.get(self.url, headers=self.dataSource.header)
-            jsonData=json.loads(data.text)
-            if "success" in jsonData:
-                raise Exception("Couldn't fetch information at "+self.__class__.__name__+": "+jsonData["errors"][0]["errorType"])
-            return jsonData
-        except Exception as e:
-            raise Exception("Error while fetching information for "+self.__class__.__name__+": "+str(e))
+        jsonData=super().getData(latitude, longitude)
+        day, dayData=jsonData["days"][-1]
+        if self._restingHeartRate(dayData) is None and (self.resting is None or self.resting[0]!=day):
+            #the summary of the whole day, also read by Calories and Activity
+            jsonData["summary"]=self.dataSource.get(FitbitAPI+"/1/user/-/activities/date/"+day+".json", self.__class__.__name__)
+        return jsonData
+
+    @staticmethod
+    def _restingHeartRate(dayData):
+        value=dayData["activities-heart"][0]["value"] if dayData.get("activities-heart") else None
+        return value.get("restingHeartRate") if isinstance(value, dict) else None
 
     def normalizeData(self, jsonData):
-        return {"heartRate":jsonData["activities-heart"][0]["value"]["restingHeartRate"] if "restingHeartRate" in jsonData["activities-heart"][0]["value"] else None}
+        day, dayData=jsonData["days"][-1]
+        value=self._restingHeartRate(dayData)
+        if value is None and "summary" in jsonData:
+            value=jsonData["summary"]["summary"].get("restingHeartRate")
+        if value is not None:
+            self.resting=[day, value]
+        elif self.resting is not None and self.resting[0]==day:
+            value=self.resting[1]
+        return {"heartRate":value}
+
+    def getState(self):
+        return dict(super().getState(), resting=self.resting)
+
+    def setState(self, state):
+        super().setState(state)
+        self.resting=state.get("resting")
 
-    def checkEvent(self, normalJsonData):
-        hr = normalJsonData["heartRate"]
-        if hr:
-            if hr>=100:
-                return {"events":["High Heart Rate"], "metrics":["heartRate"]}
-            elif hr<=50:
-                return {"events":["Low Heart Rate"], "metrics":["heartRate"]}
-        return None
 
 class Sleep(Metric):
     def __init__(self, dataSource):
         super().__init__(dataSource)
+        self.session = None     #{"day":str, "logId":int, "main":bool} of the last session stored
+        self.pending = None     #session normalized on the last poll, until it is stored
 
     @property
     def URLTemplate(self):
-        return "https://api.fitbit.com/1.2/user/-/sleep/date/today.json"
+        return FitbitAPI+"/1.2/user/-/sleep/date/today.json"
 
     @property
     def updateTime(self):
@@ -105,34 +310,45 @@ class Sleep(Metric):
     def metricType(self):
         return "Sleep"
 
+    @property
+    def collection(self):
+        return "sleep"
+
     @property
     def metricLocation(self):
         return ""
 
     def getData(self, latitude=None, longitude=None):
-        try:
-            data=requests.get(self.url, headers=self.dataSource.header)
-            jsonData=json.loads(data.text)
-            if "success" in jsonData:
-                raise Exception("Couldn't fetch information at "+self.__class__.__name__+": "+jsonData["errors"][0]["errorType"])
-            return jsonData
-        except Exception as e:
-            raise Exception("Error while fetching information for "+self.__class__.__name__+": "+str(e))
+        #there's a single main sleep per day, once it is stored there's nothing new until tomorrow
+        if self.session and self.session["main"] and self.session["day"]==time.strftime("%Y-%m-%d", time.gmtime()):
+            raise NoNewData("Sleep of "+self.session["day"]+" already stored")
+        return self.dataSource.get(self.url, self.__class__.__name__)
 
     def normalizeData(self, jsonData):
-        sleepData = jsonData["sleep"][0]
+        if not jsonData["sleep"]:
+            raise NoNewData("No sleep logged today")
+        sleepData = next((sleep for sleep in jsonData["sleep"] if sleep.get("isMainSleep")), jsonData["sleep"][0])
+        if self.session and self.session["logId"]==sleepData.get("logId"):
+            raise NoNewData("Sleep "+str(sleepData.get("logId"))+" already stored")
+        self.pending={"day":sleepData["dateOfSleep"], "logId":sleepData.get("logId"), "main":sleepData.get("isMainSleep", True)}
         duration=round(sleepData["duration"]/1000)
-        begin=int(dp.parse(sleepData["startTime"]+"Z").strftime("%s"))
-        end=int(dp.parse(sleepData["endTime"]+"Z").strftime("%s"))
-        sleepEvents=[{k if k!="dateTime" else "time" : v if k!="dateTime" else int(dp.parse(v+"Z").strftime("%s")) for k,v in e.items()} for e in sleepData["levels"]["data"]]
+        begin=isoToEpoch(sleepData["startTime"])
+        end=isoToEpoch(sleepData["endTime"])
+        stages=sleepData["levels"]["data"]
+        times=isoSeriesToEpoch([e["dateTime"] for e in stages])
+        sleepEvents=[{k if k!="dateTime" else "time" : v if k!="dateTime" else t for k,v in e.items()} for e, t in zip(stages, times)]
         return {"duration":duration, "day":sleepData["dateOfSleep"], "begin":begin, "end":end, "sleep":sleepEvents}
 
-    def checkEvent(self, normalJsonData):
-        duration = normalJsonData["duration"]
-        if duration:
-            if duration < 7:
-                return {"events":["Not Enough Sleep"], "metrics":["duration"]}
-        return None
+    def stored(self):
+        if self.pending:
+            self.session=self.pending
+            self.pending=None
+
+    def getState(self):
+        return {"session":self.session}
+
+    def setState(self, state):
+        self.session=state.get("session")
 
 class Calories(Metric):
     def __init__(self, dataSource):
@@ -140,7 +356,7 @@ class Calories(Metric):
 
     @property
     def URLTemplate(self):
-        return "https://api.fitbit.com/1/user/-/activities/date/today.json"
+        return FitbitAPI+"/1/user/-/activities/date/today.json"
 
     @property
     def updateTime(self):
@@ -150,19 +366,16 @@ class Calories(Metric):
     def metricType(self):
         return "HealthStatus"
 
+    @property
+    def collection(self):
+        return "activities"
+
     @property
     def metricLocation(self):
         return ""
 
     def getData(self, latitude=None, longitude=None):
-        try:
-            data=requests.get(self.url, headers=self.dataSource.header)
-            jsonData=json.loads(data.text)
-            if "success" in jsonData:
-                raise Exception("Couldn't fetch information at "+self.__class__.__name__+": "+jsonData["errors"][0]["errorType"])
-            return jsonData
-        except Exception as e:
-            raise Exception("Error while fetching information for "+self.__class__.__name__+": "+str(e))
+        return self.dataSource.get(self.url, self.__class__.__name__)
 
     def normalizeData(self, jsonData):
         return {"calories":jsonData["summary"]["caloriesOut"]}
@@ -178,7 +391,7 @@ class Activity(Metric):
 
     @property
     def URLTemplate(self):
-        return "https://api.fitbit.com/1/user/-/activities/date/today.json"
+        return FitbitAPI+"/1/user/-/activities/date/today.json"
 
     @property
     def updateTime(self):
@@ -188,39 +401,53 @@ class Activity(Metric):
     def metricType(self):
         return "HealthStatus"
 
+    @property
+    def collection(self):
+        return "activities"
+
     @property
     def metricLocation(self):
         return ""
 
     def getData(self, latitude=None, longitude=None):
-        try:
-            data=requests.get(self.url, headers=self.dataSource.header)
-            jsonData=json.loads(data.text)
-            if "success" in jsonData:
-                raise Exception("Couldn't fetch information at "+self.__class__.__name__+": "+jsonData["errors"][0]["errorType"])
-            return jsonData
-        except Exception as e:
-            raise Exception("Error while fetching information for "+self.__class__.__name__+": "+str(e))
+        return self.dataSource.get(self.url, self.__class__.__name__)
 
     def normalizeData(self, jsonData):
         return {"fairlyActiveMinutes":jsonData["summary"]["fairlyActiveMinutes"], "lightlyActiveMinutes":jsonData["summary"]["lightlyActiveMinutes"], "sedentaryMinutes":jsonData["summary"]["sedentaryMinutes"], "veryActiveMinutes":jsonData["summary"]["veryActiveMinutes"]}
 
-    def checkEvent(self, normalJsonData):
-        sedentaryMinutes = normalJsonData["sedentaryMinutes"]
-        if sedentaryMinutes:
-            if sedentaryMinutes-self.previousValue > 5*60:
-                self.previousValue=sedentaryMinutes
-                return {"events":["Sedentary Behavior"], "metrics":["sedentaryMinutes"]}
-        return None
+    def getState(self):
+        return {"previousValue":self.previousValue}
+
+    def setState(self, state):
+        self.previousValue=state["previousValue"]
+
+class Steps(IntradayMetric):
+    """
+    The summary of a time range only counts the steps inside it, so the total of the day is the sum of
+     the points up to the mark, kept on the state, and of the points after it
+    """
 
-class Steps(Metric):
     def __init__(self, dataSource):
         super().__init__(dataSource)
         self.previousValue = 0
+        self.total = 0              #steps of the day of the mark, up to it
+        self.pendingTotal = None    #total of the pending mark
 
     @property
-    def URLTemplate(self):
-        return "https://api.fitbit.com/1/user/-/activities/date/today.json" 
+    def resource(self):
+        return "steps"
+
+    @property
+    def detail(self):
+        return "15min"
+
+    @property
+    def interval(self):
+        return 900
+
+    @property
+    def seriesField(self):
+        return "intradaySteps"
 
     @property
     def updateTime(self):
@@ -230,30 +457,48 @@ class Steps(Metric):
     def metricType(self):
         return "HealthStatus"
 
+    @property
+    def collection(self):
+        return "activities"
+
     @property
     def metricLocation(self):
         return ""
 
-    def getData(self, latitude=None, longitude=None):
-        try:
-            data=requests.get(self.url, headers=self.dataSource.header)
-            jsonData=json.loads(data.text)
-            if "success" in jsonData:
-                raise Exception("Couldn't fetch information at "+self.__class__.__name__+": "+jsonData["errors"][0]["errorType"])
-            return jsonData
-        except Exception as e:
-            raise Exception("Error while fetching information for "+self.__class__.__name__+": "+str(e))
+    def _totalBefore(self, day):
+        """
+        :return: steps of the day already counted, up to the mark
+        :rtype: int
+        """
+        return self.total if self.mark is not None and _date(self.mark)==day else 0
 
     def normalizeData(self, jsonData):
-        return {"steps":jsonData["summary"]["steps"]}
-
-    def checkEvent(self, normalJsonData):
-        steps = normalJsonData["steps"]
-        if steps:
-            if steps-self.previousValue  > 1000 and steps-self.previousValue < 1500 and steps < 3000:
-                self.previousValue=steps
-                return {"events":["Not Enough Exercise"], "metrics":["steps"]}
-        return None
+        day, dayData=jsonData["days"][-1]
+        #the response starts after the mark, the point still being measured is also counted
+        return {"steps":self._totalBefore(day)+sum(int(point["value"]) for point in dayData["activities-steps-intraday"]["dataset"])}
+
+    def series(self, jsonData):
+        points=super().series(jsonData)
+        if points:
+            day=_date(points[-1][0])
+            self.pendingTotal=self._totalBefore(day)+sum(int(fields[self.seriesField]) for pointTime, fields in points if _date(pointTime)==day)
+        return points
+
+    def stored(self):
+        if self.pending is not None:
+            self.total=self.pendingTotal
+        super().stored()
+
+    def getState(self):
+        return dict(super().getState(), previousValue=self.previousValue, total=self.total)
+
+    def setState(self, state):
+        super().setState(state)
+        self.previousValue=state["previousValue"]
+        self.total=state.get("total", 0)
+        if "total" not in state:
+            #checkpoints without the total, the whole day is fetched again
+            self.mark=None
 
 
 class Foobot(DataSource):
@@ -317,27 +562,6 @@ class Foobotmetric(Metric):
     def normalizeData(self, jsonData):
         return { metric : float(value) for metric, value in zip(["time","pm10","t","h","co2","voc","aqi"], jsonData["datapoints"][0])}
 
-    def checkEvent(self, normalJsonData):
-        output={"events":[], "metrics":[]}
-        aqi = normalJsonData["aqi"]
-        if aqi:
-            if aqi >= 75:
-                output["events"].append("High General Pollution Index")
-                output["metrics"].append("aqi")
-        pm10 = normalJsonData["pm10"]
-        if pm10:
-            if pm10 >= 40:
-                output["events"].append("High Percentage of Particle Matter(<10 um)")
-                output["metrics"].append("pm10")
-        voc = normalJsonData["voc"]
-        if voc:
-            if voc >= 350:
-                output["events"].append("High Percentage of Volatile Compounds")
-                output["metrics"].append("voc")
-        if output["events"]!=[]:
-            return output
-        return None
-
 
 class ExternalAPI(DataSource):
     def __init__(self, authentication_fields, user, id, location):
@@ -389,8 +613,8 @@ class WAQI(Metric):
 
     def getData(self, latitude=None, longitude=None):
         try:
-            lat="" if latitude is None else latitude
-            longi="" if longitude is None else longitude
+            lat="" if latitude is None else str(latitude)
+            longi="" if longitude is None else str(longitude)
             data=requests.get(self.url.replace("LATITUDE", lat).replace("LONGITUDE", longi), headers=self.dataSource.header)
             jsonData=json.loads(data.text)
             if "status" in jsonData and jsonData["status"]=="error":
@@ -402,42 +626,17 @@ class WAQI(Metric):
     def normalizeData(self, jsonData):
         return dict({metric:float(jsonData["data"]["iaqi"][metric]["v"]) for metric in jsonData["data"]["iaqi"]}, **{"aqi":float(jsonData["data"]["aqi"])})
 
-    def checkEvent(self, normalJsonData):
-        output={"events":[], "metrics":[]}
-        aqi = normalJsonData["aqi"]
-        if aqi:
-            if aqi >= 75:
-                output["events"].append("High General Pollution Index")
-                output["metrics"].append("aqi")
-        pm10 = normalJsonData["pm10"]
-        if pm10:
-            if pm10 >= 40:
-                output["events"].append("High Percentage of Particle Matter(<10 um)")
-                output["metrics"].append("pm10")
-        o3 = normalJsonData["o3"]
-        if o3:
-            if o3 >= 130:
-                output["events"].append("High Percentage of Ozone")
-                output["metrics"].append("o3")
-        pm25 = normalJsonData["pm25"]
-        if pm25:
-            if pm25 >= 55:
-                output["events"].append("High Percentage of Particle Matter(<2.5 um)")
-                output["metrics"].append("pm25")
-        so2 = normalJsonData["so2"]
-        if so2:
-            if so2 >= 180:
-                output["events"].append("High Percentage of Sulfur Dioxide")
-                output["metrics"].append("so2")
-        if output["events"]!=[]:
-            return output
-        return None
-
 
 
 class GPS(DataSource):
-    def __init__(self, authentication_fields, user, id, location):
+    def __init__(self, authentication_fields, user, id, location, locations=None):
+        """
+        :param locations: table of the last known locations pushed by the GPS module.
+            Without it the locations are requested to the GPS module
+        :type locations: LocationTable
+        """
         super().__init__(authentication_fields, user, id, location)
+        self.locations=locations
 
     @property
     def metrics(self):
@@ -483,7 +682,16 @@ class GPSmetric(Metric):
     def metricLocation(self):
         return ""
 
+    @property
+    def provider(self):
+        return "locations" if self.dataSource.locations is not None else super().provider
+
     def getData(self, latitude=None, longitude=None):
+        if self.dataSource.locations is not None:
+            location=self.dataSource.locations.get(self.dataSource.user)
+            if location is None:
+                raise Exception("Couldn't fetch information at "+self.__class__.__name__+": User Unknown")
+            return {"status":0, "data":location}
         try:
             data=requests.get(self.url.replace("USER", self.dataSource.user), headers=self.dataSource.header)
             jsonData=json.loads(data.text)
@@ -499,3 +707,34 @@ class GPSmetric(Metric):
     def checkEvent(self, normalJsonData):
         #irrelevant
         return None
+
+
+'''
+Registry of the devices that can be associated with a client, indexed by the type name stored
+on the database (brand + " " + model) with the spaces replaced by underscores
+'''
+SupportedDevices = {device.__name__: device for device in [FitBit_Charge_3, Foobot]}
+
+
+def createDevice(deviceType, authentication_fields, user, id, location):
+    """
+    Instantiates the DataSource of a device from its type name
+
+    :param deviceType: type of the device as stored on the database, ex: "FitBit Charge 3"
+    :type deviceType: str
+    :param authentication_fields: fields to access device's APIs
+    :type authentication_fields: dict
+    :param user: username of the client
+    :type user: str
+    :param id: id of the device
+    :type id: str
+    :param location: [latitude, longitude] of the device, only applicable for home devices
+    :type location: list
+    :return: the device's data source
+    :rtype: DataSource
+    """
+    deviceClass = SupportedDevices.get(deviceType.strip().replace(" ", "_"))
+    if deviceClass is None:
+        raise Exception("Unsupported device type "+deviceType)
+    return deviceClass(authentication_fields, user, id, location)
+
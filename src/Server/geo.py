@@ -0,0 +1,186 @@
+import math
+import threading
+
+'''
+Geographic helpers: great-circle distances, geohash cells and a grid index of the clients' home devices.
+
+The index splits the globe in square cells (in degrees) with a side of HomeRadius meters of latitude,
+so every home within HomeRadius of a point is in the point's cell or in its neighbours. Testing whether
+a GPS fix is at home is a lookup of a few cells followed by a bounding box and haversine check of the
+few homes found there, instead of an iterative geodesic distance to every device.
+'''
+
+
+HomeRadius=50           #distance (meters) from the personal home device the system should consider its information instead of the external one
+EarthRadius=6371008.8   #mean radius of the earth (meters)
+MetersPerDegree=math.pi*EarthRadius/180     #meters in a degree of latitude
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """
+    :return: great-circle distance between two points (meters)
+    :rtype: float
+    """
+    phi1=math.radians(lat1)
+    phi2=math.radians(lat2)
+    a=math.sin((phi2-phi1)/2)**2+math.cos(phi1)*math.cos(phi2)*math.sin(math.radians(lon2-lon1)/2)**2
+    return 2*EarthRadius*math.asin(math.sqrt(min(1.0, a)))
+
+
+def validLocation(location):
+    """
+    :param location: [latitude, longitude], possibly with missing values
+    :type location: list
+    :return: the location as a tuple of floats, or None if it isn't a valid coordinate
+    :rtype: tuple
+    """
+    try:
+        latitude, longitude=float(location[0]), float(location[1])
+    except (TypeError, ValueError, IndexError):
+        return None
+    if -90 < latitude < 90 and -180 < longitude < 180:
+        return latitude, longitude
+    return None
+
+
+GeohashAlphabet="0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash(latitude, longitude, precision):
+    """
+    :param precision: number of characters of the hash, 5 is a cell of ~4.9x4.9km
+    :type precision: int
+    :return: geohash of the cell that contains the point
+    :rtype: str
+    """
+    latitudeRange=[-90.0, 90.0]
+    longitudeRange=[-180.0, 180.0]
+    bits=0
+    bit=0
+    even=True
+    code=[]
+    while len(code) < precision:
+        interval, value=(longitudeRange, longitude) if even else (latitudeRange, latitude)
+        middle=(interval[0]+interval[1])/2
+        bits<<=1
+        if value >= middle:
+            bits|=1
+            interval[0]=middle
+        else:
+            interval[1]=middle
+        even=not even
+        bit+=1
+        if bit==5:
+            code.append(GeohashAlphabet[bits])
+            bits=0
+            bit=0
+    return "".join(code)
+
+
+def geohashCenter(code):
+    """
+    :return: (latitude, longitude) of the center of a geohash cell
+    :rtype: tuple
+    """
+    latitudeRange=[-90.0, 90.0]
+    longitudeRange=[-180.0, 180.0]
+    even=True
+    for char in code:
+        bits=GeohashAlphabet.index(char)
+        for shift in range(4, -1, -1):
+            interval=longitudeRange if even else latitudeRange
+            middle=(interval[0]+interval[1])/2
+            if bits>>shift & 1:
+                interval[0]=middle
+            else:
+                interval[1]=middle
+            even=not even
+    return (latitudeRange[0]+latitudeRange[1])/2, (longitudeRange[0]+longitudeRange[1])/2
+
+
+class HomeIndex:
+    """
+    Grid index of locations {key: (latitude, longitude, value)}, answering which values are
+     within the radius of a point. Writers are serialized, each cell is replaced as a whole
+     so readers never lock
+    """
+
+    def __init__(self, radius=HomeRadius, homes=()):
+        """
+        :param radius: distance (meters) at which a location is near a point
+        :type radius: float
+        :param homes: initial locations [(key, [latitude, longitude], value), ...]
+        :type homes: list
+        """
+        self.radius=radius
+        self.cellSize=radius/MetersPerDegree
+        self._lock=threading.Lock()
+        self._cells={}      #{cell: ((key, latitude, longitude, value), ...)}
+        self._keys={}       #{key: cell}
+        for key, location, value in homes:
+            self.add(key, location, value)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _cell(self, latitude, longitude):
+        return math.floor(latitude/self.cellSize), math.floor(longitude/self.cellSize)
+
+    def add(self, key, location, value):
+        """
+        Adds or moves a location. Invalid locations are ignored
+
+        :param key: identifies the location on the index
+        :param location: [latitude, longitude]
+        :type location: list
+        :param value: returned by near when the location is in the radius
+        """
+        location=validLocation(location)
+        with self._lock:
+            self._remove(key)
+            if location is None:
+                return
+            cell=self._cell(*location)
+            self._cells[cell]=self._cells.get(cell, ())+((key, location[0], location[1], value),)
+            self._keys[key]=cell
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        cell=self._keys.pop(key, None)
+        if cell is None:
+            return
+        entries=tuple(entry for entry in self._cells[cell] if entry[0]!=key)
+        if entries:
+            self._cells[cell]=entries
+        else:
+            del self._cells[cell]
+
+    def near(self, latitude, longitude):
+        """
+        :return: values of the locations within the radius of the point, closest first
+        :rtype: list
+        """
+        if not self._keys:
+            return []
+        row, column=self._cell(latitude, longitude)
+        #a cell is narrower in meters the further from the equator, so more columns must be visited
+        cosine=max(math.cos(math.radians(latitude)), 0.01)
+        columns=math.ceil(1/cosine)
+        latitudeSpan=self.cellSize
+        longitudeSpan=self.cellSize/cosine
+
+        found=[]
+        for r in (row-1, row, row+1):
+            for c in range(column-columns, column+columns+1):
+                for key, lat, lon, value in self._cells.get((r, c), ()):
+                    if abs(lat-latitude) > latitudeSpan or abs(lon-longitude) > longitudeSpan:
+                        continue
+                    distance=haversine(latitude, longitude, lat, lon)
+                    if distance <= self.radius:
+                        found.append((distance, value))
+        if len(found) > 1:
+            found.sort(key=lambda pair: pair[0])
+        return [value for distance, value in found]
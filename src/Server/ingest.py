@@ -0,0 +1,119 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from stats import requestRates
+from database.exceptions import LogicException, ProxyException
+
+'''
+Buffered writes to the time series database.
+
+Data that arrives point by point (ex: every GPS fix of every client) is queued and written on a single
+request per batch, either when the batch is full or after a short interval.
+Batches are retried while the database is unavailable, keeping at most MaxPending points, the oldest
+are dropped. The points the database refuses are isolated, by splitting their batch, and dropped.
+'''
+
+
+BatchSize=500       #max points written on a single request
+BatchInterval=1     #seconds a point may wait to be written
+MaxPending=100000   #points kept while the database is unavailable, the oldest are dropped
+
+
+class BatchWriter(threading.Thread):
+    def __init__(self, database, batchSize=BatchSize, interval=BatchInterval, maxPending=MaxPending):
+        threading.Thread.__init__(self, daemon=True)
+        self.database=database
+        self.batchSize=batchSize
+        self.interval=interval
+        self.maxPending=maxPending
+        self._pending=deque()     #[(sequence, measurement, fields, user, time), ...]
+        self._wake=threading.Event()
+        self._flushLock=threading.Lock()
+        self._addLock=threading.Lock()
+        self._sequence=0
+        self.done=0         #sequence of the last point written, all the ones added before it were too
+        self.running=True
+        self.written=0
+        self.dropped=0      #points dropped while the database was unavailable
+        self.rejected=0     #points the database refused
+
+    def add(self, measurement, fields, user, time):
+        """
+        :param measurement: where to write the point
+        :type measurement: str
+        :param fields: values of the point
+        :type fields: dict
+        :param user: username of the client
+        :type user: str
+        :param time: timestamp (seconds)
+        :type time: int
+        :return: sequence of the point, it is written once done reaches it
+        :rtype: int
+        """
+        with self._addLock:
+            if len(self._pending) >= self.maxPending:
+                self._pending.popleft()
+                self.dropped+=1
+            self._sequence+=1
+            self._pending.append((self._sequence, measurement, fields, user, time))
+            sequence=self._sequence
+        if len(self._pending) >= self.batchSize:
+            self._wake.set()
+        return sequence
+
+    def flush(self):
+        """
+        Writes all the pending points
+        """
+        with self._flushLock:
+            while self._pending:
+                batch=[]
+                while self._pending and len(batch) < self.batchSize:
+                    batch.append(self._pending.popleft())
+                if not self._write(batch):
+                    self._pending.extendleft(reversed(batch))
+                    return
+                self.done=batch[-1][0]
+
+    def _write(self, batch):
+        """
+        Writes a batch, dropping the points the database refuses
+
+        :return: False if the database is unavailable and the batch must be written again
+        :rtype: bool
+        """
+        try:
+            requestRates.hit("influxdb")
+            self.database.insertMany([point[1:] for point in batch])
+            self.written+=len(batch)
+            return True
+        except (LogicException, ProxyException) as e:
+            if len(batch)==1:
+                logging.error("Dropping a point refused by the database "+str(batch[0][1:])+": "+str(e))
+                self.rejected+=1
+                return True
+            #the halves with valid points only are written on a single request
+            half=len(batch)//2
+            return self._write(batch[:half]) and self._write(batch[half:])
+        except Exception as e:
+            logging.error("Couldn't write "+str(len(batch))+" points, retrying later: "+str(e))
+            return False
+
+    def run(self):
+        while self.running:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def end(self):
+        """
+        Stops the writer after writing the pending points
+        """
+        self.running=False
+        self._wake.set()
+        self.flush()
+
+    def stats(self):
+        return {"written":self.written, "pending":len(self._pending), "dropped":self.dropped, "rejected":self.rejected}
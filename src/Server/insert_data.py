@@ -3,6 +3,7 @@
 import influxdb
 import json
 from database.time_series import config
+from database import events
 import time
 import datetime
 import random
@@ -27,19 +28,15 @@ to_write = []
 
 while timestamp < last_timestamp:
     if random.random() < 0.1:
-        point = {
-          "measurement": "Event",
-          "time": timestamp,
-          "tags": {
-              "username": "aspedrosa2"
-          },
-          "fields": {
-              "events": "{\"events\":[\"Dor de cabeça\",\"Dor de cenas\"],\"metrics\": [\"PersonalStatus\",\"PersonalStatus\"],\"data\":{}}",
-              "latitude": latitude,
-              "longitude": longitude
-          }
-        }
-        to_write.append(point)
+        to_write += events.to_points(
+            {
+                "events": {"events": ["Dor de cabeça", "Dor de cenas"], "metrics": ["PersonalStatus", "PersonalStatus"], "data": {}},
+                "latitude": latitude,
+                "longitude": longitude
+            },
+            "aspedrosa2",
+            timestamp
+        )
         
 
     point = {
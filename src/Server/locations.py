@@ -0,0 +1,102 @@
+import json
+import logging
+import socketserver
+import threading
+import time
+
+from geo import validLocation
+
+'''
+Last known location of every client, pushed by the GPS module.
+
+The GPS module streams each fix it receives from the mobile app as a line of json
+{"user":str, "latitude":float, "longitude":float, "time":int} over a TCP connection, so the back end
+never has to poll it and gets every fix instead of one per poll.
+'''
+
+
+GPSStreamPort=5679      #port where the GPS module pushes the location updates
+
+
+class LocationTable:
+    """
+    {user: {"latitude":float, "longitude":float, "time":int}}. Each update replaces the entry
+     of the client as a whole, so readers never lock. Updates are locked, they arrive on several threads
+    """
+
+    def __init__(self):
+        self._locations={}
+        self._lock=threading.Lock()
+        self.updates=0
+
+    def __len__(self):
+        return len(self._locations)
+
+    def get(self, user):
+        """
+        :return: last known location of the client or None if unknown
+        :rtype: dict
+        """
+        return self._locations.get(user)
+
+    def update(self, user, latitude, longitude, time):
+        """
+        :return: False if the fix is older than the one already known
+        :rtype: bool
+        """
+        with self._lock:
+            current=self._locations.get(user)
+            if current and current["time"] > time:
+                return False
+            self._locations[user]={"latitude":latitude, "longitude":longitude, "time":time}
+            self.updates+=1
+            return True
+
+
+class LocationListener(socketserver.ThreadingTCPServer):
+    """
+    Receives the stream of fixes of the GPS module, updating the table with the most recent and
+     calling onFix(user, latitude, longitude, time) for each valid fix, even if out of order
+    """
+
+    daemon_threads=True
+    allow_reuse_address=True
+
+    def __init__(self, host, port, table, onFix=None):
+        socketserver.ThreadingTCPServer.__init__(self, (host, port), LocationHandler, bind_and_activate=False)
+        self.table=table
+        self.onFix=onFix
+        self.thread=None
+
+    def start(self):
+        self.server_bind()
+        self.server_activate()
+        self.thread=threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        logging.info("LOCATION LISTENER STARTED IN "+str(self.server_address[0])+":"+str(self.server_address[1]))
+
+    def end(self):
+        if self.thread:
+            self.shutdown()
+        self.server_close()
+
+    def receive(self, line):
+        try:
+            fix=json.loads(line)
+            location=validLocation([fix["latitude"], fix["longitude"]])
+            if location is None:
+                return
+            fixTime=int(fix.get("time") or time.time())
+            self.table.update(fix["user"], location[0], location[1], fixTime)
+            if self.onFix:
+                self.onFix(fix["user"], location[0], location[1], fixTime)
+        except Exception as e:
+            logging.error("Invalid location update "+str(line[:100])+": "+str(e))
+
+
+class LocationHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            line=line.strip()
+            if line:
+                self.server.receive(line.decode("UTF-8"))
@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+
+import argparse
+import json
+
+from database.time_series.proxy import InfluxProxy
+from database import events
+
+'''
+Converts the Event points written with the whole payload as a json string into the structured points
+(a point per event, tagged with its type), see database/events.py.
+
+The points of each client are converted in batches, ordered by time. Converting a batch again writes
+the same points, so the migration can be stopped and run again. The old points are only dropped at
+the end, with --drop, once every client was converted.
+
+    python3 migrate_events.py [--batch 5000] [--drop]
+'''
+
+
+BatchSize=5000      #old points read and converted per request
+
+
+def users(conn):
+    result=conn.query('SHOW TAG VALUES FROM "Event" WITH KEY = "username"')
+    return [point["value"] for point in result.get_points()]
+
+
+def migrateUser(conn, user, batchSize=BatchSize):
+    """
+    :return: number of old points converted
+    :rtype: int
+    """
+    converted=0
+    after=-1
+    while True:
+        params={"username":user, "after":after}
+        result=conn.query('SELECT * FROM "Event" WHERE "username" = $username AND "event" = \'\' AND time > $after ' +
+                          "ORDER BY time LIMIT %d" % batchSize, {"params":json.dumps(params)}, epoch="s")
+        reads=list(result.get_points("Event"))
+        if not reads:
+            return converted
+
+        points=[]
+        for read in reads:
+            if not isinstance(read.get("events"), str):
+                continue
+            points+=events.to_points(read, user, read["time"])
+        if points:
+            conn.write_points(points, "s")
+        converted+=len(reads)
+        after=reads[-1]["time"]*1000000000
+
+
+def main():
+    parser=argparse.ArgumentParser(description="Converts the Event points stored as json strings into structured points")
+    parser.add_argument("--batch", type=int, default=BatchSize, help="old points converted per request")
+    parser.add_argument("--drop", action="store_true", help="drops the old points after converting every client")
+    args=parser.parse_args()
+
+    conn=InfluxProxy()._get_connection
+    total=0
+    for user in users(conn):
+        converted=migrateUser(conn, user, args.batch)
+        total+=converted
+        print(user+": "+str(converted)+" events converted")
+
+    if args.drop:
+        #the old points are the series without the event tag
+        conn.query('DROP SERIES FROM "Event" WHERE "event" = \'\'')
+        print("old events dropped")
+    print(str(total)+" events converted")
+
+
+if __name__ == '__main__':
+    main()
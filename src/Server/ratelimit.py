@@ -0,0 +1,135 @@
+import threading
+import time
+
+'''
+Request budgets of the accounts of rate limited APIs (ex: Fitbit allows 150 requests per hour per user).
+
+Each account has a token bucket refilled at limit/period tokens per second. The quota the API reports on
+the response headers (remaining requests and seconds until the reset of its window) caps the bucket, so
+the polls are deferred before the API starts refusing them.
+'''
+
+
+FitbitHourlyLimit=150   #requests allowed per hour per Fitbit account
+ReservedRequests=5      #requests of the API window that are never used by polls, margin for other clients of the account
+
+
+class RateLimit:
+    """
+    Token bucket of an account, corrected by the quota reported by the API
+    """
+
+    def __init__(self, limit=FitbitHourlyLimit, period=3600):
+        """
+        :param limit: requests allowed per period
+        :type limit: int
+        :param period: seconds
+        :type period: int
+        """
+        self.limit=limit
+        self.period=period
+        self.tokens=float(limit)
+        self.updated=time.time()
+        self.remaining=None     #requests left on the API window, as reported on the last response
+        self.resetAt=None       #when the API window resets
+        self.blockedUntil=0     #set when the API refused a request
+        self.requests=0
+        self.deferred=0
+        self._lock=threading.Lock()
+
+    def _refill(self, now):
+        self.tokens=min(self.limit, self.tokens+(now-self.updated)*self.limit/self.period)
+        self.updated=now
+        if self.resetAt is not None and now >= self.resetAt:
+            self.remaining=None
+            self.resetAt=None
+
+    def _wait(self, now):
+        wait=max(self.blockedUntil-now, (1-self.tokens)*self.period/self.limit, 0)
+        if self.remaining is not None and self.remaining <= ReservedRequests:
+            wait=max(wait, self.resetAt-now)
+        return wait
+
+    def acquire(self):
+        """
+        Takes a request from the budget
+
+        :return: 0 if the request can be done, otherwise the seconds to wait for one
+        :rtype: float
+        """
+        now=time.time()
+        with self._lock:
+            self._refill(now)
+            wait=self._wait(now)
+            if wait > 0:
+                self.deferred+=1
+                return wait
+            self.tokens-=1
+            self.requests+=1
+            if self.remaining is not None:
+                self.remaining-=1
+            return 0
+
+    def observe(self, status, headers):
+        """
+        Updates the budget with the quota reported on a response
+
+        :param status: http status code of the response
+        :type status: int
+        :param headers: headers of the response
+        :type headers: dict
+        """
+        now=time.time()
+        with self._lock:
+            try:
+                if headers.get("Fitbit-Rate-Limit-Limit") is not None:
+                    self.limit=int(headers["Fitbit-Rate-Limit-Limit"])
+                if headers.get("Fitbit-Rate-Limit-Remaining") is not None and headers.get("Fitbit-Rate-Limit-Reset") is not None:
+                    self.remaining=int(headers["Fitbit-Rate-Limit-Remaining"])
+                    self.resetAt=now+int(headers["Fitbit-Rate-Limit-Reset"])
+                    self.tokens=min(self.tokens, max(self.remaining-ReservedRequests, 0))
+            except ValueError:
+                pass
+            if status==429:
+                try:
+                    retryAfter=int(headers.get("Retry-After"))
+                except (TypeError, ValueError):
+                    retryAfter=int(self.resetAt-now) if self.resetAt else 60
+                self.blockedUntil=now+retryAfter
+                self.tokens=0
+
+    def state(self):
+        now=time.time()
+        with self._lock:
+            self._refill(now)
+            return {"limit":self.limit, "remaining":self.remaining, "resetIn":round(self.resetAt-now) if self.resetAt else None,
+                    "budget":int(self.tokens), "waitFor":round(self._wait(now)), "requests":self.requests, "deferred":self.deferred}
+
+
+class RateLimits:
+    """
+    {account: RateLimit}
+    """
+
+    def __init__(self, limit=FitbitHourlyLimit, period=3600):
+        self.limit=limit
+        self.period=period
+        self._limits={}
+        self._lock=threading.Lock()
+
+    def get(self, account):
+        limit=self._limits.get(account)
+        if limit is None:
+            with self._lock:
+                limit=self._limits.setdefault(account, RateLimit(self.limit, self.period))
+        return limit
+
+    def state(self):
+        """
+        :return: {account: {limit, remaining, resetIn, budget, waitFor, requests, deferred}}
+        :rtype: dict
+        """
+        return {account: limit.state() for account, limit in list(self._limits.items())}
+
+
+fitbitLimits=RateLimits()
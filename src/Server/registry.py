@@ -0,0 +1,187 @@
+import math
+import threading
+from types import MappingProxyType
+
+from geo import HomeIndex, HomeRadius
+
+'''
+Registry of the devices and metrics of every client.
+
+The metrics of a client are kept on an immutable snapshot (UserRegistry) with all the lookups needed
+by the Processor and the AggregatorThreads already computed. Any change to the devices of a client
+builds a new snapshot that replaces the old one with a single reference swap, so readers never lock,
+never see a half updated registry and never rescan the metrics.
+'''
+
+
+PolledTypes=("GPS", "HealthStatus", "Sleep")    #types of metrics polled by the AggregatorThreads
+
+
+def metricKey(metric):
+    """
+    :return: key that identifies a metric among the ones of a client, even with several devices of the same type
+    :rtype: str
+    """
+    if metric.dataSource.id is None:
+        return metric.__class__.__name__
+    return metric.__class__.__name__+"/"+str(metric.dataSource.id)
+
+
+class UserRegistry:
+    """
+    Immutable snapshot of the data sources and metrics of a client
+    """
+
+    __slots__=("user", "devices", "deviceMetrics", "sharedMetrics", "metrics", "gps", "environmentInside", "environmentOutside", "homes", "schedule")
+
+    def __init__(self, user, devices, sharedMetrics, deviceMetrics={}):
+        """
+        :param user: username of the client
+        :type user: str
+        :param devices: data sources of the client (devices and GPS), each one with an unique id
+        :type devices: list
+        :param sharedMetrics: metrics of data sources shared by all clients (external APIs)
+        :type sharedMetrics: list
+        :param deviceMetrics: metrics already created for some of the devices {id: (metric, ...)},
+            so they keep their state between snapshots
+        :type deviceMetrics: dict
+        """
+        self.user=user
+        self.devices=MappingProxyType({device.id: device for device in devices})
+        self.deviceMetrics=MappingProxyType({device.id: deviceMetrics.get(device.id) or tuple(device.metrics) for device in devices})
+        self.sharedMetrics=tuple(sharedMetrics)
+
+        metrics={}
+        for deviceMetric in self.deviceMetrics.values():
+            for metric in deviceMetric:
+                metrics.setdefault(metric.metricType, []).append(metric)
+        for metric in sharedMetrics:
+            metrics.setdefault(metric.metricType, []).append(metric)
+
+        #{GPS: (metric,), HealthStatus: (metric, metric), Sleep:(metric,)}
+        self.metrics=MappingProxyType({metricType: tuple(typeMetrics) for metricType, typeMetrics in metrics.items()})
+        self.gps=self.metrics["GPS"][0] if "GPS" in self.metrics else None
+        self.environmentInside=tuple(metric for metric in self.metrics.get("Environment", ()) if metric.metricLocation=="inside")
+        self.environmentOutside=tuple(metric for metric in self.metrics.get("Environment", ()) if metric.metricLocation=="outside")
+        #home devices of the client by location, to check in O(1) if he is at home
+        self.homes=HomeIndex(HomeRadius, [(metricKey(metric), metric.dataSource.location, metric) for metric in self.environmentInside])
+        #(key, period in seconds, metric) of the metrics polled periodically
+        self.schedule=tuple((metricKey(metric), math.ceil(metric.updateTime)*60, metric)
+                            for metricType in PolledTypes for metric in self.metrics.get(metricType, ()) if metric.updateTime>0)
+
+    def __setattr__(self, name, value):
+        if hasattr(self, name):
+            raise AttributeError("UserRegistry is immutable")
+        object.__setattr__(self, name, value)
+
+    def withDevice(self, device):
+        """
+        :param device: new data source or a replacement for one with the same id.
+            A replacement inherits the state of the metrics of the old one
+        :type device: DataSource
+        :return: a new snapshot with the device
+        :rtype: UserRegistry
+        """
+        newMetrics=tuple(device.metrics)
+        previousMetrics={metric.__class__.__name__: metric for metric in self.deviceMetrics.get(device.id, ())}
+        for metric in newMetrics:
+            old=previousMetrics.get(metric.__class__.__name__)
+            if old is not None and old.getState() is not None:
+                metric.setState(old.getState())
+
+        devices=dict(self.devices)
+        devices[device.id]=device
+        deviceMetrics=dict(self.deviceMetrics)
+        deviceMetrics[device.id]=newMetrics
+        return UserRegistry(self.user, list(devices.values()), self.sharedMetrics, deviceMetrics)
+
+    def withoutDevice(self, deviceId):
+        """
+        :param deviceId: id of the data source to remove
+        :type deviceId: str
+        :return: a new snapshot without the device
+        :rtype: UserRegistry
+        """
+        return UserRegistry(self.user, [device for id, device in self.devices.items() if id!=deviceId], self.sharedMetrics, self.deviceMetrics)
+
+
+class DeviceRegistry:
+    """
+    Snapshots of all clients {user: UserRegistry}. Writers are serialized and replace the whole
+     map, readers just get the current one. The owner of every device is also indexed
+    """
+
+    def __init__(self):
+        self._lock=threading.Lock()
+        self._users=MappingProxyType({})
+        self._owners={}     #{device id: user}
+
+    def get(self, user):
+        """
+        :return: the current snapshot of the client or None if he isn't registered
+        :rtype: UserRegistry
+        """
+        return self._users.get(user)
+
+    def __contains__(self, user):
+        return user in self._users
+
+    def __len__(self):
+        return len(self._users)
+
+    def users(self):
+        return list(self._users.keys())
+
+    def device(self, deviceId):
+        """
+        :param deviceId: id of a device of any client
+        :type deviceId: str
+        :return: the current snapshot of the device's owner and the device, or (None, None)
+        :rtype: tuple
+        """
+        snapshot=self._users.get(self._owners.get(deviceId))
+        if snapshot is None or deviceId not in snapshot.devices:
+            return None, None
+        return snapshot, snapshot.devices[deviceId]
+
+    def _index(self, old, new):
+        for id in (old.devices if old else ()):
+            self._owners.pop(id, None)
+        for id in (new.devices if new else ()):
+            if id is not None:
+                self._owners[id]=new.user
+
+    def load(self, snapshots):
+        """
+        Adds several clients at once. Clients already present are kept
+
+        :param snapshots: {user: UserRegistry}
+        :type snapshots: dict
+        """
+        with self._lock:
+            users=dict(snapshots)
+            users.update(self._users)
+            for user, snapshot in snapshots.items():
+                if user not in self._users:
+                    self._index(None, snapshot)
+            self._users=MappingProxyType(users)
+
+    def update(self, user, change):
+        """
+        Atomically replaces the snapshot of a client
+
+        :param user: username of the client
+        :type user: str
+        :param change: receives the current snapshot (or None) and returns the new one
+        :type change: function
+        :return: the new snapshot
+        :rtype: UserRegistry
+        """
+        with self._lock:
+            old=self._users.get(user)
+            snapshot=change(old)
+            users=dict(self._users)
+            users[user]=snapshot
+            self._users=MappingProxyType(users)
+            self._index(old, snapshot)
+            return snapshot
@@ -0,0 +1,218 @@
+import operator
+import threading
+import time
+
+'''
+Detection of events from the normalized readings of the metrics, declared as a table of threshold rules.
+
+The table is compiled once into the rules of each metric class, each a list of comparisons bound to
+their operators. A batch of readings (all the metrics polled on a tick) is evaluated a column at a time:
+the readings are grouped by metric class and every rule is applied to the column of its field.
+Missing fields, None and 0 never trigger a rule, like a device that doesn't report a value.
+
+Rules with exit conditions have hysteresis: the event starts when the conditions hold and only ends
+when the exit conditions hold. The EventSuppressor turns the detections into start and end events of
+each client, instead of repeating the event on every poll while it lasts.
+'''
+
+
+Operators={">":operator.gt, ">=":operator.ge, "<":operator.lt, "<=":operator.le}
+
+SuppressionWindow=3600  #seconds after an event is emitted during which it isn't emitted again for the same client
+EndedSuffix=" Ended"    #appended to the name of an event when it ends
+
+#(metric class, field, [(operand, operator, constant), ...] all must hold, event, exit conditions or None)
+#the operand is "value", the reading, or "increase", the reading minus the one that last triggered the rule
+#events without exit conditions are punctual, they don't last
+Thresholds=[
+    ("HearthRate", "heartRate", [("value", ">=", 100)], "High Heart Rate", [("value", "<", 90)]),
+    ("HearthRate", "heartRate", [("value", "<=", 50)], "Low Heart Rate", [("value", ">", 55)]),
+    ("Sleep", "duration", [("value", "<", 7)], "Not Enough Sleep", None),
+    ("Activity", "sedentaryMinutes", [("increase", ">", 5*60)], "Sedentary Behavior", None),
+    ("Steps", "steps", [("increase", ">", 1000), ("increase", "<", 1500), ("value", "<", 3000)], "Not Enough Exercise", None),
+    ("Foobotmetric", "aqi", [("value", ">=", 75)], "High General Pollution Index", [("value", "<", 65)]),
+    ("Foobotmetric", "pm10", [("value", ">=", 40)], "High Percentage of Particle Matter(<10 um)", [("value", "<", 35)]),
+    ("Foobotmetric", "voc", [("value", ">=", 350)], "High Percentage of Volatile Compounds", [("value", "<", 300)]),
+    ("WAQI", "aqi", [("value", ">=", 75)], "High General Pollution Index", [("value", "<", 65)]),
+    ("WAQI", "pm10", [("value", ">=", 40)], "High Percentage of Particle Matter(<10 um)", [("value", "<", 35)]),
+    ("WAQI", "o3", [("value", ">=", 130)], "High Percentage of Ozone", [("value", "<", 115)]),
+    ("WAQI", "pm25", [("value", ">=", 55)], "High Percentage of Particle Matter(<2.5 um)", [("value", "<", 45)]),
+    ("WAQI", "so2", [("value", ">=", 180)], "High Percentage of Sulfur Dioxide", [("value", "<", 160)]),
+]
+
+
+def compileRules(table):
+    """
+    :param table: rules like the ones of Thresholds
+    :type table: list
+    :return: {metric class: [(field, checks, event, increase:bool, exit checks or None), ...]}
+        with checks as [(increase:bool, operator, constant), ...]
+    :rtype: dict
+    """
+    compiled={}
+    for metric, field, conditions, event, exit in table:
+        checks=_compileConditions(event, conditions)
+        exitChecks=None
+        if exit is not None:
+            exitChecks=_compileConditions(event, exit)
+            if any(check[0] for check in checks+exitChecks):
+                raise ValueError("The rule "+event+" has exit conditions, its conditions can't be on the increase")
+        compiled.setdefault(metric, []).append((field, checks, event, any(check[0] for check in checks), exitChecks))
+    return compiled
+
+
+def _compileConditions(event, conditions):
+    checks=[]
+    for operand, comparison, constant in conditions:
+        if operand not in ("value", "increase") or comparison not in Operators:
+            raise ValueError("Invalid condition of the rule "+event+": "+str((operand, comparison, constant)))
+        checks.append((operand=="increase", Operators[comparison], constant))
+    return checks
+
+
+class RuleEngine:
+    def __init__(self, table=Thresholds):
+        self.rules=compileRules(table)
+
+    def detect(self, readings):
+        """
+        Detects the events of a batch of readings. The rules on the increase of a value compare it with
+         the metric's previousValue, updated when they trigger
+
+        :param readings: [(metric, normalized data), ...]
+        :type readings: list
+        :return: the detections of each reading [(event, field, active, source), ...], active is True if the
+            event holds, False if its exit conditions hold and None if the event is punctual. The source is
+            the metric class, the same event of different sources (ex: indoor and outdoor pollution) is independent
+        :rtype: list
+        """
+        groups={}
+        for position, (metric, data) in enumerate(readings):
+            groups.setdefault(metric.__class__.__name__, []).append(position)
+
+        results=[[] for reading in readings]
+        for name, positions in groups.items():
+            for field, checks, event, increase, exitChecks in self.rules.get(name, ()):
+                column=[readings[position][1].get(field) for position in positions]
+                for position, value in zip(positions, column):
+                    if not value:
+                        continue
+                    metric=readings[position][0]
+                    previous=metric.previousValue if increase else 0
+                    for useIncrease, compare, constant in checks:
+                        if not compare(value-previous if useIncrease else value, constant):
+                            break
+                    else:
+                        if increase:
+                            metric.previousValue=value
+                        results[position].append((event, field, None if exitChecks is None else True, name))
+                        continue
+                    if exitChecks is not None and all(compare(value, constant) for useIncrease, compare, constant in exitChecks):
+                        results[position].append((event, field, False, name))
+        return results
+
+    def evaluate(self, readings):
+        """
+        Events that hold on a batch of readings, without hysteresis nor suppression
+
+        :param readings: [(metric, normalized data), ...]
+        :type readings: list
+        :return: the events of each reading, {"events":[...], "metrics":[...]} or None
+        :rtype: list
+        """
+        results=[]
+        for detections in self.detect(readings):
+            output=None
+            for event, field, active, source in detections:
+                if active is not False:
+                    if output is None:
+                        output={"events":[], "metrics":[]}
+                    output["events"].append(event)
+                    output["metrics"].append(field)
+            results.append(output)
+        return results
+
+
+class EventSuppressor:
+    """
+    Turns the detections of each client into start and end events. An event that lasts is emitted when
+     it starts and when it ends, not while it holds. An event isn't started again within the suppression
+     window of its last start: a relapse right after it ended is only announced if it still holds once
+     the window passed, and its end only if its start was announced
+    """
+
+    def __init__(self, window=SuppressionWindow):
+        self.window=window
+        self._lock=threading.Lock()
+        self._states={}     #{user: {source|event: [active:bool, announced:bool, last emitted start:float or None]}}
+        self.emitted=0
+        self.suppressed={}  #{event: count}
+
+    def apply(self, user, detections, now=None):
+        """
+        :param detections: [(event, field, active, source), ...] as returned by RuleEngine.detect
+        :type detections: list
+        :return: the events to emit {"events":[...], "metrics":[...]} or None
+        :rtype: dict
+        """
+        now=time.time() if now is None else now
+        output=None
+        with self._lock:
+            states=self._states.setdefault(user, {})
+            for event, field, active, source in detections:
+                key=source+"|"+event
+                state=states.get(key)
+                if active is False:
+                    if state is None or not state[0]:
+                        continue
+                    state[0]=False
+                    if not state[1]:
+                        self._suppress(event)
+                        continue
+                    name=event+EndedSuffix
+                else:
+                    if state is None:
+                        state=states[key]=[False, False, None]
+                    windowPassed=state[2] is None or now-state[2] >= self.window
+                    if state[0] and (state[1] or not windowPassed):
+                        self._suppress(event)
+                        continue
+                    #punctual events never stay active, a lasting one is announced once the window passed
+                    state[0]=active is True
+                    state[1]=windowPassed
+                    if not state[1]:
+                        self._suppress(event)
+                        continue
+                    state[2]=now
+                    name=event
+                self.emitted+=1
+                if output is None:
+                    output={"events":[], "metrics":[]}
+                #the same event of several sources is emitted once
+                if name not in output["events"]:
+                    output["events"].append(name)
+                    output["metrics"].append(field)
+        return output
+
+    def _suppress(self, event):
+        self.suppressed[event]=self.suppressed.get(event, 0)+1
+
+    def getState(self, user):
+        """
+        :return: the events of the user, json serializable, or None if there are none
+        :rtype: dict
+        """
+        return self._states.get(user) or None
+
+    def setState(self, user, state):
+        with self._lock:
+            self._states[user]={key: list(eventState) for key, eventState in (state or {}).items() if "|" in key and len(eventState)==3}
+
+    def stats(self):
+        with self._lock:
+            active=sum(1 for states in self._states.values() for state in states.values() if state[0])
+            return {"emitted":self.emitted, "suppressed":sum(self.suppressed.values()), "suppressedByEvent":dict(self.suppressed), "active":active}
+
+
+eventRules=RuleEngine()
+eventSuppressor=EventSuppressor()
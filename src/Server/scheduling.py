@@ -0,0 +1,39 @@
+import math
+from zlib import crc32
+
+'''
+Helpers to spread the polls of all users uniformly in time.
+
+Each (user, metric) pair has a phase offset inside its update period, derived from a stable hash of
+both names, so the offsets are the same after a restart without having to store them.
+A metric is due at every instant phase + k*period (epoch seconds), which means that after a restart
+the polls are not synchronized and, afterwards, they stay evenly distributed over each period.
+'''
+
+
+def phaseOffset(user, key, period):
+    """
+    :param user: username of the client
+    :type user: str
+    :param key: identifies the metric of the user, ex: its class name
+    :type key: str
+    :param period: update period of the metric (seconds)
+    :type period: int
+    :return: offset of the metric's due times inside its period (seconds)
+    :rtype: int
+    """
+    return crc32((str(user)+"/"+key).encode("UTF-8")) % period
+
+
+def nextDue(now, period, phase):
+    """
+    :param now: current time (epoch seconds)
+    :type now: float
+    :param period: update period (seconds)
+    :type period: int
+    :param phase: offset inside the period (seconds)
+    :type phase: int
+    :return: the first due time strictly after now (epoch seconds)
+    :rtype: int
+    """
+    return (math.floor((now-phase)/period)+1)*period+phase
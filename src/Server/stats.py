@@ -0,0 +1,46 @@
+import threading
+import time
+
+'''
+Lightweight runtime statistics of the server, exposed on the /stats path of the API.
+'''
+
+
+RateWindow=60   #seconds over which the request rates are averaged
+
+
+class RequestRates:
+    """
+    Counts the requests done to each provider (external APIs and databases) on a sliding window
+     of one-second buckets, giving the average requests per second over the last RateWindow seconds
+    """
+
+    def __init__(self, window=RateWindow):
+        self.window=window
+        self._lock=threading.Lock()
+        self._buckets={}     #{provider: [[second, count], ...]}
+
+    def hit(self, provider, count=1):
+        second=int(time.time())
+        with self._lock:
+            buckets=self._buckets.get(provider)
+            if buckets is None:
+                buckets=self._buckets[provider]=[[0, 0] for x in range(self.window)]
+            bucket=buckets[second % self.window]
+            if bucket[0]!=second:
+                bucket[0]=second
+                bucket[1]=0
+            bucket[1]+=count
+
+    def rates(self):
+        """
+        :return: {provider: requests per second}
+        :rtype: dict
+        """
+        now=int(time.time())
+        with self._lock:
+            return {provider: round(sum(count for second, count in buckets if now-second < self.window)/self.window, 3)
+                    for provider, buckets in self._buckets.items()}
+
+
+requestRates=RequestRates()
@@ -0,0 +1,77 @@
+#!/usr/bin/python3
+
+import time
+
+from database.database import Database
+from database.exceptions import TimeSeriesDBException
+from database.time_series.proxy import interval_seconds
+
+'''
+Stand-ins of the database shared by the tests
+'''
+
+
+class FakeTimeSeries:
+    """
+    Keeps the points written and answers like InfluxProxy: the tags and every field of the points
+     read are columns (None where missing), times are RFC3339 unless an epoch is asked
+    """
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.points = []
+        self.queries = 0
+
+    def _select(self, username, measurement, begin_time, end_time, interval, tags=None):
+        if interval:
+            seconds = interval_seconds(interval)
+            if begin_time is not None:
+                end_time = begin_time + seconds
+            elif end_time is not None:
+                begin_time = end_time - seconds
+            else:
+                begin_time = time.time() - seconds
+        return [point for point in sorted(self.points, key=lambda point: point["time"])
+                if point["measurement"] == measurement and point["tags"]["username"] == username
+                and all(point["tags"].get(tag) == value for tag, value in (tags or {}).items())
+                and (begin_time is None or point["time"] >= begin_time) and (end_time is None or point["time"] <= end_time)]
+
+    def read(self, username, measurement, begin_time=None, end_time=None, interval=None, epoch=None, tags=None, fields=None):
+        self.queries += 1
+        points = self._select(username, measurement, begin_time, end_time, interval, tags)
+        if fields:
+            points = [point for point in points if any(field in point["fields"] for field in fields)]
+            columns = list(fields)
+        else:
+            columns = list({key: None for point in points for key in list(point["tags"]) + list(point["fields"])})
+        reads = [dict({column: point["fields"].get(column, point["tags"].get(column)) for column in columns},
+                      time=point["time"] if epoch else time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(point["time"])))
+                 for point in points]
+        return reads[-1:] if begin_time is None and end_time is None and not interval else reads
+
+    def count(self, username, measurement, field, tag, begin_time=None, end_time=None, interval=None):
+        self.queries += 1
+        counts = {}
+        for point in self._select(username, measurement, begin_time, end_time, interval):
+            if field in point["fields"] and point["tags"].get(tag):
+                counts[point["tags"][tag]] = counts.get(point["tags"][tag], 0) + 1
+        return counts
+
+    def write(self, points):
+        if self.fail:
+            raise TimeSeriesDBException("influx unavailable")
+        self.points += points
+
+    def delete(self, username, measurement, point_time):
+        self.points = [point for point in self.points if not (point["measurement"] == measurement
+                       and point["tags"]["username"] == username and point["time"] == point_time)]
+
+
+def fakeDatabase(timeSeries=None, relational=None):
+    """
+    Database without connections, on the proxies given and without the caches
+    """
+    database = Database.__new__(Database)
+    database.time_series_proxy = timeSeries if timeSeries is not None else FakeTimeSeries()
+    database.relational_proxy = relational
+    return database
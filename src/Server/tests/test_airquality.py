@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+
+import unittest
+import threading
+import time
+
+import airquality
+from airquality import AirQualityCache
+from geo import geohash, geohashCenter
+
+
+class FakeWAQI:
+    """
+    Counts the requests, answering with the coordinates requested
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def fetch(self, latitude=None, longitude=None):
+        with self.lock:
+            self.requests += 1
+        return {"lat": latitude, "lon": longitude}
+
+    def normalizeData(self, jsonData):
+        return {"aqi": 10.0, "lat": jsonData["lat"]}
+
+
+class FlakyWAQI(FakeWAQI):
+    """
+    Slow requests, the first one failing, keeping how many were done at once
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.running = 0
+        self.concurrent = 0
+
+    def fetch(self, latitude=None, longitude=None):
+        with self.lock:
+            self.requests += 1
+            self.running += 1
+            self.concurrent = max(self.concurrent, self.running)
+            failing = self.requests == 1
+        time.sleep(0.05)
+        with self.lock:
+            self.running -= 1
+        if failing:
+            raise Exception("timeout")
+        return {"lat": latitude, "lon": longitude}
+
+
+class TestAirQualityCache(unittest.TestCase):
+
+    def test_geohash(self):
+        self.assertEqual(geohash(57.64911, 10.40744, 11), "u4pruydqqvj")
+        lat, lon = geohashCenter("ez4q1")
+        self.assertEqual(geohash(lat, lon, 5), "ez4q1")
+
+    def test_one_request_per_cell(self):
+        metric = FakeWAQI()
+        cache = AirQualityCache()
+        # 1000 users around Aveiro fall in a handful of cells
+        for i in range(1000):
+            data = cache.get(metric, 40.63 + (i % 10) * 0.001, -8.65 + (i % 7) * 0.001)
+            self.assertEqual(data["aqi"], 10.0)
+        self.assertLessEqual(metric.requests, 4)
+        stats = cache.stats()
+        self.assertEqual(stats["hits"] + stats["misses"], 1000)
+        self.assertGreater(stats["hitRatio"], 0.99)
+
+    def test_failed_fetch(self):
+        metric = FlakyWAQI()
+        cache = AirQualityCache()
+        results = []
+
+        def client():
+            try:
+                results.append(cache.get(metric, 40.63, -8.65)["aqi"])
+            except Exception as e:
+                results.append(str(e))
+
+        clients = [threading.Thread(target=client) for i in range(5)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join(5)
+        # after the first request fails, a single client fetches the cell again for the others
+        self.assertEqual(sorted(results, key=str), [10.0] * 4 + ["timeout"])
+        self.assertEqual((metric.requests, metric.concurrent), (2, 1))
+        self.assertEqual(cache.stats()["misses"], 5)
+
+    def test_prefetch(self):
+        metric = FakeWAQI()
+        cache = AirQualityCache()
+        cache.get(metric, 40.63, -8.65)
+        cache.prefetch()
+        self.assertEqual(metric.requests, 1)    # still fresh
+        default, airquality.PrefetchBefore = airquality.PrefetchBefore, cache.ttl
+        try:
+            cache.prefetch()
+        finally:
+            airquality.PrefetchBefore = default
+        self.assertEqual(metric.requests, 2)
+        self.assertEqual(cache.stats()["prefetches"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/python3
+
+import unittest
+import json
+from datetime import datetime, timedelta
+
+from alerts import PermissionIndex, AlertDispatcher
+
+
+class FakeSocket:
+    """
+    Websockets open for some tokens, keeping the alerts sent to each. The sends to the lost
+     connections are scheduled but fail
+    """
+
+    def __init__(self, open_tokens):
+        self.open = set(open_tokens)
+        self.failing = set()
+        self.lost = set()
+        self.sent = []
+
+    def notify(self, data, token, onSent=None):
+        if token in self.failing:
+            raise Exception("connection closed")
+        if token not in self.open:
+            return False
+        if token not in self.lost:
+            self.sent.append((token, json.loads(data)["events"]))
+            onSent()
+        return True
+
+
+class TestAlerts(unittest.TestCase):
+
+    event = {"events": ["High Heart Rate"], "metrics": ["heartRate"], "data": {}}
+
+    def setUp(self):
+        self.permissions = PermissionIndex()
+        later = datetime.now() + timedelta(hours=1)
+        self.permissions.load([("u", "medic", later), ("u", "other", later), ("u", "expired", datetime.now() - timedelta(hours=1))])
+        self.socket = FakeSocket(["t1", "t2", "t3", "t4"])
+        tokens = {"t1": "medic", "t2": "medic", "t3": "other", "t4": "expired", "t5": "unrelated"}
+        self.dispatcher = AlertDispatcher(self.socket, tokens, self.permissions)
+
+    def test_permissions(self):
+        self.assertEqual(sorted(self.permissions.medics("u")), ["medic", "other"])
+        self.permissions.revoke("u", "other")
+        self.assertEqual(self.permissions.medics("u"), ["medic"])
+        self.permissions.update("u", [{"username": "new", "duration": "01:30"}])
+        self.assertEqual(self.permissions.medics("u"), ["new"])
+        self.permissions.update("u", [])
+        self.assertEqual(self.permissions.medics("u"), [])
+
+    def test_fan_out(self):
+        self.dispatcher.dispatch("u", self.event, 10)
+        # every session of the medics with an active permission
+        self.assertEqual(sorted(token for token, events in self.socket.sent), ["t1", "t2", "t3"])
+        self.dispatcher.dispatch("v", self.event, 10)
+        self.assertEqual(len(self.socket.sent), 3)
+
+    def test_coalescing(self):
+        self.dispatcher.dispatch("u", self.event, 10)
+        self.dispatcher.dispatch("u", self.event, 20)
+        self.assertEqual(len(self.socket.sent), 3)
+        # only the new events of an alert are sent
+        self.dispatcher.dispatch("u", dict(self.event, events=["High Heart Rate", "Low Heart Rate"]), 30)
+        self.assertEqual(self.socket.sent[-1], ("t3", ["Low Heart Rate"]))
+        self.assertEqual(len(self.socket.sent), 6)
+
+    def test_undelivered(self):
+        self.socket.open.discard("t1")
+        self.socket.failing.add("t2")
+        self.socket.lost.add("t3")
+        self.dispatcher.dispatch("u", self.event, 10)
+        self.assertEqual(self.socket.sent, [])
+        # not sent yet, so not coalesced
+        self.socket.open.add("t1")
+        self.socket.failing.clear()
+        self.socket.lost.clear()
+        self.dispatcher.dispatch("u", self.event, 20)
+        self.assertEqual(sorted(token for token, events in self.socket.sent), ["t1", "t2", "t3"])
+
+    def test_tokens_changing(self):
+        class ChangingTokens(dict):
+            """
+            Changed by another thread during the first copy
+            """
+            copies = 0
+
+            def items(self):
+                ChangingTokens.copies += 1
+                if ChangingTokens.copies == 1:
+                    raise RuntimeError("dictionary changed size during iteration")
+                return super().items()
+
+        self.dispatcher.medicTokens = ChangingTokens(self.dispatcher.medicTokens)
+        self.dispatcher.dispatch("u", self.event, 10)
+        self.assertEqual(len(self.socket.sent), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+
+import unittest
+import json
+import random
+
+from anomaly import AnomalyDetector, FieldSize, High, Low, HighQuantile, LowQuantile, _sketchQuantile
+
+
+class TestAnomaly(unittest.TestCase):
+
+    def setUp(self):
+        self.detector = AnomalyDetector()
+        self.rand = random.Random(4)
+
+    def feed(self, user, count, mean=70, deviation=5):
+        for _ in range(count):
+            self.assertIsNone(self.detector.update(user, {"HealthStatus": {"heartRate": self.rand.gauss(mean, deviation)}}))
+
+    def test_flags_deviations(self):
+        self.feed("u", 49, deviation=1)
+        # still warming up
+        self.assertIsNone(self.detector.update("u", {"HealthStatus": {"heartRate": 200}}))
+        self.feed("u", 1000)
+        self.assertIsNone(self.detector.update("u", {"HealthStatus": {"heartRate": 80, "steps": 100000}}))
+        self.assertEqual(self.detector.update("u", {"HealthStatus": {"heartRate": 110}}),
+                         {"events": ["Unusually High Heart Rate"], "metrics": ["heartRate"], "data": {"heartRate": 110}})
+        self.assertEqual(self.detector.update("u", {"HealthStatus": {"heartRate": 40}})["events"], ["Unusually Low Heart Rate"])
+        # the baseline of another client isn't affected
+        self.feed("v", 100, mean=100)
+        self.assertIsNone(self.detector.update("v", {"HealthStatus": {"heartRate": 110}}))
+
+    def test_steady_baseline(self):
+        # the same resting heart rate polled all day, then a new day
+        for day in range(60):
+            for _ in range(288):
+                self.assertIsNone(self.detector.update("u", {"HealthStatus": {"heartRate": 60 + day % 2}}))
+        self.assertEqual(self.detector.baseline("u", "heartRate")["count"], 60)
+        self.assertIsNone(self.detector.update("u", {"HealthStatus": {"heartRate": 62}}))
+        self.assertEqual(self.detector.update("u", {"HealthStatus": {"heartRate": 90}})["events"], ["Unusually High Heart Rate"])
+
+    def test_sketch(self):
+        values = [self.rand.gauss(70, 5) for _ in range(20000)]
+        for value in values:
+            self.detector.update("u", {"HealthStatus": {"heartRate": value}})
+        values.sort()
+        stats = self.detector._users["u"]["heartRate"]
+        self.assertAlmostEqual(_sketchQuantile(stats, High, HighQuantile, 20000), values[int(0.99 * 20000)], delta=0.5)
+        self.assertAlmostEqual(_sketchQuantile(stats, Low, LowQuantile, 20000), values[int(0.01 * 20000)], delta=0.5)
+        baseline = self.detector.baseline("u", "heartRate")
+        self.assertAlmostEqual(baseline["mean"], 70, delta=2)
+        self.assertAlmostEqual(baseline["deviation"], 5, delta=1.5)
+
+    def test_state(self):
+        self.feed("u", 300)
+        state = json.loads(json.dumps(self.detector.getState("u")))
+        self.assertLess(len(json.dumps(state)), 1000)
+        self.assertEqual(len(self.detector._users["u"]["heartRate"]) * 8, FieldSize * 8)
+        restored = AnomalyDetector()
+        restored.setState("u", state)
+        self.assertEqual(restored.baseline("u", "heartRate"), self.detector.baseline("u", "heartRate"))
+        self.assertEqual(restored.update("u", {"HealthStatus": {"heartRate": 120}})["events"], ["Unusually High Heart Rate"])
+        self.assertIsNone(restored.getState("other"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+#!/usr/bin/python3
+
+import unittest
+import json
+import os
+import tempfile
+import time
+
+import Processor
+from checkpoint import loadCheckpoint, saveCheckpoint, CheckpointVersion
+from devices import createDevice
+from registry import DeviceRegistry, UserRegistry
+from airquality import AirQualityCache, PrefetchThread
+from locations import LocationTable, LocationListener
+from webhook import FitbitWebhook
+from ingest import BatchWriter
+from anomaly import AnomalyDetector
+from fakes import fakeDatabase, FakeTimeSeries
+
+
+class FakeProcessor:
+    """
+    What the AggregatorThreads use of the processor, without polling anything
+    """
+
+    def __init__(self, registries):
+        self.registry = DeviceRegistry()
+        self.registry.load(registries)
+        self.webhook = FitbitWebhook(None, None, None)
+        self.processed = []
+
+    def process(self, responses, user):
+        self.processed.append(responses)
+        return True
+
+
+def _registry(user):
+    fitbit = createDevice("FitBit Charge 3", {"token": "t", "refresh_token": "r", "client_id": "c", "client_secret": "s"},
+                          user, "1", [None, None])
+    return UserRegistry(user, [fitbit], [])
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "state", "checkpoint.json")
+
+    def test_round_trip(self):
+        now = time.time()
+        processor = FakeProcessor({"u": _registry("u")})
+        thread = Processor.AggregatorThread(processor, "u")
+        schedule = thread._schedule(now)
+        states = {}
+        for key, period, metric in schedule:
+            if metric.getState() is not None:
+                metric.setState({field: 1000 for field in metric.getState()})
+                states[key] = metric.getState()
+        self.assertTrue(states)
+
+        saveCheckpoint(self.path, {"u": thread.checkpoint()})
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["checkpoint.json"])
+        checkpoint = loadCheckpoint(self.path)
+
+        # new metrics, as after a restart, resume the due times and the state of the old ones
+        restarted = Processor.AggregatorThread(FakeProcessor({"u": _registry("u")}), "u", checkpoint["u"])
+        restored = restarted._schedule(now)
+        self.assertEqual(restarted.due_times, thread.due_times)
+        self.assertEqual({key: metric.getState() for key, period, metric in restored if key in states}, states)
+        self.assertEqual(restarted.checkpoint(), thread.checkpoint())
+
+    def test_pending(self):
+        # the state of the metrics not scheduled yet is kept on the next checkpoint
+        checkpoint = {"due": {"Gone/2": 10}, "state": {"Gone/2": {"mark": 5}}}
+        thread = Processor.AggregatorThread(FakeProcessor({}), "u", checkpoint)
+        thread._schedule(time.time())
+        self.assertEqual(thread.checkpoint(), checkpoint)
+
+    def test_unwritten_points(self):
+        processor = FakeProcessor({"u": _registry("u")})
+        processor.writer = BatchWriter(fakeDatabase(FakeTimeSeries(fail=True)))
+        thread = Processor.AggregatorThread(processor, "u")
+        key, period, metric = next(scheduled for scheduled in thread._schedule(time.time()) if hasattr(scheduled[2], "mark"))
+        metric.pending = 1000
+        thread.lastPoint = processor.writer.add(metric.metricType, {metric.seriesField: 1}, "u", 1000)
+        thread.unstored, thread.unstoredUntil = [metric], thread.lastPoint
+
+        # the mark only moves once the points are written
+        processor.writer.flush()
+        self.assertIsNone(thread.checkpoint()["state"][key]["mark"])
+        processor.writer.database.time_series_proxy.fail = False
+        processor.writer.flush()
+        self.assertEqual(thread.checkpoint()["state"][key]["mark"], 1000)
+
+    def test_invalid(self):
+        self.assertEqual(loadCheckpoint(self.path), {})
+        saveCheckpoint(self.path, {"u": {"due": {}, "state": {}}})
+        with open(self.path) as f:
+            data = json.load(f)
+        data["version"] = CheckpointVersion + 1
+        with open(self.path, "w") as f:
+            json.dump(data, f)
+        self.assertEqual(loadCheckpoint(self.path), {})
+        with open(self.path, "w") as f:
+            f.write('{"version":')
+        self.assertEqual(loadCheckpoint(self.path), {})
+
+
+class TestShutdown(unittest.TestCase):
+
+    def test_thread_end(self):
+        thread = Processor.AggregatorThread(FakeProcessor({}), "u")
+        thread.start()
+        time.sleep(0.1)
+        begin = time.perf_counter()
+        thread.end()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertLess(time.perf_counter() - begin, 1)
+
+    def test_processor_end(self):
+        with tempfile.TemporaryDirectory() as directory:
+            checkpointFile = Processor.CheckpointFile
+            Processor.CheckpointFile = os.path.join(directory, "checkpoint.json")
+            try:
+                processor = Processor.Processor.__new__(Processor.Processor)
+                processor.database = fakeDatabase()
+                processor.airQualityPrefetch = PrefetchThread(AirQualityCache())
+                processor.locationListener = LocationListener("127.0.0.1", 0, LocationTable())
+                processor.webhook = FitbitWebhook(None, None, None)
+                processor.writer = BatchWriter(processor.database)
+                processor.anomalies = AnomalyDetector()
+                processor.registry = DeviceRegistry()
+                processor.registry.load({"u": _registry("u"), "v": UserRegistry("v", [], [])})
+                processor.process = lambda responses, user: True
+                processor.userThreads = {}
+                for user in ["u", "v"]:
+                    processor.userThreads[user] = Processor.AggregatorThread(processor, user)
+                    processor.userThreads[user].start()
+                processor.writer.start()
+                time.sleep(0.1)
+
+                begin = time.perf_counter()
+                processor.end()
+                self.assertLess(time.perf_counter() - begin, 2)
+                self.assertFalse(any(thread.is_alive() for thread in processor.userThreads.values()))
+                self.assertEqual(sorted(loadCheckpoint(Processor.CheckpointFile)), ["u", "v"])
+            finally:
+                Processor.CheckpointFile = checkpointFile
+
+
+if __name__ == '__main__':
+    unittest.main()
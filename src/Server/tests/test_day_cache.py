@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+
+import unittest
+import os
+import tempfile
+import time
+
+from fakes import fakeDatabase
+from database.day_cache import DayCache, DAY
+
+
+class TestDayCache(unittest.TestCase):
+
+    def setUp(self):
+        self.now = int(time.time())
+        self.start = self.now - 39 * DAY
+        self.database = fakeDatabase()
+        self.proxy = self.database.time_series_proxy
+        self.database.day_cache = DayCache(self.proxy, directory=None)
+        self.database.insertMany([("HealthStatus", {"heartRate": 60 + i % 20}, "u", self.start + i * 3600) for i in range(39 * 24)])
+        self.database.insertMany([("HealthStatus", {"steps": 10}, "u", self.now - 1)])
+
+    def test_repeated_reads(self):
+        expected = self.readDatabase()
+        self.assertEqual(self.database.getData("HealthStatus", "u", self.start, self.now, None), expected)
+        # the past days on a single query and today
+        self.assertEqual(self.proxy.queries, 2)
+        self.proxy.queries = 0
+        self.assertEqual(self.database.getData("HealthStatus", "u", self.start, self.now, None), expected)
+        self.assertEqual(self.proxy.queries, 1)
+
+        # the days of a value deleted or written late are read again
+        self.proxy.queries = 0
+        self.database.delete("HealthStatus", self.start + 3600, "u")
+        self.database.insertMany([("HealthStatus", {"heartRate": 100}, "u", self.start + 20 * DAY)])
+        self.assertEqual(self.database.getData("HealthStatus", "u", self.start, self.now, None), self.readDatabase())
+        self.assertEqual(self.proxy.queries, 3)
+
+    def test_disk(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.database.day_cache = DayCache(self.proxy, directory=directory)
+            expected = self.database.getData("HealthStatus", "u", self.start, self.now, None, fields=["heartRate"])
+            self.proxy.queries = 0
+            # a new cache, after a restart
+            self.database.day_cache = DayCache(self.proxy, directory=directory)
+            self.assertEqual(self.database.getData("HealthStatus", "u", self.start, self.now, None, fields=["heartRate"]), expected)
+            self.assertEqual(self.proxy.queries, 1)
+
+            self.database.delete("HealthStatus", self.start + 3600, "u")
+            self.database.day_cache = DayCache(self.proxy, directory=directory)
+            self.database.getData("HealthStatus", "u", self.start, self.now, None, fields=["heartRate"])
+            self.assertEqual(self.proxy.queries, 3)
+
+    def test_disk_cap(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.database.day_cache = DayCache(self.proxy, directory=directory, max_disk_bytes=4000)
+            self.database.getData("HealthStatus", "u", self.start, self.now, None)
+            disk = self.database.day_cache.disk
+            self.assertLessEqual(disk.bytes, 4000)
+            self.assertEqual(disk.bytes, sum(os.path.getsize(os.path.join(root, name))
+                                             for root, directories, names in os.walk(directory) for name in names))
+            # the last days read are the ones kept
+            self.assertIsNotNone(disk.get(("u", "HealthStatus", self.now // DAY - 1, "*")))
+            self.assertIsNone(disk.get(("u", "HealthStatus", self.start // DAY, "*")))
+            # the files left are indexed again after a restart
+            self.assertEqual(DayCache(self.proxy, directory=directory, max_disk_bytes=4000).disk.bytes, disk.bytes)
+
+    def readDatabase(self):
+        cache = self.database.day_cache
+        self.database.day_cache = None
+        try:
+            return self.database.getData("HealthStatus", "u", self.start, self.now, None)
+        finally:
+            self.database.day_cache = cache
+            self.proxy.queries -= 1
+
+
+if __name__ == '__main__':
+    unittest.main()
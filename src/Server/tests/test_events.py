@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+
+import unittest
+import json
+
+from database import events
+from fakes import fakeDatabase
+
+
+class TestEvents(unittest.TestCase):
+
+    payload = {"events": ["High Heart Rate", "Unusually High Heart Rate"], "metrics": ["heartRate"],
+               "data": {"heartRate": 130, "note": "text", "valid": True}}
+
+    def test_points(self):
+        points = events.to_points({"events": json.dumps(self.payload), "latitude": "40.6", "longitude": -8.6}, "u", 10)
+        self.assertEqual([point["tags"] for point in points],
+                         [{"username": "u", "event": "High Heart Rate"}, {"username": "u", "event": "Unusually High Heart Rate"}])
+        # only numbers are kept on the context, as floats
+        self.assertEqual(points[0]["fields"], {"heartRate": 130.0, "latitude": 40.6, "longitude": -8.6, "metrics": "heartRate"})
+
+        read = [dict(point["fields"], time=10, event=point["tags"]["event"]) for point in points]
+        self.assertEqual(events.from_points(read), {"time": [10], "latitude": [40.6], "longitude": [-8.6],
+                                                    "events": [{"events": self.payload["events"], "metrics": ["heartRate"],
+                                                                "data": {"heartRate": 130.0}}]})
+
+    def test_legacy_points(self):
+        read = [{"time": 5, "events": json.dumps(self.payload), "latitude": None, "longitude": None}]
+        self.assertEqual(events.from_points(read)["events"], [self.payload])
+
+    def test_filter_and_counts(self):
+        database = fakeDatabase()
+        database.insertMany([("Event", {"events": self.payload}, "u", 10),
+                             ("Event", {"events": {"events": ["High Heart Rate"], "metrics": ["heartRate"]}}, "u", 20),
+                             ("Event", {"events": {"events": ["Not Enough Sleep"], "metrics": ["duration"]}}, "v", 20)])
+
+        data = database.getData("Event", "u", 0, 30, None, "High Heart Rate")
+        self.assertEqual(data["time"], ["1970-01-01T00:00:10Z", "1970-01-01T00:00:20Z"])
+        self.assertEqual([payload["events"] for payload in data["events"]], [["High Heart Rate"], ["High Heart Rate"]])
+        # the counts are of every type, computed by the database
+        self.assertEqual(data["counts"], {"High Heart Rate": 2, "Unusually High Heart Rate": 1})
+        self.assertEqual(database.time_series_proxy.queries, 2)
+
+        self.assertEqual(len(database.getData("Event", "u", 0, 30, None)["events"]), 2)
+
+    def test_latest(self):
+        database = fakeDatabase()
+        database.insertMany([("Event", {"events": {"events": ["Not Enough Sleep"], "metrics": ["duration"]}}, "u", 10),
+                             ("Event", {"events": self.payload}, "u", 20)])
+        # every event of the last time, not only one of its points
+        data = database.getData("Event", "u", None, None, None)
+        self.assertEqual(data["time"], ["1970-01-01T00:00:20Z"])
+        self.assertEqual(data["events"][0]["events"], self.payload["events"])
+        self.assertEqual(database.getData("Event", "v", None, None, None)["events"], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
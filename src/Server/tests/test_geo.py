@@ -0,0 +1,51 @@
+#!/usr/bin/python3
+
+import unittest
+import os
+import random
+import time
+
+from geo import haversine, HomeIndex, HomeRadius
+
+
+class TestHomeIndex(unittest.TestCase):
+
+    def test_haversine(self):
+        # Aveiro - Porto, ~56km
+        self.assertAlmostEqual(haversine(40.6405, -8.6538, 41.1579, -8.6291) / 1000, 57.5, delta=0.5)
+        self.assertEqual(haversine(40.0, -8.0, 40.0, -8.0), 0)
+
+    def test_near(self):
+        index = HomeIndex(HomeRadius, [("a", [40.63, -8.65], "a"), ("b", [None, None], "b")])
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.near(40.6302, -8.6502), ["a"])
+        self.assertEqual(index.near(40.631, -8.65), [])
+        index.add("a", [40.631, -8.65], "a")
+        self.assertEqual(index.near(40.631, -8.6502), ["a"])
+        index.remove("a")
+        self.assertEqual(index.near(40.631, -8.65), [])
+
+    def test_matches_brute_force(self):
+        rand = random.Random(1)
+        homes = [("h%d" % i, [40.6 + rand.random() * 0.01, -8.65 + rand.random() * 0.01], i) for i in range(500)]
+        index = HomeIndex(HomeRadius, homes)
+        for _ in range(2000):
+            lat, lon = 40.6 + rand.random() * 0.01, -8.65 + rand.random() * 0.01
+            expected = {v for k, (hlat, hlon), v in homes if haversine(lat, lon, hlat, hlon) <= HomeRadius}
+            self.assertEqual(set(index.near(lat, lon)), expected)
+
+    @unittest.skipUnless(os.environ.get("BENCHMARKS"), "set BENCHMARKS=1 to run the benchmarks")
+    def test_benchmark(self):
+        rand = random.Random(2)
+        homes = [("h%d" % i, [rand.uniform(36, 42), rand.uniform(-9.5, -6)], i) for i in range(5000)]
+        index = HomeIndex(HomeRadius, homes)
+        fixes = [(rand.uniform(36, 42), rand.uniform(-9.5, -6)) for _ in range(100000)]
+        begin = time.perf_counter()
+        for lat, lon in fixes:
+            index.near(lat, lon)
+        elapsed = time.perf_counter() - begin
+        self.assertGreater(len(fixes) / elapsed, 5000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+
+import unittest
+import time
+
+from fakes import fakeDatabase
+from database.hot_tier import HotTier, HOT_WINDOW
+
+
+class TestHotTier(unittest.TestCase):
+
+    def setUp(self):
+        self.now = int(time.time())
+        self.database = fakeDatabase()
+        self.proxy = self.database.time_series_proxy
+        self.database.hot_tier = HotTier(self.proxy)
+        self.database.insertMany([("HealthStatus", {"heartRate": 60 + i, "calories": 1.5}, "u", self.now - 600 + i * 60)
+                                  for i in range(10)])
+
+    def test_recent_reads(self):
+        data = self.database.getData("HealthStatus", "u", None, None, "1h")
+        self.assertEqual(data["heartRate"], list(range(60, 70)))
+        self.assertEqual(self.proxy.queries, 1)
+
+        # the writes after the first read are kept in memory, even if older than the last value
+        self.database.insert("HealthStatus", {"heartRate": 90, "time": self.now}, "u")
+        self.database.insertMany([("HealthStatus", {"steps": 10}, "u", self.now - 570)])
+        data = self.database.getData("HealthStatus", "u", self.now - 600, None, None)
+        self.assertEqual(data, self.readDatabase(self.now - 600))
+        self.assertEqual(self.database.getData("HealthStatus", "u", None, None, None)["heartRate"], [90])
+        self.assertEqual(self.proxy.queries, 1)
+
+        # older than the window
+        self.database.getData("HealthStatus", "u", self.now - HOT_WINDOW - 60, None, None)
+        self.assertEqual(self.proxy.queries, 2)
+
+    def test_fields(self):
+        self.database.insertMany([("HealthStatus", {"steps": 10}, "u", self.now - 30)])
+        data = self.database.getData("HealthStatus", "u", None, None, "1h", fields=["steps"])
+        self.assertEqual(data, {"time": [time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.now - 30))], "steps": [10]})
+
+    def test_memory_cap(self):
+        tier = self.database.hot_tier
+        tier.max_bytes = 8 * 3 * 10
+        self.database.insertMany([("HealthStatus", {"heartRate": 70}, "v", self.now - 60)])
+        self.database.getData("HealthStatus", "u", None, None, "1h")
+        self.database.getData("HealthStatus", "v", None, None, "1h")
+        # the client read the longest time ago is evicted
+        self.assertEqual(len(tier), 1)
+        self.assertEqual(tier.evicted, 1)
+        self.assertLessEqual(tier.stats()["bytes"], tier.max_bytes)
+        self.database.getData("HealthStatus", "v", None, None, "1h")
+        self.assertEqual(self.proxy.queries, 2)
+
+    def readDatabase(self, begin):
+        """
+        Reads the values from the database, without counting the query
+        """
+        tier = self.database.hot_tier
+        self.database.hot_tier = None
+        try:
+            return self.database.getData("HealthStatus", "u", begin, None, None)
+        finally:
+            self.database.hot_tier = tier
+            self.proxy.queries -= 1
+
+
+if __name__ == '__main__':
+    unittest.main()
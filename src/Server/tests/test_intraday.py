@@ -0,0 +1,131 @@
+#!/usr/bin/python3
+
+import unittest
+import time
+import datetime
+
+from devices import FitBit_Charge_3, HearthRate, Steps
+
+
+class IntradayFitbit(FitBit_Charge_3):
+    """
+    Band with a heart rate point per minute and 10 steps per minute of the day up to now, answering from
+     the start time of the url. Like Fitbit, the summary is of the time range and the resting heart rate
+     is only on the summary of the whole day
+    """
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.requests = []
+
+    def get(self, url, name):
+        self.requests.append(url)
+        if "/time/" not in url:
+            return {"summary": {"restingHeartRate": 58, "steps": self.steps(url.split("/date/")[1][:10], "00:00")}}
+        day, start = url.split("/date/")[1].split("/")[0], url.split("/time/")[1].split("/")[0]
+        now = datetime.datetime.utcnow()
+        dataset = []
+        minute = datetime.datetime.strptime(day + " " + start, "%Y-%m-%d %H:%M")
+        while minute <= now and minute.strftime("%Y-%m-%d") == day:
+            dataset.append({"time": minute.strftime("%H:%M:%S"), "value": 60 + minute.minute % 10})
+            minute += datetime.timedelta(minutes=1)
+        steps = [{"time": point["time"], "value": 10 * len(dataset[i:i + 15])} for i, point in enumerate(dataset) if i % 15 == 0]
+        return {"activities-heart": [{"value": {"restingHeartRate": 58} if start == "00:00" else {}}],
+                "activities-heart-intraday": {"dataset": dataset, "datasetInterval": 1, "datasetType": "minute"},
+                "activities-steps": [{"value": str(10 * len(dataset))}],
+                "activities-steps-intraday": {"dataset": steps, "datasetInterval": 15, "datasetType": "minute"}}
+
+    def steps(self, day, start):
+        """
+        :return: steps of the day after the start time, up to now
+        """
+        minute = datetime.datetime.strptime(day + " " + start, "%Y-%m-%d %H:%M")
+        return 10 * max(0, min(int((datetime.datetime.utcnow() - minute).total_seconds()) // 60 + 1, 1440 - minute.hour * 60 - minute.minute))
+
+
+class TestIntraday(unittest.TestCase):
+
+    def setUp(self):
+        self.band = IntradayFitbit({"token": "t"}, "u", "1", None)
+
+    def test_incremental(self):
+        heart = HearthRate(self.band)
+        data = heart.fetch()
+        self.assertEqual(heart.normalizeData(data), {"heartRate": 58})
+        points = heart.series(data)
+        self.assertTrue(self.band.requests[0].endswith("/1min/time/00:00/23:59.json"))
+        # the current minute is still being measured
+        self.assertLessEqual(points[-1][0] + 60, time.time())
+        # until the points are stored they are fetched again
+        self.assertIsNone(heart.mark)
+        heart.series(heart.fetch())
+        self.assertTrue(self.band.requests[-1].endswith("/1min/time/00:00/23:59.json"))
+        heart.stored()
+        self.assertEqual(heart.mark, points[-1][0])
+
+        # the next poll only asks for the minutes after the mark
+        heart.series(heart.fetch())
+        start = datetime.datetime.utcfromtimestamp(points[-1][0] + 60).strftime("%H:%M")
+        self.assertTrue(self.band.requests[-1].endswith("/time/" + start + "/23:59.json"))
+
+    def test_state(self):
+        heart = HearthRate(self.band)
+        heart.series(heart.fetch())
+        heart.stored()
+        restored = HearthRate(self.band)
+        restored.setState(heart.getState())
+        self.assertEqual(restored.mark, heart.mark)
+        # checkpoints written before the marks existed
+        steps = Steps(self.band)
+        steps.setState({"previousValue": 10})
+        self.assertIsNone(steps.mark)
+        self.assertEqual(steps.normalizeData(steps.fetch()), {"steps": self.band.steps(time.strftime("%Y-%m-%d", time.gmtime()), "00:00")})
+
+    def test_day_total(self):
+        steps = Steps(self.band)
+        # the first point of the day (00:00 to 00:15) was counted
+        steps.mark = int(time.time()) - int(time.time()) % 86400
+        steps.total = 150
+        data = steps.fetch()
+        # the response of the time range after the mark only has the steps since then
+        today = time.strftime("%Y-%m-%d", time.gmtime())
+        self.assertEqual(int(data["days"][-1][1]["activities-steps"][0]["value"]), self.band.steps(today, "00:15"))
+        self.assertEqual(steps.normalizeData(data), {"steps": self.band.steps(today, "00:00")})
+        steps.series(data)
+        self.assertEqual(steps.normalizeData(steps.fetch()), {"steps": self.band.steps(today, "00:00")})
+        steps.stored()
+        self.assertGreaterEqual(steps.mark, int(time.time()) - int(time.time()) % 86400)
+        self.assertEqual(steps.normalizeData(steps.fetch()), {"steps": self.band.steps(today, "00:00")})
+
+        # a new day starts from zero
+        steps.mark = int(time.time()) - 86400
+        steps.total = 5000
+        self.assertEqual(steps.normalizeData(steps.fetch()), {"steps": self.band.steps(today, "00:00")})
+
+    def test_resting_heart_rate(self):
+        heart = HearthRate(self.band)
+        data = heart.fetch()
+        self.assertEqual(heart.normalizeData(data), {"heartRate": 58})
+        heart.series(data)
+        heart.stored()
+        requests = len(self.band.requests)
+        # not on the responses of a time range, the one of the day is kept
+        self.assertEqual(heart.normalizeData(heart.fetch()), {"heartRate": 58})
+        self.assertEqual(len(self.band.requests), requests + 1)
+        # without a known one, the summary of the day is read
+        heart.resting = None
+        self.assertEqual(heart.normalizeData(heart.fetch()), {"heartRate": 58})
+        self.assertEqual(len(self.band.requests), requests + 3)
+
+    def test_after_midnight(self):
+        heart = HearthRate(self.band)
+        heart.mark = time.time() - 86400
+        data = heart.fetch()
+        # ends the previous day before today
+        self.assertEqual([day for day, dayData in data["days"]],
+                         [time.strftime("%Y-%m-%d", time.gmtime(time.time() - 86400)), time.strftime("%Y-%m-%d", time.gmtime())])
+        self.assertEqual(len(self.band.requests), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
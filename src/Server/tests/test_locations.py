@@ -0,0 +1,111 @@
+#!/usr/bin/python3
+
+import unittest
+import json
+import socket
+import threading
+import time
+
+from locations import LocationTable, LocationListener
+from ingest import BatchWriter
+from devices import GPS
+from database.exceptions import LogicException, TimeSeriesDBException
+
+
+class FakeDatabase:
+    """
+    Refuses the points without a latitude, fails while unavailable
+    """
+
+    def __init__(self):
+        self.batches = []
+        self.available = True
+
+    def insertMany(self, points):
+        if not self.available:
+            raise TimeSeriesDBException("connection refused")
+        if any("latitude" not in fields for measurement, fields, user, time in points):
+            raise LogicException("field type conflict")
+        self.batches.append(points)
+
+
+class TestLocations(unittest.TestCase):
+
+    def test_stream(self):
+        table = LocationTable()
+        writer = BatchWriter(FakeDatabase(), batchSize=2)
+        received = threading.Event()
+
+        def onFix(user, latitude, longitude, fixTime):
+            writer.add("Path", {"latitude": latitude, "longitude": longitude}, user, fixTime)
+            if user == "v":     # last valid fix sent
+                received.set()
+
+        listener = LocationListener("127.0.0.1", 0, table, onFix)
+        listener.start()
+        try:
+            with socket.create_connection(listener.server_address) as conn:
+                lines = [{"user": "u", "latitude": 40.63, "longitude": -8.65, "time": 10},
+                         {"user": "u", "latitude": 40.64, "longitude": -8.65, "time": 20},
+                         {"user": "u", "latitude": 40.60, "longitude": -8.60, "time": 15},    # out of order
+                         {"user": "v", "latitude": None, "longitude": -8.65, "time": 20},     # invalid
+                         {"user": "v", "latitude": 41.0, "longitude": -8.0, "time": 20}]
+                conn.sendall("".join(json.dumps(line) + "\n" for line in lines).encode("UTF-8"))
+                conn.sendall(b"not json\n")
+            self.assertTrue(received.wait(5))
+        finally:
+            listener.end()
+
+        self.assertEqual(table.get("u"), {"latitude": 40.64, "longitude": -8.65, "time": 20})
+        self.assertEqual(len(table), 2)
+        writer.flush()
+        # the path gets every valid fix, even out of order
+        self.assertEqual(writer.written, 4)
+        self.assertEqual([len(batch) for batch in writer.database.batches], [2, 2])
+
+    def test_refused_point(self):
+        writer = BatchWriter(FakeDatabase(), batchSize=8)
+        for fixTime in range(8):
+            writer.add("Path", {"latitude": 40.0, "longitude": -8.0} if fixTime != 5 else {"longitude": "x"}, "u", fixTime)
+        writer.flush()
+        # only the refused point is dropped, the others don't wait for it
+        self.assertEqual(writer.stats(), {"written": 7, "pending": 0, "dropped": 0, "rejected": 1})
+        self.assertEqual(sorted(point[3] for batch in writer.database.batches for point in batch), [0, 1, 2, 3, 4, 6, 7])
+        self.assertEqual(writer.done, 8)
+
+    def test_unavailable(self):
+        writer = BatchWriter(FakeDatabase(), batchSize=2, maxPending=5)
+        writer.database.available = False
+        for fixTime in range(8):
+            writer.add("Path", {"latitude": 40.0, "longitude": -8.0}, "u", fixTime)
+        writer.flush()
+        # kept to be written again, up to the cap
+        self.assertEqual(writer.stats(), {"written": 0, "pending": 5, "dropped": 3, "rejected": 0})
+        self.assertEqual(writer.done, 0)
+        writer.database.available = True
+        writer.flush()
+        self.assertEqual([point[3] for batch in writer.database.batches for point in batch], [3, 4, 5, 6, 7])
+        self.assertEqual(writer.done, 8)
+
+    def test_concurrent_updates(self):
+        table = LocationTable()
+        threads = [threading.Thread(target=lambda first: [table.update("u", 40.0, -8.0, fixTime) for fixTime in range(first, 20000, 4)],
+                                    args=(first,)) for first in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(table.get("u")["time"], 19999)
+
+    def test_gps_metric(self):
+        table = LocationTable()
+        metric = GPS({}, "u", None, None, table).metrics[0]
+        with self.assertRaises(Exception):
+            metric.fetch()
+        table.update("u", 40.63, -8.65, int(time.time()))
+        self.assertEqual(metric.normalizeData(metric.fetch()), {"latitude": 40.63, "longitude": -8.65})
+        self.assertEqual(metric.provider, "locations")
+
+
+if __name__ == '__main__':
+    unittest.main()
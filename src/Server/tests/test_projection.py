@@ -0,0 +1,47 @@
+#!/usr/bin/python3
+
+import unittest
+
+from database.time_series.proxy import InfluxProxy
+from validation import ArgumentValidator
+
+
+class FakeResult:
+    def get_points(self, measurement):
+        return [{"time": "2020-01-01T00:00:00Z", "heartRate": 60}]
+
+
+class FakeConnection:
+    def __init__(self):
+        self.queries = []
+
+    def query(self, query, params, epoch=None):
+        self.queries.append(query)
+        return FakeResult()
+
+
+class TestProjection(unittest.TestCase):
+
+    def setUp(self):
+        self.proxy = InfluxProxy.__new__(InfluxProxy)
+        self.connection = self.proxy._InfluxProxy__conn = FakeConnection()
+
+    def test_select_list(self):
+        self.proxy.read("u", "HealthStatus", 0, 10, fields=["heartRate", "steps"])
+        self.assertTrue(self.connection.queries[-1].startswith('SELECT "heartRate", "steps" FROM HealthStatus '))
+        self.proxy.read("u", "HealthStatus", 0, 10)
+        self.assertTrue(self.connection.queries[-1].startswith("SELECT * FROM HealthStatus "))
+
+    def test_validation(self):
+        args = {"fields": "heartRate,steps", "measurement": "HealthStatus"}
+        self.assertEqual(ArgumentValidator.getData(args), [])
+        # only known fields reach the query
+        self.assertEqual(len(ArgumentValidator.getData(dict(args, fields='heartRate,"x" FROM y'))), 1)
+        self.assertEqual(len(ArgumentValidator.getData(dict(args, fields="heartRate,"))), 1)
+        self.assertEqual(len(ArgumentValidator.getData(dict(args, fields="co2"))), 1)
+        self.assertEqual(ArgumentValidator.getData(dict(args, fields="co2", measurement="Environment")), [])
+        self.assertEqual(len(ArgumentValidator.getData(dict(args, measurement="Sleep"))), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+#!/usr/bin/python3
+
+import unittest
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import devices
+from devices import FitBit_Charge_3, HearthRate, Calories, Activity, Steps
+from ratelimit import RateLimits, RateLimit
+from abstract.exceptions import ExpiredToken, RateLimited
+
+
+class FitbitStandIn(BaseHTTPRequestHandler):
+    """
+    Answers like the Fitbit API, with the quota headers of an account
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def _answer(self, status, body, headers={}):
+        data = json.dumps(body).encode("UTF-8")
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        if self.headers.get("Authorization") != "Bearer " + server.token:
+            return self._answer(401, {"success": False, "errors": [{"errorType": "expired_token"}]})
+        if server.remaining <= 0:
+            return self._answer(429, {"success": False, "errors": [{"errorType": "request"}]}, {"Retry-After": "1800"})
+        server.remaining -= 1
+        quota = {"Fitbit-Rate-Limit-Limit": "150", "Fitbit-Rate-Limit-Remaining": str(server.remaining),
+                 "Fitbit-Rate-Limit-Reset": "1800"}
+        if "heart" in self.path:
+            return self._answer(200, {"activities-heart": [{"value": {"restingHeartRate": 60}}],
+                                      "activities-heart-intraday": {"dataset": []}}, quota)
+        if "steps" in self.path:
+            return self._answer(200, {"activities-steps": [{"value": "5000"}],
+                                      "activities-steps-intraday": {"dataset": [{"time": "00:00:00", "value": 5000}]}}, quota)
+        return self._answer(200, {"summary": {"caloriesOut": 2000, "sedentaryMinutes": 3, "fairlyActiveMinutes": 1,
+                                              "lightlyActiveMinutes": 2, "veryActiveMinutes": 4}}, quota)
+
+    def do_POST(self):
+        self.server.token = "new"
+        self._answer(200, {"access_token": "new", "refresh_token": "refresh2"})
+
+
+class TestRateLimit(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), FitbitStandIn)
+        self.server.requests = 0
+        self.server.remaining = 150
+        self.server.token = "valid"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.api, devices.FitbitAPI = devices.FitbitAPI, "http://127.0.0.1:%d" % self.server.server_address[1]
+        self.limits, devices.fitbitLimits = devices.fitbitLimits, RateLimits()
+        self.fitbit = FitBit_Charge_3({"token": "valid", "refresh_token": "r", "client_id": "c", "client_secret": "s"}, "u", "1", None)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        devices.FitbitAPI = self.api
+        devices.fitbitLimits = self.limits
+
+    def test_shared_response(self):
+        self.assertEqual(Calories(self.fitbit).normalizeData(Calories(self.fitbit).fetch()), {"calories": 2000})
+        self.assertEqual(Activity(self.fitbit).normalizeData(Activity(self.fitbit).fetch())["sedentaryMinutes"], 3)
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual(Steps(self.fitbit).normalizeData(Steps(self.fitbit).fetch()), {"steps": 5000})
+        self.assertEqual(self.server.requests, 2)
+
+    def test_defers_before_limit(self):
+        self.server.remaining = 8
+        heart = HearthRate(self.fitbit)
+        fetched = 0
+        with self.assertRaises(RateLimited) as context:
+            for _ in range(10):
+                self.fitbit._responses.clear()
+                heart.fetch()
+                fetched += 1
+        # stops while the account still has the reserved requests
+        self.assertEqual(self.server.remaining, 5)
+        self.assertEqual(self.server.requests, fetched)
+        self.assertGreater(context.exception.retryAfter, 1700)
+        state = devices.fitbitLimits.state()["u"]
+        self.assertEqual(state["remaining"], 5)
+        self.assertEqual(state["deferred"], 1)
+
+    def test_too_many_requests(self):
+        self.server.remaining = 0
+        with self.assertRaises(RateLimited) as context:
+            HearthRate(self.fitbit).fetch()
+        self.assertEqual(round(context.exception.retryAfter), 1800)
+        with self.assertRaises(RateLimited):
+            HearthRate(self.fitbit).fetch()
+        self.assertEqual(self.server.requests, 1)
+
+    def test_expired_token(self):
+        self.server.token = "other"
+        heart = HearthRate(self.fitbit)
+        with self.assertRaises(ExpiredToken):
+            heart.fetch()
+        self.assertEqual(self.fitbit.refreshToken()["token"], "new")
+        self.assertEqual(heart.normalizeData(heart.fetch()), {"heartRate": 60})
+
+    def test_bucket(self):
+        limit = RateLimit(limit=3, period=3600)
+        self.assertEqual([limit.acquire() == 0 for _ in range(4)], [True, True, True, False])
+        self.assertAlmostEqual(limit.acquire(), 1200, delta=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
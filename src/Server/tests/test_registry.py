@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+
+import unittest
+
+from devices import GPS, FitBit_Charge_3, Foobot
+from registry import UserRegistry, DeviceRegistry
+
+
+class TestRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.fitbit = FitBit_Charge_3({}, "u", "1", [None, None])
+        self.snapshot = UserRegistry("u", [GPS({}, "u", None, None), self.fitbit], [])
+
+    def test_lookups(self):
+        self.assertIsNotNone(self.snapshot.gps)
+        self.assertEqual(self.snapshot.environmentInside, ())
+        keys = [key for key, period, metric in self.snapshot.schedule]
+        self.assertEqual(len(keys), len(set(keys)))
+        with self.assertRaises(AttributeError):
+            self.snapshot.gps = None
+
+    def test_changes(self):
+        foobot = Foobot({}, "u", "2", [40.63, -8.65])
+        added = self.snapshot.withDevice(foobot)
+        self.assertEqual(len(added.environmentInside), 1)
+        self.assertNotIn("2", self.snapshot.devices)
+        # the metrics of the untouched devices are reused
+        self.assertIs(added.deviceMetrics["1"][0], self.snapshot.deviceMetrics["1"][0])
+
+        self.assertEqual(added.homes.near(40.63, -8.65), list(added.environmentInside))
+        removed = added.withoutDevice("2")
+        self.assertEqual(removed.environmentInside, ())
+        self.assertEqual(set(removed.devices), {None, "1"})
+
+    def test_update_keeps_state(self):
+        metric = next(m for m in self.snapshot.deviceMetrics["1"] if "previousValue" in (m.getState() or {}))
+        metric.setState(dict(metric.getState(), previousValue=42))
+        updated = self.snapshot.withDevice(FitBit_Charge_3({"token": "new"}, "u", "1", [None, None]))
+        new = next(m for m in updated.deviceMetrics["1"] if m.__class__ is metric.__class__)
+        self.assertIsNot(new, metric)
+        self.assertEqual(new.getState(), metric.getState())
+
+    def test_swap(self):
+        registry = DeviceRegistry()
+        registry.load({"u": self.snapshot})
+        before = registry.get("u")
+        registry.update("u", lambda snapshot: snapshot.withoutDevice("1"))
+        self.assertIsNot(registry.get("u"), before)
+        self.assertIn("1", before.devices)
+        registry.load({"u": before})
+        self.assertNotIn("1", registry.get("u").devices)
+
+    def test_owners(self):
+        registry = DeviceRegistry()
+        registry.load({"u": self.snapshot})
+        foobot = Foobot({}, "u", "2", [40.63, -8.65])
+        registry.update("u", lambda snapshot: snapshot.withDevice(foobot))
+        snapshot, device = registry.device("2")
+        self.assertIs(snapshot, registry.get("u"))
+        self.assertIs(device, foobot)
+        registry.update("u", lambda snapshot: snapshot.withoutDevice("2"))
+        self.assertEqual(registry.device("2"), (None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
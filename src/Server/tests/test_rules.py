@@ -0,0 +1,125 @@
+#!/usr/bin/python3
+
+import unittest
+import os
+import random
+import time
+
+from devices import FitBit_Charge_3, Foobot, ExternalAPI, HearthRate, Sleep, Activity, Steps, Foobotmetric, WAQI
+from rules import RuleEngine, EventSuppressor, eventRules
+
+
+class TestRules(unittest.TestCase):
+
+    def setUp(self):
+        self.fitbit = FitBit_Charge_3({"token": "t"}, "u", "1", None)
+
+    def test_thresholds(self):
+        heart = HearthRate(self.fitbit)
+        self.assertEqual(heart.checkEvent({"heartRate": 120}), {"events": ["High Heart Rate"], "metrics": ["heartRate"]})
+        self.assertEqual(heart.checkEvent({"heartRate": 45}), {"events": ["Low Heart Rate"], "metrics": ["heartRate"]})
+        self.assertIsNone(heart.checkEvent({"heartRate": None}))
+        self.assertEqual(Sleep(self.fitbit).checkEvent({"duration": 5})["events"], ["Not Enough Sleep"])
+        self.assertIsNone(Sleep(self.fitbit).checkEvent({"duration": 0}))
+
+    def test_missing_pollutants(self):
+        waqi = WAQI(ExternalAPI({}, "u", None, None))
+        self.assertEqual(waqi.checkEvent({"aqi": 80.0, "so2": 200.0}),
+                         {"events": ["High General Pollution Index", "High Percentage of Sulfur Dioxide"], "metrics": ["aqi", "so2"]})
+        self.assertIsNone(waqi.checkEvent({"aqi": 20.0}))
+        foobot = Foobotmetric(Foobot({"token": "t"}, "u", "2", None))
+        self.assertEqual(foobot.checkEvent({"aqi": 10.0, "pm10": 50.0, "voc": 400.0})["metrics"], ["pm10", "voc"])
+
+    def test_increase(self):
+        steps = Steps(self.fitbit)
+        self.assertIsNone(steps.checkEvent({"steps": 900}))
+        self.assertEqual(steps.checkEvent({"steps": 1200})["events"], ["Not Enough Exercise"])
+        self.assertEqual(steps.previousValue, 1200)
+        self.assertIsNone(steps.checkEvent({"steps": 1300}))
+        activity = Activity(self.fitbit)
+        self.assertEqual(activity.checkEvent({"sedentaryMinutes": 301})["events"], ["Sedentary Behavior"])
+        self.assertIsNone(activity.checkEvent({"sedentaryMinutes": 400}))
+
+    def test_batch(self):
+        metrics = [HearthRate(self.fitbit), Steps(self.fitbit), WAQI(ExternalAPI({}, "u", None, None))]
+        readings = [(metrics[0], {"heartRate": 70}), (metrics[1], {"steps": 1100}), (metrics[2], {"pm25": 60.0}),
+                    (metrics[0], {"heartRate": 130})]
+        self.assertEqual(eventRules.evaluate(readings),
+                         [None, {"events": ["Not Enough Exercise"], "metrics": ["steps"]},
+                          {"events": ["High Percentage of Particle Matter(<2.5 um)"], "metrics": ["pm25"]},
+                          {"events": ["High Heart Rate"], "metrics": ["heartRate"]}])
+        with self.assertRaises(ValueError):
+            RuleEngine([("HearthRate", "heartRate", [("value", "=>", 1)], "Bad")])
+
+    def test_hysteresis(self):
+        heart = HearthRate(self.fitbit)
+        suppressor = EventSuppressor(window=3600)
+        emitted = []
+        for now, rate in enumerate([105, 110, 95, 120, 89, 101, 80]):
+            detections = eventRules.detect([(heart, {"heartRate": rate})])[0]
+            emitted.append(suppressor.apply("u", detections, 10000 + now * 300))
+        self.assertEqual([event and event["events"] for event in emitted],
+                         [["High Heart Rate"], None, None, None, ["High Heart Rate Ended"], None, None])
+        # the relapse within the window wasn't announced, nor its end
+        self.assertEqual(suppressor.stats()["suppressedByEvent"], {"High Heart Rate": 4})
+        self.assertEqual(suppressor.stats()["active"], 0)
+        # after the window it is a new episode
+        self.assertEqual(suppressor.apply("u", [("High Heart Rate", "heartRate", True, "HearthRate")], 20000)["events"], ["High Heart Rate"])
+        # other clients are independent
+        self.assertEqual(suppressor.apply("v", [("High Heart Rate", "heartRate", True, "HearthRate")], 20000)["events"], ["High Heart Rate"])
+
+        restored = EventSuppressor()
+        restored.setState("u", suppressor.getState("u"))
+        self.assertIsNone(restored.apply("u", [("High Heart Rate", "heartRate", True, "HearthRate")], 20300))
+        self.assertEqual(restored.apply("u", [("High Heart Rate", "heartRate", False, "HearthRate")], 20600)["events"], ["High Heart Rate Ended"])
+
+    def test_relapse(self):
+        heart = HearthRate(self.fitbit)
+        suppressor = EventSuppressor(window=3600)
+        emitted = []
+        for now, rate in [(0, 120), (300, 80), (600, 120), (4000, 120), (8000, 120), (20000, 80)]:
+            event = suppressor.apply("u", eventRules.detect([(heart, {"heartRate": rate})])[0], now)
+            emitted.append(event and event["events"])
+        # the relapse is announced once it still holds after the window, and so is its end
+        self.assertEqual(emitted, [["High Heart Rate"], ["High Heart Rate Ended"], None, ["High Heart Rate"], None,
+                                   ["High Heart Rate Ended"]])
+
+    def test_sources(self):
+        suppressor = EventSuppressor(window=3600)
+        foobot = Foobotmetric(Foobot({"token": "t"}, "u", "2", None))
+        waqi = WAQI(ExternalAPI({}, "u", None, None))
+        emitted = []
+        for now, indoor, outdoor in [(0, 80.0, 20.0), (300, 80.0, 20.0), (600, 60.0, 20.0), (4000, 80.0, 80.0)]:
+            detections = eventRules.detect([(foobot, {"aqi": indoor}), (waqi, {"aqi": outdoor})])
+            event = suppressor.apply("u", detections[0] + detections[1], now)
+            emitted.append(event and event["events"])
+        # the outdoor index doesn't end the indoor event
+        self.assertEqual(emitted, [["High General Pollution Index"], None, ["High General Pollution Index Ended"],
+                                   ["High General Pollution Index"]])
+        self.assertEqual(suppressor.stats()["active"], 2)
+
+    def test_punctual(self):
+        suppressor = EventSuppressor(window=3600)
+        self.assertIsNotNone(suppressor.apply("u", [("Not Enough Sleep", "duration", None, "Sleep")], 0))
+        self.assertIsNone(suppressor.apply("u", [("Not Enough Sleep", "duration", None, "Sleep")], 1000))
+        self.assertIsNotNone(suppressor.apply("u", [("Not Enough Sleep", "duration", None, "Sleep")], 3600))
+
+    @unittest.skipUnless(os.environ.get("BENCHMARKS"), "set BENCHMARKS=1 to run the benchmarks")
+    def test_benchmark(self):
+        rand = random.Random(3)
+        externalAPI = ExternalAPI({}, "u", None, None)
+        readings = []
+        for i in range(25000):
+            fitbit = FitBit_Charge_3({"token": "t"}, "u%d" % i, str(i), None)
+            readings += [(HearthRate(fitbit), {"heartRate": rand.randint(40, 120)}),
+                         (Steps(fitbit), {"steps": rand.randint(0, 4000)}),
+                         (Activity(fitbit), {"sedentaryMinutes": rand.randint(0, 600)}),
+                         (WAQI(externalAPI), {"aqi": rand.uniform(0, 100), "pm10": rand.uniform(0, 60), "o3": rand.uniform(0, 150)})]
+        begin = time.perf_counter()
+        eventRules.evaluate(readings)
+        elapsed = time.perf_counter() - begin
+        self.assertLess(elapsed, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+#!/usr/bin/python3
+
+import unittest
+
+from scheduling import phaseOffset, nextDue
+
+
+class TestScheduling(unittest.TestCase):
+
+    def test_stable(self):
+        # the same after a restart, without being stored
+        self.assertEqual(phaseOffset("user", "HeartRate", 900), phaseOffset("user", "HeartRate", 900))
+        self.assertNotEqual(phaseOffset("user", "HeartRate", 900), phaseOffset("user", "Steps", 900))
+        self.assertTrue(0 <= phaseOffset("user", "HeartRate", 900) < 900)
+
+    def test_spread(self):
+        period = 900
+        offsets = [phaseOffset("user%d" % u, "HeartRate", period) for u in range(10000)]
+        # every tenth of the period has about a tenth of the polls
+        slices = [0] * 10
+        for offset in offsets:
+            slices[offset * 10 // period] += 1
+        self.assertTrue(all(900 < count < 1100 for count in slices), slices)
+
+    def test_next_due(self):
+        self.assertEqual(nextDue(1000, 900, 100), 1900)
+        self.assertEqual(nextDue(999.5, 900, 100), 1000)
+        # strictly after now, on the phase of the period
+        for now in range(0, 2000, 7):
+            due = nextDue(now, 900, 100)
+            self.assertTrue(now < due <= now + 900)
+            self.assertEqual(due % 900, 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
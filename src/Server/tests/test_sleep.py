@@ -0,0 +1,127 @@
+#!/usr/bin/python3
+
+import unittest
+import datetime
+import time
+
+from devices import FitBit_Charge_3, Sleep
+from abstract.exceptions import NoNewData
+from fakes import FakeTimeSeries, fakeDatabase
+from database.exceptions import LogicException
+
+
+def sleepLog(logId, day, main=True):
+    return {"logId": logId, "dateOfSleep": day, "isMainSleep": main, "duration": 8*3600*1000,
+            "startTime": day + "T00:00:00.000", "endTime": day + "T08:00:00.000",
+            "levels": {"data": [{"dateTime": day + "T00:00:00.000", "level": "light", "seconds": 60}]}}
+
+
+class SleepFitbit(FitBit_Charge_3):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.requests = 0
+        self.sleeps = []
+
+    def get(self, url, name):
+        self.requests += 1
+        return {"sleep": self.sleeps}
+
+
+class FakeRelational:
+    """
+    Keeps the sessions inserted, committing them only if before_commit doesn't fail
+    """
+
+    def __init__(self):
+        self.sessions = []
+        self.queries = 0
+
+    def insert_sleep_session(self, username, day, duration, begin, end, before_commit=None):
+        if any(b < end and e > begin for b, e in self.sessions):
+            raise LogicException("Intervals of several sleep session overlap")
+        if before_commit:
+            before_commit()
+        self.sessions.append((begin, end))
+
+    def get_sleep_sessions(self, username, begin=None, end=None):
+        self.queries += 1
+        return [(b.date(), b, e, (e - b).seconds) for b, e in self.sessions if begin <= b.date() <= end]
+
+
+class TestSleep(unittest.TestCase):
+
+    def setUp(self):
+        self.band = SleepFitbit({"token": "t"}, "u", "1", None)
+        self.sleep = Sleep(self.band)
+
+    def test_known_session(self):
+        self.band.sleeps = [sleepLog(1, "2020-01-01")]
+        self.assertEqual(self.sleep.normalizeData(self.sleep.fetch())["duration"], 8*3600)
+        # not stored yet, normalized again on the next poll
+        self.sleep.normalizeData(self.sleep.fetch())
+        self.sleep.stored()
+        with self.assertRaises(NoNewData):
+            self.sleep.normalizeData(self.sleep.fetch())
+        self.assertEqual(self.band.requests, 3)
+
+    def test_skips_fetch(self):
+        today = time.strftime("%Y-%m-%d", time.gmtime())
+        self.band.sleeps = [sleepLog(2, today, main=False)]
+        self.sleep.normalizeData(self.sleep.fetch())
+        self.sleep.stored()
+        # a nap doesn't end the day
+        self.band.sleeps.append(sleepLog(3, today))
+        self.sleep.normalizeData(self.sleep.fetch())
+        self.sleep.stored()
+
+        restored = Sleep(self.band)
+        restored.setState(self.sleep.getState())
+        with self.assertRaises(NoNewData):
+            restored.fetch()
+        self.assertEqual(self.band.requests, 2)
+
+    def test_atomic_insert(self):
+        database = fakeDatabase(FakeTimeSeries(fail=True), FakeRelational())
+        data = self.sleepData()
+        with self.assertRaises(Exception):
+            database.insert("Sleep", self.sleepData(), "u")
+        self.assertEqual(database.relational_proxy.sessions, [])
+
+        database.time_series_proxy.fail = False
+        database.insert("Sleep", self.sleepData(), "u")
+        self.assertEqual(len(database.time_series_proxy.points), 1)
+        # the overlap is refused before the stages are written again
+        with self.assertRaises(LogicException):
+            database.insert("Sleep", data, "u")
+        self.assertEqual(len(database.time_series_proxy.points), 1)
+
+    def test_history(self):
+        database = fakeDatabase(relational=FakeRelational())
+        first = datetime.date(2020, 1, 1)
+        for night in range(40):
+            day = (first + datetime.timedelta(days=night)).isoformat()
+            stages = [{"dateTime": day + "T00:%02d:00.000" % (i * 10), "level": level, "seconds": 600}
+                      for i, level in enumerate(["light", "light", "deep", "rem", "wake", "light"])]
+            self.band.sleeps = [dict(sleepLog(night, day), endTime=day + "T01:00:00.000", levels={"data": stages})]
+            database.insert("Sleep", Sleep(self.band).normalizeData(self.band.get(None, "Sleep")), "u")
+        # a point per session
+        self.assertEqual(len(database.time_series_proxy.points), 40)
+
+        begin = time.mktime(first.timetuple())
+        sessions = database.getData("Sleep", "u", begin, begin + 39 * 86400, None)
+        self.assertEqual(database.relational_proxy.queries + database.time_series_proxy.queries, 2)
+        self.assertEqual(len(sessions), 40)
+        # consecutive stages with the same level are merged
+        self.assertEqual(sessions[0]["data"], {"time": ["2020-01-01T00:00:00Z", "2020-01-01T00:20:00Z", "2020-01-01T00:30:00Z",
+                                                        "2020-01-01T00:40:00Z", "2020-01-01T00:50:00Z"],
+                                               "level": ["light", "deep", "rem", "wake", "light"],
+                                               "seconds": [1200, 600, 600, 600, 600]})
+        self.assertEqual(sessions[39]["data"]["time"][0], "2020-02-09T00:00:00Z")
+
+    def sleepData(self):
+        self.band.sleeps = [sleepLog(4, "2020-01-02")]
+        return Sleep(self.band).normalizeData(self.band.get(None, "Sleep"))
+
+
+if __name__ == '__main__':
+    unittest.main()
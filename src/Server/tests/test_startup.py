@@ -0,0 +1,157 @@
+#!/usr/bin/python3
+
+import unittest
+import os
+import tempfile
+import threading
+import time
+import json
+
+from database.relational.proxy import MySqlProxy
+from devices import createDevice, GPS, FitBit_Charge_3, Foobot
+from registry import UserRegistry, DeviceRegistry
+from alerts import PermissionIndex
+from anomaly import AnomalyDetector
+from locations import LocationTable
+from cachetools import TTLCache
+import Processor
+
+
+def _rows(users):
+    """
+    Rows as returned by the get_all_clients_devices procedure, each user having
+     a FitBit (4 authentication fields) and a Foobot (2 authentication fields)
+    """
+    rows = []
+    device_id = 0
+    for u in range(users):
+        username = "user%d" % u
+        device_id += 1
+        for name in ["token", "refresh_token", "client_id", "client_secret"]:
+            rows.append((username, device_id, 1, "bracelet", "FitBit", "Charge 3", None, name, "value", None, None))
+        device_id += 1
+        for name in ["token", "uuid"]:
+            rows.append((username, device_id, 2, "home_device", "Foobot", "", None, name, "value", 40.63, -8.65))
+    rows.append(("lonely", None, None, None, None, None, None, None, None, None, None))
+    return rows
+
+
+def _load(rows):
+    users = MySqlProxy._parse_all_devices_rows(rows)
+    registries = {}
+    for user, devices in users.items():
+        dataSources = [GPS({}, user, None, None)]
+        for device in devices:
+            dataSources.append(createDevice(device["type"], device["authentication_fields"], user,
+                                            str(device["id"]), [device.get("latitude"), device.get("longitude")]))
+        registries[user] = UserRegistry(user, dataSources, [])
+    return registries
+
+
+class TestStartupLoad(unittest.TestCase):
+
+    def test_parse(self):
+        users = MySqlProxy._parse_all_devices_rows(_rows(2))
+        self.assertEqual(len(users), 3)
+        self.assertEqual(users["lonely"], [])
+        fitbit, foobot = users["user0"]
+        self.assertEqual(fitbit["type"], "FitBit Charge 3")
+        self.assertEqual(len(fitbit["authentication_fields"]), 4)
+        self.assertEqual(foobot["latitude"], 40.63)
+
+    def test_factory(self):
+        self.assertIsInstance(createDevice("FitBit Charge 3", {}, "u", "1", [None, None]), FitBit_Charge_3)
+        self.assertIsInstance(createDevice("Foobot ", {}, "u", "2", [1, 1]), Foobot)
+        with self.assertRaises(Exception):
+            createDevice("__import__('os')", {}, "u", "3", [None, None])
+
+    @unittest.skipUnless(os.environ.get("BENCHMARKS"), "set BENCHMARKS=1 to run the benchmarks")
+    def test_benchmark(self):
+        for users in [1000, 10000]:
+            rows = _rows(users)
+            begin = time.perf_counter()
+            registries = _load(rows)
+            elapsed = time.perf_counter() - begin
+            self.assertEqual(len(registries), users + 1)
+            self.assertEqual(len(registries["user0"].metrics["HealthStatus"]), 4)
+            self.assertLess(elapsed, users / 2000)
+
+
+class SlowDatabase:
+    """
+    Database whose devices are only returned once released
+    """
+
+    def __init__(self, devices):
+        self.devices = devices
+        self.released = threading.Event()
+
+    def getAllAcceptedPermissions(self):
+        return []
+
+    def getAllUsersDevices(self):
+        self.released.wait(10)
+        return self.devices
+
+
+class TestWarmUp(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.checkpointFile = Processor.CheckpointFile
+        Processor.CheckpointFile = os.path.join(self.directory.name, "checkpoint.json")
+
+        # only what the API and warmUp use, without the sockets
+        self.processor = Processor.Processor.__new__(Processor.Processor)
+        self.processor.database = SlowDatabase({"u": [], "v": []})
+        self.processor.externalAPI = []
+        self.processor.userThreads = {}
+        self.processor.clientTokens = TTLCache(maxsize=10, ttl=60)
+        self.processor.medicTokens = TTLCache(maxsize=10, ttl=60)
+        self.processor.permissions = PermissionIndex()
+        self.processor.registry = DeviceRegistry()
+        self.processor.locations = LocationTable()
+        self.processor.anomalies = AnomalyDetector()
+        self.processor.ready = False
+        self.processor.startupProgress = {"stage": "starting", "loaded": 0, "total": 0}
+        self.started = []
+        self.processor._startThread = lambda user, checkpoint=None: self.started.append(user)
+        self.processor.clientTokens["token"] = "u"
+
+    def tearDown(self):
+        self.processor.database.released.set()
+        Processor.CheckpointFile = self.checkpointFile
+        self.directory.cleanup()
+
+    def test_ready(self):
+        warmUp = threading.Thread(target=self.processor.warmUp)
+        warmUp.start()
+        while self.processor.startupProgress["stage"] != "devices":
+            time.sleep(0.01)
+
+        body, code = self.processor.getReadiness()
+        self.assertEqual(code, 503)
+        self.assertEqual(json.loads(body)["data"], {"stage": "devices", "loaded": 0, "total": 0, "ready": False})
+        # the device routes wait for the devices to be loaded
+        for route in [self.processor.updateDevice, self.processor.deleteDevice, self.processor.addDevice]:
+            self.assertEqual(route("token", {"id": 1})[1], 503)
+
+        self.processor.database.released.set()
+        warmUp.join(10)
+        body, code = self.processor.getReadiness()
+        self.assertEqual(code, 200)
+        self.assertEqual(json.loads(body)["data"], {"stage": "ready", "loaded": 2, "total": 2, "ready": True})
+        self.assertEqual(sorted(self.started), ["u", "v"])
+        self.assertEqual(sorted(self.processor.registry.users()), ["u", "v"])
+        self.assertNotEqual(self.processor.deleteDevice("token", {"id": 1})[1], 503)
+
+    def test_failed(self):
+        self.processor.database.getAllUsersDevices = lambda: 1 / 0
+        self.processor.warmUp()
+        body, code = self.processor.getReadiness()
+        self.assertEqual(code, 503)
+        self.assertEqual(json.loads(body)["data"]["stage"], "failed")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+#!/usr/bin/python3
+
+import unittest
+from unittest import mock
+
+import stats
+from stats import RequestRates
+
+
+class TestRequestRates(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000
+        patcher = mock.patch.object(stats.time, "time", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.rates = RequestRates(window=60)
+
+    def test_per_provider(self):
+        self.rates.hit("fitbit", 30)
+        self.rates.hit("influx")
+        self.now += 59
+        self.rates.hit("fitbit", 30)
+        self.assertEqual(self.rates.rates(), {"fitbit": 1.0, "influx": round(1 / 60, 3)})
+
+    def test_window(self):
+        self.rates.hit("fitbit", 60)
+        self.now += 1
+        self.rates.hit("fitbit", 6)
+        # the requests older than the window are no longer counted
+        self.now += 59
+        self.assertEqual(self.rates.rates(), {"fitbit": 0.1})
+        self.now += 1
+        self.assertEqual(self.rates.rates(), {"fitbit": 0.0})
+        # a bucket reused a window later starts from zero
+        self.rates.hit("fitbit", 12)
+        self.assertEqual(self.rates.rates(), {"fitbit": 0.2})
+
+
+if __name__ == '__main__':
+    unittest.main()
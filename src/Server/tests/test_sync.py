@@ -0,0 +1,114 @@
+#!/usr/bin/python3
+
+import unittest
+import json
+import time
+
+from validation import ArgumentValidator
+from locations import LocationTable
+from ingest import BatchWriter
+from Processor import Processor
+from cachetools import TTLCache
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.writes = []
+
+    def insertMany(self, points):
+        self.writes.append(points)
+
+
+def _processor():
+    processor = Processor.__new__(Processor)
+    processor.clientTokens = {"token": "u"}
+    processor.medicTokens = {}
+    processor.database = FakeDatabase()
+    processor.locations = LocationTable()
+    processor.writer = BatchWriter(processor.database)
+    processor.moodKeys = TTLCache(maxsize=100, ttl=60)
+    processor.alerts = FakeAlerts()
+    return processor
+
+
+class FakeAlerts:
+    def __init__(self):
+        self.dispatched = []
+
+    def dispatch(self, client, event, time):
+        self.dispatched.append((client, event["events"]))
+
+
+class TestSync(unittest.TestCase):
+
+    def test_validation(self):
+        now = int(time.time())
+        self.assertEqual(ArgumentValidator.sync({"path": [{"time": now, "latitude": 40.6, "longitude": "-8.6"}]}), [])
+        errors = ArgumentValidator.sync({"path": [{"time": now, "latitude": 40.6}, 3],
+                                         "moods": [{"time": "x", "moods": []}]})
+        self.assertEqual(errors, ["path[0] Missing key \"longitude\"",
+                                  "path[1] must be an object",
+                                  "moods[0] Value \"time\" is type str but int was expected",
+                                  "moods[0] Value \"moods\" must be a non empty list of strings"])
+        self.assertTrue(ArgumentValidator.sync({"path": [{}] * 30000}))
+
+    def test_ranges(self):
+        now = int(time.time())
+        errors = ArgumentValidator.sync({"path": [{"time": now - 60, "latitude": 40.6, "longitude": -8.6},
+                                                  {"time": now, "latitude": 91.0, "longitude": -8.6},
+                                                  {"time": now, "latitude": 40.6, "longitude": 200},
+                                                  {"time": 1, "latitude": 40.6, "longitude": -8.6},
+                                                  {"time": now + 86400, "latitude": 40.6, "longitude": -8.6}],
+                                         "moods": [{"time": now, "moods": ["Happy"]},
+                                                   {"time": now, "moods": ["Happy"], "latitude": -100.0}]})
+        self.assertEqual(errors, ["path[1] Values \"latitude\" and \"longitude\" must be a valid coordinate",
+                                  "path[2] Values \"latitude\" and \"longitude\" must be a valid coordinate",
+                                  "path[3] Value \"time\" must be from the last 30 days",
+                                  "path[4] Value \"time\" must be from the last 30 days",
+                                  "moods[1] Values \"latitude\" and \"longitude\" must be a valid coordinate"])
+
+    def test_single_write(self):
+        processor = _processor()
+        data = {"path": [{"time": 100 + i * 10, "latitude": 40.0 + i, "longitude": -8.0} for i in range(500)],
+                "moods": [{"time": 131, "moods": ["Happy", "Tired"]},
+                          {"time": 5000, "moods": ["Sad"], "latitude": 1.0, "longitude": 2.0}]}
+        response, code = processor.sync("token", data)
+        self.assertEqual(code, 200)
+        self.assertEqual(json.loads(response)["data"], {"path": 500, "moods": 2})
+
+        self.assertEqual(len(processor.database.writes), 1)
+        points = processor.database.writes[0]
+        self.assertEqual(len(points), 504)
+        status = [point for point in points if point[0] == "PersonalStatus"]
+        # the first mood gets the location of the closest GPS point (time 130)
+        self.assertEqual(status[0], ("PersonalStatus", {"latitude": 43.0, "longitude": -8.0, "moods": "Happy,Tired"}, "u", 131))
+        self.assertEqual(status[1][1]["latitude"], 1.0)
+        event = [point for point in points if point[0] == "Event"][0]
+        self.assertEqual(event[1]["events"]["events"], ["Happy", "Tired"])
+        self.assertEqual(processor.locations.get("u")["time"], 100 + 499 * 10)
+
+    def test_mood(self):
+        processor = _processor()
+        processor.locations.update("u", 40.6, -8.6, 10)
+        response, code = processor.registerMood("token", {"moods": ["Happy", "Tired"]}, "k1")
+        self.assertEqual(code, 200)
+        self.assertEqual(json.loads(response)["data"]["key"], "k1")
+        # a retry with the same key isn't registered twice
+        self.assertEqual(json.loads(processor.registerMood("token", {"moods": ["Happy", "Tired"]}, "k1")[0]),
+                         json.loads(response))
+        self.assertEqual(processor.database.writes, [])     # nothing written on the request path
+        processor.writer.flush()
+        status, event = processor.database.writes[0]
+        self.assertEqual(status[:3], ("PersonalStatus", {"latitude": 40.6, "longitude": -8.6, "moods": "Happy,Tired"}, "u"))
+        self.assertEqual(event[0], "Event")
+        self.assertEqual(processor.alerts.dispatched, [("u", ["Happy", "Tired"])])
+        # without a key each registration gets its own
+        first = json.loads(processor.registerMood("token", {"moods": ["Sad"]})[0])["data"]["key"]
+        self.assertNotEqual(first, json.loads(processor.registerMood("token", {"moods": ["Sad"]})[0])["data"]["key"])
+
+    def test_invalid_token(self):
+        self.assertEqual(_processor().sync("other", {})[1], 401)
+
+
+if __name__ == '__main__':
+    unittest.main()
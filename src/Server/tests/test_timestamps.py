@@ -0,0 +1,54 @@
+#!/usr/bin/python3
+
+import unittest
+import os
+import calendar
+import datetime
+import time
+
+from timestamps import isoToEpoch, isoSeriesToEpoch
+
+
+def weekOfStages():
+    """
+    Sleep stages of 30 seconds for 8 hours on each night of a week, like the ones of levels.data
+    """
+    stages = []
+    for night in range(7):
+        start = datetime.datetime(2020, 1, 1, 23, 0) + datetime.timedelta(days=night)
+        stages += [(start + datetime.timedelta(seconds=30 * i)).strftime("%Y-%m-%dT%H:%M:%S.000") for i in range(960)]
+    return stages
+
+
+class TestTimestamps(unittest.TestCase):
+
+    def test_decode(self):
+        self.assertEqual(isoToEpoch("1970-01-01T00:00:00"), 0)
+        self.assertEqual(isoToEpoch("2020-02-29T23:59:59.999"), calendar.timegm((2020, 2, 29, 23, 59, 59)))
+        self.assertEqual(isoToEpoch("2020-01-01T01:00:00+01:00"), isoToEpoch("2020-01-01T00:00:00Z"))
+        self.assertEqual(isoToEpoch("2020-01-01 00:00:00-0130"), isoToEpoch("2020-01-01T01:30:00"))
+        for invalid in ["2020-01-01", "2020/01/01T00:00:00", "2020-01-01T0a:00:00", "2020-01-01T00:00:00+1"]:
+            with self.assertRaises(ValueError):
+                isoToEpoch(invalid)
+
+    def test_series(self):
+        stages = weekOfStages()
+        expected = [calendar.timegm(time.strptime(stage, "%Y-%m-%dT%H:%M:%S.000")) for stage in stages]
+        self.assertEqual(isoSeriesToEpoch(stages), expected)
+        # entries with another layout are decoded apart
+        self.assertEqual(isoSeriesToEpoch(["2020-01-01T00:00:00.000", "2020-01-01T00:00:30Z"]), [1577836800, 1577836830])
+        with self.assertRaises(ValueError):
+            isoSeriesToEpoch(["2020-01-01T00:00:00.000", "2020-01-01T00:0x:30.000"])
+
+    @unittest.skipUnless(os.environ.get("BENCHMARKS"), "set BENCHMARKS=1 to run the benchmarks")
+    def test_benchmark(self):
+        stages = weekOfStages()
+        begin = time.perf_counter()
+        for _ in range(10):
+            isoSeriesToEpoch(stages)
+        elapsed = (time.perf_counter() - begin) / 10
+        self.assertGreater(len(stages) / elapsed, 200000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+#!/usr/bin/python3
+
+import unittest
+import json
+import threading
+import time
+
+from devices import FitBit_Charge_3
+from registry import UserRegistry, DeviceRegistry
+from webhook import FitbitWebhook, SafetyNetPeriod
+from Processor import Processor, AggregatorThread
+
+
+class FakeFitbit(FitBit_Charge_3):
+    """
+    Band whose API answers without network, counting the requests
+    """
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.requests = []
+        self.subscribed = []
+        self.unsubscribed = []
+
+    def subscribe(self, subscriptionId):
+        self.subscribed.append(subscriptionId)
+
+    def unsubscribe(self, subscriptionId):
+        self.unsubscribed.append(subscriptionId)
+
+    def get(self, url, name):
+        self.requests.append(url)
+        if "sleep" in url:
+            raise Exception("no sleep")
+        return {"activities-heart": [{"value": {"restingHeartRate": 60}}], "activities-heart-intraday": {"dataset": []},
+                "activities-steps": [{"value": "5000"}], "activities-steps-intraday": {"dataset": []},
+                "summary": {"caloriesOut": 2000, "steps": 5000, "fairlyActiveMinutes": 1, "lightlyActiveMinutes": 2,
+                            "sedentaryMinutes": 3, "veryActiveMinutes": 4}}
+
+
+class FakeWriter:
+    def __init__(self):
+        self.points = []
+        self.done = 0
+
+    def add(self, measurement, fields, user, time):
+        self.points.append((measurement, fields, user, time))
+        self.done = len(self.points)
+        return self.done
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.deleted = []
+
+    def deleteDevice(self, user, deviceId):
+        self.deleted.append((user, deviceId))
+
+
+class FakeProcessor(Processor):
+    def __init__(self, band):
+        self.registry = DeviceRegistry()
+        self.registry.load({"u": UserRegistry("u", [band], [])})
+        self.userThreads = {}
+        self.webhook = FitbitWebhook("code", self._subscriptionSecret, self._onNotification)
+        self.writer = FakeWriter()
+        self.database = FakeDatabase()
+        self.ready = True
+        self.clientTokens = {"token": "u"}
+        self.medicTokens = {}
+        self.processed = []
+        self.done = threading.Event()
+
+    def process(self, responses, user):
+        self.processed.append(responses)
+        self.done.set()
+
+
+def notifier(webhook, notifications, secret="secret"):
+    """
+    Sends notifications like Fitbit does
+    """
+    body = json.dumps(notifications).encode("UTF-8")
+    return webhook.receive(body, FitbitWebhook.signature(body, secret))
+
+
+class TestWebhook(unittest.TestCase):
+
+    def setUp(self):
+        self.band = FakeFitbit({"token": "t", "client_secret": "secret"}, "u", "7", None)
+        self.processor = FakeProcessor(self.band)
+        self.processor.webhook.start()
+
+    def tearDown(self):
+        self.processor.webhook.end()
+        for thread in self.processor.userThreads.values():
+            thread.end()
+
+    def test_verification(self):
+        webhook = self.processor.webhook
+        self.assertTrue(webhook.verify("code"))
+        self.assertFalse(webhook.verify("other"))
+        self.assertFalse(FitbitWebhook(None, None, None).verify(None))
+
+    def test_signature(self):
+        webhook = self.processor.webhook
+        notification = [{"collectionType": "activities", "subscriptionId": "7"}]
+        self.assertFalse(notifier(webhook, notification, "wrong"))
+        self.assertFalse(notifier(webhook, [{"collectionType": "activities", "subscriptionId": "8"}]))
+        self.assertFalse(webhook.receive(b"not json", "x"))
+        self.assertTrue(notifier(webhook, notification))
+        self.assertEqual(webhook.stats()["rejected"], 3)
+
+    def test_unknown_subscriptions(self):
+        webhook = self.processor.webhook
+        # the known ones are handled, the unknown skipped
+        self.assertTrue(notifier(webhook, [{"collectionType": "activities", "subscriptionId": "8"},
+                                           {"collectionType": "activities", "subscriptionId": "7"}]))
+        self.assertEqual((webhook.stats()["received"], webhook.stats()["skipped"]), (1, 1))
+        # without any known one the signature can't be verified
+        self.assertFalse(notifier(webhook, [{"collectionType": "activities", "subscriptionId": "8"}]))
+        self.assertFalse(notifier(webhook, [{"collectionType": "activities", "subscriptionId": "8"},
+                                            {"collectionType": "activities", "subscriptionId": "7"}], "wrong"))
+        self.assertEqual(webhook.stats()["rejected"], 2)
+
+    def test_delete_unsubscribes(self):
+        self.assertEqual(self.processor.deleteDevice("token", {"id": 7})[1], 200)
+        self.assertEqual(self.band.unsubscribed, ["7"])
+        self.assertEqual(self.processor.database.deleted, [("u", 7)])
+        self.assertFalse(notifier(self.processor.webhook, [{"collectionType": "activities", "subscriptionId": "7"}]))
+
+    def test_safety_net(self):
+        thread = AggregatorThread(self.processor, "u")
+        periods = {metric.__class__.__name__: period for key, period, metric in thread._schedule(time.time())}
+        self.assertEqual(periods["HearthRate"], SafetyNetPeriod)
+        self.assertEqual(periods["Sleep"], 360 * 60)
+        self.assertEqual(self.band.subscribed, ["7"])
+
+    def test_notification_fetches_collection(self):
+        thread = AggregatorThread(self.processor, "u")
+        self.processor.userThreads["u"] = thread
+        thread.start()
+        time.sleep(0.2)
+        self.assertEqual(self.processor.processed, [])
+
+        self.assertTrue(notifier(self.processor.webhook, [{"collectionType": "activities", "date": "2020-01-01",
+                                                           "ownerId": "X", "ownerType": "user", "subscriptionId": "7"}]))
+        self.assertTrue(self.processor.done.wait(5))
+        metrics = sorted(metric for metric, data in self.processor.processed[0])
+        self.assertEqual(metrics, ["HealthStatus"] * 4)
+        # sleep wasn't notified, so it isn't fetched
+        self.assertFalse([url for url in self.band.requests if "sleep" in url])
+
+
+if __name__ == '__main__':
+    unittest.main()
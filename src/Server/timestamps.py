@@ -0,0 +1,90 @@
+import calendar
+from functools import lru_cache
+
+'''
+Decoder of the ISO-8601 timestamps sent by the device APIs ("2020-01-01T23:30:00.000").
+
+The fields are sliced at fixed positions instead of parsed, and the epoch of the midnight of each day
+is cached, so a timestamp is a few int conversions. Timestamps without an offset are UTC, like the
+times the rest of the server works with, independently of the timezone of the host.
+'''
+
+
+@lru_cache(maxsize=4096)
+def _midnight(date):
+    """
+    :param date: YYYY-MM-DD
+    :type date: str
+    :return: epoch (seconds) of the midnight UTC of the day
+    :rtype: int
+    """
+    return calendar.timegm((int(date[0:4]), int(date[5:7]), int(date[8:10]), 0, 0, 0))
+
+
+def _layout(value):
+    """
+    :return: (end of the seconds and fraction, offset in seconds) of a timestamp, validating its separators
+    :rtype: tuple
+    """
+    if len(value) < 19 or value[4]!="-" or value[7]!="-" or value[10] not in "T " or value[13]!=":" or value[16]!=":":
+        raise ValueError("Invalid ISO-8601 timestamp: "+str(value))
+    end=19
+    if len(value) > end and value[end] in ".,":
+        end+=1
+        while end < len(value) and value[end].isdigit():
+            end+=1
+    zone=value[end:]
+    if zone in ("", "Z"):
+        return end, 0
+    if zone[0] in "+-" and len(zone) in (3, 5, 6):
+        digits=zone[1:].replace(":", "")
+        if digits.isdigit() and len(digits) in (2, 4):
+            offset=int(digits[:2])*3600+int(digits[2:] or 0)*60
+            return end, offset if zone[0]=="-" else -offset
+    raise ValueError("Invalid ISO-8601 timestamp: "+str(value))
+
+
+def isoToEpoch(value):
+    """
+    :param value: YYYY-MM-DDTHH:MM:SS[.fff][Z|+HH:MM]
+    :type value: str
+    :return: epoch (seconds, the fraction is truncated)
+    :rtype: int
+    """
+    end, offset=_layout(value)
+    try:
+        return _midnight(value[:10])+int(value[11:13])*3600+int(value[14:16])*60+int(value[17:19])+offset
+    except ValueError:
+        raise ValueError("Invalid ISO-8601 timestamp: "+str(value))
+
+
+def isoSeriesToEpoch(values):
+    """
+    Converts a whole series of timestamps. The layout is validated once on the first timestamp,
+     the ones with the same length are decoded with it and only the others are validated apart
+
+    :param values: timestamps like the ones accepted by isoToEpoch
+    :type values: list
+    :return: epochs (seconds)
+    :rtype: list
+    """
+    if not values:
+        return []
+    length=len(values[0])
+    end, offset=_layout(values[0])
+    zone=values[0][end:]
+    days={}
+    epochs=[]
+    try:
+        for value in values:
+            if len(value)!=length or value[end:]!=zone or value[10] not in "T ":
+                epochs.append(isoToEpoch(value))
+                continue
+            date=value[:10]
+            midnight=days.get(date)
+            if midnight is None:
+                midnight=days[date]=_midnight(date)
+            epochs.append(midnight+int(value[11:13])*3600+int(value[14:16])*60+int(value[17:19])+offset)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid ISO-8601 timestamp in the series: "+str(value))
+    return epochs
@@ -1,6 +1,9 @@
 
 import datetime
 import re
+import time
+
+from geo import validLocation
 
 """
 Does validation on user input
@@ -10,6 +13,22 @@ Are done on:
 """
 
 
+MaxSyncEntries = 20000  # max GPS points and moods on a single synchronization
+MaxSyncAge = 30*86400   # seconds an entry may have been registered before its synchronization
+MaxClockSkew = 300      # seconds an entry may be ahead of the server's clock
+
+# fields that can be selected with fields= on the measurements read as plain series
+MeasurementFields = {
+    "HealthStatus": {"heartRate", "intradayHeartRate", "calories", "steps", "intradaySteps", "fairlyActiveMinutes",
+                     "lightlyActiveMinutes", "sedentaryMinutes", "veryActiveMinutes", "latitude", "longitude"},
+    # foobot (pm10, t, h, co2, voc, aqi) and the individual indexes of waqi
+    "Environment": {"aqi", "pm10", "pm25", "co", "co2", "no2", "o3", "so2", "voc", "t", "h", "p", "w", "wg", "dew",
+                    "latitude", "longitude"},
+    "PersonalStatus": {"moods", "latitude", "longitude"},
+    "Path": {"latitude", "longitude"}
+}
+
+
 class ArgumentValidator:
     """
     Holds the functions that validate the arguments
@@ -219,6 +238,54 @@ class ArgumentValidator:
             ]
         )
 
+    @staticmethod
+    def sync(data):
+        """
+        Validates a batch sent by the mobile app after being offline, all entries in one pass.
+        The errors of the entries refer to their position, ex: path[3]. Entries must have a valid
+         coordinate, when they have one, and a time from the last MaxSyncAge seconds
+
+        :param data: {"path":[{time:int, latitude:float, longitude:float}, ...],
+            "moods":[{time:int, moods:[str], latitude:float, longitude:float}, ...]}
+        :type data: dict
+        """
+        errors = ArgumentValidator._validate(
+            data, [
+                ("path", list, False),
+                ("moods", list, False)
+            ]
+        )
+        if errors:
+            return errors
+
+        path = data.get("path") or []
+        moods = data.get("moods") or []
+        if len(path) + len(moods) > MaxSyncEntries:
+            return ["At most " + str(MaxSyncEntries) + " entries can be synchronized at once"]
+
+        now = time.time()
+        for key, entries, validation in [
+                ("path", path, [("time", int, True), ("latitude", float, True), ("longitude", float, True)]),
+                ("moods", moods, [("time", int, True), ("moods", list, True), ("latitude", float, False), ("longitude", float, False)])]:
+            for i, entry in enumerate(entries):
+                if not isinstance(entry, dict):
+                    errors.append(key + "[" + str(i) + "] must be an object")
+                    continue
+                entryErrors = ArgumentValidator._validate(entry, validation)
+                errors += [key + "[" + str(i) + "] " + error for error in entryErrors]
+                if not entryErrors and (entry.get("latitude") is not None or entry.get("longitude") is not None) \
+                        and validLocation([entry.get("latitude"), entry.get("longitude")]) is None:
+                    errors.append(key + "[" + str(i) + "] Values \"latitude\" and \"longitude\" must be a valid coordinate")
+                if not entryErrors and not now - MaxSyncAge <= int(entry["time"]) <= now + MaxClockSkew:
+                    errors.append(key + "[" + str(i) + "] Value \"time\" must be from the last " + str(MaxSyncAge // 86400) + " days")
+                if key == "moods" and isinstance(entry.get("moods"), list) \
+                        and (not entry["moods"] or not all(isinstance(mood, str) for mood in entry["moods"])):
+                    errors.append(key + "[" + str(i) + "] Value \"moods\" must be a non empty list of strings")
+            if len(errors) > 10:
+                break
+
+        return errors[:10]
+
     @staticmethod
     def deleteMood(data):
         return ArgumentValidator._validate(
@@ -235,9 +302,21 @@ class ArgumentValidator:
                 ("end", int, False),
                 ("interval", str, False),
                 ("patient", str, False),
+                ("type", str, False),
+                ("fields", str, False),
             ]
         )
 
+        fields = data.get("fields")
+        if fields and isinstance(fields, str):
+            known = MeasurementFields.get(data.get("measurement"))
+            if known is None:
+                result.append("Fields can't be selected on this path")
+            else:
+                unknown = [field for field in fields.split(",") if field not in known]
+                if unknown:
+                    result.append("Unknown fields: " + ", ".join(unknown) + ". Known fields are " + ", ".join(sorted(known)))
+
         interval = data.get("interval")
         if interval and isinstance(interval, str) and not re.match(r"^\d+(ns|u|ms|s|m|h|d|w)$", interval):
             result.append("Inteval argument must follow the regex \"^\d+(ns|u|ms|s|m|h|d|w)$\"")
@@ -0,0 +1,129 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import threading
+
+'''
+Receiver of the Fitbit subscription notifications.
+
+Fitbit verifies the subscriber endpoint with a code (GET ?verify=code, answered with 204 if correct
+and 404 otherwise) and then POSTs a list of notifications every time a client syncs his band:
+[{"collectionType":"activities", "date":"2020-01-01", "ownerId":str, "ownerType":"user", "subscriptionId":str}]
+signed with HMAC-SHA1 of the body and the app's client secret + "&" (header X-Fitbit-Signature).
+The subscription id is the id of the device, so each notification maps to a device and the
+collection to the metrics that must be fetched. Verified notifications are queued and handled by a
+worker thread, so Fitbit gets its answer right away.
+'''
+
+
+FitbitVerificationCode=os.environ.get("FITBIT_VERIFICATION_CODE")    #verification code of the subscriber set on Fitbit, notifications are off without it
+SafetyNetPeriod=3600        #seconds between the polls of the notified metrics, only to recover lost notifications
+MaxQueuedNotifications=10000
+
+
+class FitbitWebhook:
+    def __init__(self, verificationCode, secretOf, onNotification):
+        """
+        :param verificationCode: code configured on the subscriber, None disables the notifications
+        :type verificationCode: str
+        :param secretOf: receives a subscription id and returns the client secret of its app, or None if unknown
+        :type secretOf: function
+        :param onNotification: called for each verified notification with (subscriptionId, collectionType)
+        :type onNotification: function
+        """
+        self.verificationCode=verificationCode
+        self.secretOf=secretOf
+        self.onNotification=onNotification
+        self._queue=queue.Queue(maxsize=MaxQueuedNotifications)
+        self.received=0
+        self.rejected=0
+        self.dropped=0
+        self.skipped=0
+        self.thread=None
+
+    @property
+    def enabled(self):
+        return bool(self.verificationCode)
+
+    def verify(self, code):
+        """
+        :return: True if the code is the one configured on the subscriber
+        :rtype: bool
+        """
+        return self.enabled and code is not None and hmac.compare_digest(str(code), self.verificationCode)
+
+    @staticmethod
+    def signature(body, clientSecret):
+        """
+        :param body: raw body of the notification
+        :type body: bytes
+        :return: the value expected on X-Fitbit-Signature
+        :rtype: str
+        """
+        return base64.b64encode(hmac.new((clientSecret+"&").encode("UTF-8"), body, hashlib.sha1).digest()).decode("UTF-8")
+
+    def receive(self, body, signature):
+        """
+        Verifies the signature of a list of notifications and queues them.
+        The ones of unknown subscriptions (ex: of a device already deleted) are skipped
+
+        :param body: raw body of the request
+        :type body: bytes
+        :param signature: X-Fitbit-Signature header
+        :type signature: str
+        :return: False if the notifications weren't accepted
+        :rtype: bool
+        """
+        if not self.enabled or not signature:
+            self.rejected+=1
+            return False
+        try:
+            notifications=json.loads(body.decode("UTF-8"))
+            secrets=[self.secretOf(str(notification["subscriptionId"])) for notification in notifications]
+        except Exception:
+            self.rejected+=1
+            return False
+        #the subscriptions of devices deleted meanwhile are skipped, the others are all of the same app
+        known=set(secrets)-{None}
+        if len(known)!=1 or not hmac.compare_digest(self.signature(body, known.pop()), signature):
+            self.rejected+=1
+            return False
+
+        self.skipped+=secrets.count(None)
+        for notification, secret in zip(notifications, secrets):
+            if secret is None:
+                continue
+            try:
+                self._queue.put_nowait((str(notification["subscriptionId"]), notification.get("collectionType")))
+                self.received+=1
+            except queue.Full:
+                self.dropped+=1
+        return True
+
+    def run(self):
+        while True:
+            subscriptionId, collection=self._queue.get()
+            if subscriptionId is None:
+                return
+            try:
+                self.onNotification(subscriptionId, collection)
+            except Exception as e:
+                logging.error("Error while handling the notification of "+subscriptionId+": "+str(e))
+
+    def start(self):
+        self.thread=threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def end(self):
+        if self.thread:
+            try:
+                self._queue.put_nowait((None, None))
+            except queue.Full:
+                pass
+
+    def stats(self):
+        return {"enabled":self.enabled, "received":self.received, "rejected":self.rejected, "dropped":self.dropped, "skipped":self.skipped, "queued":self._queue.qsize()}
@@ -292,6 +292,32 @@ CREATE PROCEDURE get_all_client_devices (
     WHERE client_username.username = _username;
   END //
 
+/*
+ * Same information as get_all_client_devices but for every client at once
+ * Clients without devices are returned with the device columns at null
+ * Used by the server at startup to load all devices with a single query
+ */
+CREATE PROCEDURE get_all_clients_devices ()
+  BEGIN
+    SELECT client_username.username,
+           device.id,
+           device.type_id,
+           supported_device.type,
+           supported_device.brand,
+           supported_device.model,
+           supported_device.photo,
+           authentication_field.name,
+           authentication_field.value,
+           home_device_location.latitude,
+           home_device_location.longitude
+    FROM ((((client_username LEFT JOIN client_device ON client_device.client_id = client_username.client_id)
+         LEFT JOIN device ON device.id = client_device.device_id)
+         LEFT JOIN supported_device ON supported_device.id = device.type_id)
+         LEFT JOIN authentication_field ON authentication_field.device_id = device.id)
+         LEFT JOIN home_device_location ON home_device_location.device_id = device.id
+    ORDER BY client_username.username, device.id;
+  END //
+
 /*
  * Associates a device with a user
  * Only allows one bracelet per client
@@ -512,6 +538,7 @@ CREATE PROCEDURE update_medic_info (
 /*
  * Register a sleep session
  * Fails if time interval overlaps a existing sleep session
+ * Not committed here, the caller commits once the stages of the session are written
  */
 CREATE PROCEDURE insert_sleep_session (
   IN _username VARCHAR(30),
@@ -522,8 +549,6 @@ CREATE PROCEDURE insert_sleep_session (
   BEGIN
     DECLARE __client_id INTEGER;
 
-    START TRANSACTION;
-
     -- Get client id
     SELECT client_id INTO __client_id
     FROM client_username
@@ -532,17 +557,13 @@ CREATE PROCEDURE insert_sleep_session (
     -- Fails if time intervals of existing session with the new one overlap
     IF EXISTS(SELECT *
               FROM sleep_session
-              WHERE ((begin < _begin AND begin > _begin)
-                    OR
-                     (end > _end AND end < _end)) AND client_id AND client_id = __client_id) THEN
+              WHERE begin < _end AND end > _begin AND client_id = __client_id) THEN
 	    SIGNAL SQLSTATE '03000' SET MESSAGE_TEXT = "Intervals of several sleep session overlap";
     END IF;
 
     -- Insert sleep session
     INSERT INTO sleep_session (client_id, day, duration, begin, end)
     VALUES (__client_id, STR_TO_DATE(_day, "%Y-%m-%d"), _duration, _begin, _end);
-
-    COMMIT;
   END //
 
 /*
@@ -1100,6 +1121,20 @@ CREATE PROCEDURE get_accepted_permissions (
 
   END //
 
+/*
+ * Obtains every accepted permission that is still active on the system
+ * Used by the server to build its in-memory index of which medics monitor each client
+ */
+CREATE PROCEDURE get_all_accepted_permissions ()
+  BEGIN
+    SELECT client_username.username,
+           medic_username.username,
+           accepted_permission.expiration_date
+    FROM (accepted_permission JOIN client_username ON client_username.client_id = accepted_permission.client_id)
+    JOIN medic_username ON medic_username.medic_id = accepted_permission.medic_id
+    WHERE accepted_permission.expiration_date >= NOW();
+  END //
+
 CREATE PROCEDURE get_expired_permissions (
     IN _user VARCHAR(30),
     IN _is_medic BOOLEAN)